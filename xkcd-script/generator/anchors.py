@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+GPOS anchor positions for a batch of glyphs, from one array of their boxes.
+
+pt7 gives every letter an 'above' base anchor at its top centre and every
+Latin letter a 'below' one at its bottom centre, and gives the combining
+marks above a 'basemark' anchor for stacking.  Anchors reads the bounding
+boxes of the whole batch through GlyphGeometry once, into an (N, 4) array,
+and each anchor row is then a column operation on it.
+
+The x of an anchor is the centre of the glyph's box, like the precomposed
+glyphs pt6 builds.  Glyphs named in optical= use the centre of mass of
+their ink instead (OutlineGeometry.centroid, on the ink pt7's kerning has
+usually cached already), and centres= pins the x of individual glyphs
+outright, as pt7 does for j's dot.
+"""
+import numpy as np
+
+
+class Anchors(object):
+    """Top and bottom anchor points for the named glyphs."""
+
+    def __init__(self, geometry, names, optical=(), centres=None):
+        self.names = list(names)
+        self.boxes = np.array([geometry.bbox(name) for name in self.names],
+                              dtype=float).reshape(-1, 4)
+        # Empty glyphs and composites FontForge could not resolve get no anchors.
+        self.drawn = self.boxes[:, 2] > self.boxes[:, 0]
+        self.x = (self.boxes[:, 0] + self.boxes[:, 2]) / 2
+        centres = centres or {}
+        for row, name in enumerate(self.names):
+            if name in centres:
+                self.x[row] = centres[name]
+            elif name in optical:
+                centroid = geometry.ink(name).centroid()
+                if centroid is not None:
+                    self.x[row] = centroid[0]
+
+    def _points(self, y):
+        return [(name, float(x), float(y)) for name, x, y, drawn
+                in zip(self.names, self.x, y, self.drawn) if drawn]
+
+    def top(self, gap):
+        """[(name, x, y)] with y gap units above each drawn glyph's top."""
+        return self._points(self.boxes[:, 3] + gap)
+
+    def bottom(self, raise_by):
+        """[(name, x, y)] with y raise_by units above each drawn glyph's bottom."""
+        return self._points(self.boxes[:, 1] + raise_by)
+
+
+def top_contours_centre_x(outline):
+    """x centre of the control points of the outline's highest contours (j's dot, say).
+
+    The highest contours are those whose lowest point is at least as high
+    as every other contour's.
+    """
+    ymins = outline.contour_ymins()
+    top = np.isin(outline.control_contour, np.flatnonzero(ymins >= ymins.max()))
+    xs = outline.control_segments[top, 0, 0]
+    return (xs.min() + xs.max()) / 2
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental driver for the generator pipeline.
+
+Each stage declares the files it reads and writes, as glob patterns relative
+to this directory.  Inputs include the stage's own script and the helper
+modules it imports, so editing code reruns the stage just like editing data
+does, and a stage also names the environment variables that change what it
+writes, whose values count as inputs.  After a stage succeeds, a digest of its
+inputs and outputs is recorded
+in ../generated/build_state.json; on the next run the stage is skipped when
+both digests still match.  Because outputs are hashed, a stage that rewrites
+identical bytes (e.g. pt3 after a pt1 change that moved no strokes) does not
+cascade into the stages after it.
+
+Stages run as child processes of this one, so a single `docker run` covers
+the whole build while each stage keeps its own top-level-script semantics.
+Every stage that runs reports its wall time, CPU time and peak RSS; with
+--profile, those and the profiling.span() events recorded inside the stages
+are written out as a Chrome trace.
+
+    python3 build.py            # run whatever is out of date
+    python3 build.py 7          # only consider stages 7 onwards (like ./run.sh 7)
+    python3 build.py 7 --force  # rerun stages 7 onwards unconditionally
+    python3 build.py --profile ../generated/trace.json
+"""
+import argparse
+import collections
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import profiling
+
+
+GENERATED = '../generated/'
+STATE_FNAME = GENERATED + 'build_state.json'
+
+Stage = collections.namedtuple('Stage', 'number script inputs outputs env', defaults=((),))
+
+# Inputs that are also outputs (the reference OTF frozen by pt8_gen_reprod_font,
+# the MathJax JS that pt8a_mathjax3 splices into) are recorded as they stand
+# after the stage has run, so they only count as changed when edited by hand.
+STAGES = [
+    Stage(1, 'pt1_character_extraction.py',
+          inputs=['pt1_character_extraction.py', 'png_bands.py', 'stroke_pack.py',
+                  'handwriting_minimal.png'],
+          outputs=[GENERATED + 'strokes.npy', GENERATED + 'strokes.index.npy']),
+    # pt2 has no stage of its own: pt3 imports it and traces its character
+    # records as they are produced rather than reading back PPMs, so pt3
+    # depends on pt2's inputs, and a build never writes the PPMs.
+    Stage(3, 'pt3_ppm_to_svg.py',
+          inputs=['pt3_ppm_to_svg.py', 'pt2_character_classification.py', 'stroke_pack.py',
+                  'tracing.py', 'cores.py', GENERATED + 'strokes.npy', GENERATED + 'strokes.index.npy'],
+          outputs=[GENERATED + 'characters/char_*.svg']),
+    Stage(4, 'pt4_additional_sources.py',
+          inputs=['pt4_additional_sources.py', 'tracing.py', 'cores.py', '2586_greek_letters_2x.png',
+                  'ai_extensions_1.png', 'extras/*.png'],
+          outputs=[GENERATED + 'additional_chars/*.svg']),
+    Stage(5, 'pt5_svg_to_font.py',
+          inputs=['pt5_svg_to_font.py', 'svg_outlines.py', 'outline_geometry.py', 'glyph_pool.py',
+                  'cores.py', 'profiling.py', GENERATED + 'characters/char_*.svg',
+                  GENERATED + 'additional_chars/*.svg'],
+          outputs=[GENERATED + 'xkcd-script-pt5.sfd']),
+    Stage(6, 'pt6_derived_chars.py',
+          inputs=['pt6_derived_chars.py', 'glyph_geometry.py', 'outline_geometry.py', 'glyph_recipes.py',
+                  GENERATED + 'xkcd-script-pt5.sfd'],
+          outputs=[GENERATED + 'xkcd-script-pt6.sfd'],
+          env=['XKCD_PT6_SUBSET']),
+    Stage(7, 'pt7_font_properties.py',
+          inputs=['pt7_font_properties.py', 'kerning.py', 'anchors.py', 'glyph_geometry.py',
+                  'outline_geometry.py', 'glyph_recipes.py', 'profiling.py',
+                  GENERATED + 'xkcd-script-pt6.sfd'],
+          outputs=[GENERATED + 'xkcd-script-pt7.sfd'],
+          env=['XKCD_KERN_ENGINE']),
+    Stage(8, 'pt8_derivatives.py',
+          inputs=['pt8_derivatives.py', 'pt8a_mathjax3.py', GENERATED + 'xkcd-script-pt7.sfd',
+                  '../xkcd-mathjax3.js'],
+          outputs=['../xkcd-mathjax3.js']),
+    Stage(9, 'pt8_gen_reprod_font.py',
+          inputs=['pt8_gen_reprod_font.py', 'profiling.py', GENERATED + 'xkcd-script-pt7.sfd',
+                  '../font/xkcd-script.otf'],
+          outputs=['../font/xkcd-script.sfd', '../font/xkcd-script.otf',
+                   '../font/xkcd-script.ttf', '../font/xkcd-script.woff']),
+]
+
+
+_file_digests = {}
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents, memoised on (path, size, mtime) for this run."""
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    if key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_digests[key] = digest.hexdigest()
+    return _file_digests[key]
+
+
+def files_digest(patterns):
+    """Digest of every file matched by the glob patterns, or None if any pattern matches nothing."""
+    digest = hashlib.sha256()
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern))
+        if not paths:
+            return None
+        digest.update(pattern.encode('utf-8') + b'\0')
+        for path in paths:
+            digest.update('{}\0{}\n'.format(path, file_digest(path)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def inputs_digest(stage):
+    """Digest of the stage's input files and of the environment variables it names, or None."""
+    files = files_digest(stage.inputs)
+    if files is None or not stage.env:
+        return files
+    digest = hashlib.sha256(files.encode('utf-8'))
+    for name in stage.env:
+        digest.update('\0{}={!r}'.format(name, os.environ.get(name)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_state(fname=STATE_FNAME):
+    try:
+        with open(fname) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state, fname=STATE_FNAME):
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname + '.tmp', 'w') as fh:
+        json.dump(state, fh, indent=1, sort_keys=True)
+    os.replace(fname + '.tmp', fname)
+
+
+def is_up_to_date(stage, state):
+    recorded = state.get(stage.script)
+    if recorded is None:
+        return False
+    outputs = files_digest(stage.outputs)
+    return (outputs is not None and outputs == recorded['outputs']
+            and inputs_digest(stage) == recorded['inputs'])
+
+
+def record(stage, state):
+    state[stage.script] = {'inputs': inputs_digest(stage),
+                           'outputs': files_digest(stage.outputs)}
+
+
+def run_stage(stage):
+    """Run the stage's script and report its resource use; raises CalledProcessError on failure."""
+    start_ns = time.time_ns()
+    proc = subprocess.Popen([sys.executable, stage.script])
+    _, status, rusage = os.wait4(proc.pid, 0)
+    end_ns = time.time_ns()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    cpu_s = rusage.ru_utime + rusage.ru_stime
+    print(f'### {stage.number} {stage.script}: {(end_ns - start_ns) / 1e9:.1f}s wall, '
+          f'{cpu_s:.1f}s CPU, {rusage.ru_maxrss / 1024:.0f} MiB peak RSS ###', flush=True)
+    if os.environ.get(profiling.PROFILE_ENV):
+        # On Linux a process's main thread id is its pid, so the stage event
+        # lines up with the spans its main thread records.
+        profiling.write_event(profiling.trace_event(
+            stage.script, start_ns, end_ns, proc.pid, proc.pid,
+            {'cpu_ms': round(cpu_s * 1000, 3), 'max_rss_kb': rusage.ru_maxrss}))
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+
+def build(stages, first=1, force=False, state_fname=STATE_FNAME):
+    state = load_state(state_fname)
+    for stage in stages:
+        if stage.number < first:
+            continue
+        if not force and is_up_to_date(stage, state):
+            print(f'### {stage.number} {stage.script}: up to date ###', flush=True)
+            continue
+
+        print(f'### {stage.number} {stage.script} ###', flush=True)
+        # Forget the stage before running it, so a failed run is never mistaken
+        # for a finished one.
+        state.pop(stage.script, None)
+        save_state(state, state_fname)
+        run_stage(stage)
+        record(stage, state)
+        save_state(state, state_fname)
+
+
+def write_trace(events_fname, trace_fname):
+    """Gather the recorded events into a Chrome trace JSON file."""
+    events = sorted(profiling.read_events(events_fname), key=lambda event: event['ts'])
+    with open(trace_fname, 'w') as fh:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fh)
+    print(f'Wrote {len(events)} trace events to {trace_fname}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('first', nargs='?', type=int, default=1,
+                        help='first stage to consider; earlier stages are neither checked nor run')
+    parser.add_argument('--force', action='store_true',
+                        help='rerun every considered stage even if it is up to date')
+    parser.add_argument('--profile', metavar='TRACE_JSON',
+                        help='write a Chrome trace of the stages and their profiling spans')
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        trace_fname = os.path.abspath(args.profile)
+        events_fname = trace_fname + '.events.jsonl'
+        open(events_fname, 'w').close()
+        os.environ[profiling.PROFILE_ENV] = events_fname
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        build(STAGES, args.first, args.force)
+    except subprocess.CalledProcessError as err:
+        sys.exit(err.returncode)
+    finally:
+        if args.profile:
+            write_trace(events_fname, trace_fname)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+How many worker processes the pipeline's pools may use.
+
+Shared by tracing (pt3/pt4) and glyph_pool (pt5), which otherwise have
+nothing in common.
+"""
+import os
+
+
+def available_cores():
+    """The number of cores this process may run on (respecting container CPU sets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
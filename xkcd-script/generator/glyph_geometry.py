@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Per-glyph geometry, computed once and reused until the glyph changes.
+
+pt6 places every accent by the bounding boxes of its base and mark, so the
+boxes of common bases (a, e, o) and marks (_acute_mark, ...) used to be
+recomputed by FontForge dozens of times; pt7's anchor pass reads the same
+boxes again.  GlyphGeometry memoises, per glyph name, the bounding box (and
+its centre), an OutlineGeometry snapshot of the glyph's own contours, for
+per-contour extents, and one of its ink — own contours plus transformed
+references — for pt7's kerning profiles.
+
+FontForge cannot say when a glyph was edited, so invalidation is explicit:
+whoever mutates a glyph that may have been read through the cache calls
+invalidate(name).  That also drops every cached composite that references
+the glyph, directly or through other composites, since their boxes include
+it.  (pt6 does this for each glyph its recipes build.)
+"""
+import collections
+
+import numpy as np
+
+import outline_geometry
+
+
+class GlyphGeometry(object):
+    """Cached geometry queries on the glyphs of a font, by glyph name or codepoint."""
+
+    def __init__(self, font):
+        self.font = font
+        self._bboxes = {}
+        self._outlines = {}
+        self._inks = {}
+        # Glyph name -> names of the cached composites that reference it.
+        self._users = collections.defaultdict(set)
+
+    def _name(self, key):
+        return key if isinstance(key, str) else self.font[key].glyphname
+
+    def bbox(self, key):
+        """glyph.boundingBox(), computed on first use."""
+        name = self._name(key)
+        if name not in self._bboxes:
+            self._record_users(name)
+            self._bboxes[name] = tuple(self.font[name].boundingBox())
+        return self._bboxes[name]
+
+    def _record_users(self, name):
+        # Record every reference edge below the glyph, so that invalidating a
+        # glyph also reaches composites that only use it through uncached ones.
+        pending = [name]
+        while pending:
+            user = pending.pop()
+            for reference in self.font[user].references:
+                if user not in self._users[reference[0]]:
+                    self._users[reference[0]].add(user)
+                    pending.append(reference[0])
+
+    def centre(self, key):
+        """The (x, y) centre of the glyph's bounding box."""
+        xmin, ymin, xmax, ymax = self.bbox(key)
+        return (xmin + xmax) / 2, (ymin + ymax) / 2
+
+    def outline(self, key):
+        """An OutlineGeometry snapshot of the glyph's own contours (references excluded)."""
+        name = self._name(key)
+        if name not in self._outlines:
+            self._outlines[name] = outline_geometry.OutlineGeometry.from_layer(
+                self.font[name].foreground)
+        return self._outlines[name]
+
+    def ink(self, key):
+        """An OutlineGeometry of everything the glyph draws, its references resolved."""
+        name = self._name(key)
+        if name not in self._inks:
+            glyph = self.font[name]
+            if not glyph.references:
+                self._inks[name] = self.outline(name)
+            else:
+                self._record_users(name)
+                contours = list(self.outline(name).contours)
+                for reference in glyph.references:
+                    ref_name, (xx, xy, yx, yy, dx, dy) = reference[:2]
+                    # psMat order: x' = xx*x + yx*y + dx, y' = xy*x + yy*y + dy.
+                    linear = np.array([[xx, xy], [yx, yy]], dtype=float)
+                    contours.extend((points @ linear + (dx, dy), on_curve)
+                                    for points, on_curve in self.ink(ref_name).contours)
+                self._inks[name] = outline_geometry.OutlineGeometry(contours)
+        return self._inks[name]
+
+    def contour_ymins(self, key):
+        """The lowest point of each of the glyph's contours, in layer order."""
+        return self.outline(key).contour_ymins()
+
+    def invalidate(self, key):
+        """Forget the glyph's geometry and that of every cached composite built on it."""
+        pending = [self._name(key)]
+        while pending:
+            name = pending.pop()
+            self._bboxes.pop(name, None)
+            self._outlines.pop(name, None)
+            self._inks.pop(name, None)
+            pending.extend(self._users.pop(name, ()))
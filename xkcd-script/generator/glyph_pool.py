@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Run FontForge's expensive per-glyph geometry operations on every core.
+
+changeWeight, removeOverlap and simplify dominate pt5, and they only ever
+look at one glyph at a time.  run() takes a batch of (glyph, ops) jobs,
+ships each glyph's contours and advance width to a worker process, replays
+the ops there on a copy of the glyph (same name and code point) in the
+worker's own scratch fontforge.font(), and writes the resulting contours and
+width back onto the real glyphs in job order.  Contours travel with their points' types and
+their closed flag, and the scratch font uses the parent's spline order
+(cubic or quadratic), so the round trip itself changes nothing.
+
+changeWeight picks its x-height, cap-height and descender zones from the
+Latin letters in the glyph's font, so each scratch font is given the parent
+font's em, ascent, descent and italic angle and a copy of those letters as
+they stand when run() is called.  Each job therefore gives what running its
+ops in place at that moment would, whichever worker runs it and whatever else
+is in the batch, and the result does not depend on the number of workers:
+with XKCD_WORKERS=1 the same scratch-font replay simply runs in this process.
+A job on one of those letters would change the zones of the jobs after it, so
+the letters themselves are never jobs; callers run their ops in place, with
+apply_ops, and run any pending batch before they change a letter.
+
+Jobs are limited to glyphs without references, and ops to the methods in OPS.
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import string
+
+import fontforge
+
+import cores
+
+
+WORKERS_ENV = 'XKCD_WORKERS'
+
+# Glyph methods a job may run, as (name, *args) tuples, e.g. ('changeWeight', 20).
+OPS = frozenset(['addExtrema', 'changeWeight', 'correctDirection', 'removeOverlap',
+                 'round', 'simplify', 'transform'])
+
+# The letters FontForge measures for changeWeight's zones.
+ZONE_CHARS = frozenset(string.ascii_letters)
+ZONE_GLYPHS = [fontforge.nameFromUnicode(ord(char)) for char in string.ascii_letters]
+
+
+def workers():
+    """$XKCD_WORKERS, or one worker per available core."""
+    return int(os.environ.get(WORKERS_ENV) or cores.available_cores())
+
+
+def contours_of(layer):
+    """A picklable copy of a layer: (is_quadratic, [(points, closed)]), each point (x, y, on_curve, type)."""
+    return layer.is_quadratic, [([(point.x, point.y, point.on_curve, point.type) for point in contour],
+                                 contour.closed) for contour in layer]
+
+
+def layer_of(contours):
+    is_quadratic, contours = contours
+    layer = fontforge.layer()
+    layer.is_quadratic = is_quadratic
+    for points, closed in contours:
+        contour = fontforge.contour(is_quadratic)
+        for x, y, on_curve, point_type in points:
+            point = fontforge.point(x, y, on_curve)
+            point.type = point_type
+            contour += point
+        contour.closed = closed
+        layer += contour
+    return layer
+
+
+def apply_ops(glyph, ops):
+    for name, *args in ops:
+        if name not in OPS:
+            raise ValueError('Unsupported glyph_pool op {!r}'.format(name))
+        getattr(glyph, name)(*args)
+
+
+_scratch_font = None
+
+
+def _init_worker(metrics, zone_glyphs):
+    global _scratch_font
+    font = fontforge.font()
+    font.encoding = 'UnicodeFull'
+    font.em, font.ascent, font.descent, font.italicangle, quadratic = metrics
+    font.layers['Fore'].is_quadratic = quadratic
+    for name, unicode, width, contours in zone_glyphs:
+        glyph = font.createChar(unicode, name)
+        glyph.foreground = layer_of(contours)
+        glyph.width = width
+    _scratch_font = font
+
+
+def _run_job(job):
+    name, unicode, contours, width, ops = job
+    glyph = _scratch_font.createChar(unicode, name)
+    glyph.foreground = layer_of(contours)
+    glyph.width = width
+    apply_ops(glyph, ops)
+    result = contours_of(glyph.foreground), glyph.width
+    _scratch_font.removeGlyph(glyph)
+    return result
+
+
+def run(font, jobs, n_workers=None):
+    """Apply each job's ops to its glyph, in worker processes; jobs is a list of (glyph, ops)."""
+    jobs = [(glyph, ops) for glyph, ops in jobs if ops]
+    quadratic = font.layers['Fore'].is_quadratic
+    for glyph, _ in jobs:
+        if glyph.glyphname in ZONE_GLYPHS:
+            raise ValueError('glyph_pool cannot run ops on {}: changeWeight measures its zones on it'
+                             .format(glyph.glyphname))
+        if glyph.references:
+            raise ValueError('glyph_pool cannot run ops on {}: it has references'.format(glyph.glyphname))
+        if glyph.foreground.is_quadratic != quadratic:
+            raise ValueError('glyph_pool cannot run ops on {}: its splines are not in the font\'s order'
+                             .format(glyph.glyphname))
+    if not jobs:
+        return
+
+    metrics = (font.em, font.ascent, font.descent, font.italicangle, quadratic)
+    zone_glyphs = [(name, font[name].unicode, font[name].width, contours_of(font[name].foreground))
+                   for name in ZONE_GLYPHS if name in font]
+    payload = [(glyph.glyphname, glyph.unicode, contours_of(glyph.foreground), glyph.width, ops)
+               for glyph, ops in jobs]
+
+    n_workers = min(n_workers or workers(), len(jobs))
+    if n_workers <= 1:
+        _init_worker(metrics, zone_glyphs)
+        results = list(map(_run_job, payload))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                n_workers, mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker, initargs=(metrics, zone_glyphs)) as pool:
+            results = list(pool.map(_run_job, payload))
+
+    for (glyph, _), (contours, width) in zip(jobs, results):
+        glyph.foreground = layer_of(contours)
+        glyph.width = width
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Derived glyphs as a graph of recipes, rebuilt only when their inputs change.
+
+A recipe says how pt6 makes one target glyph: a builder function, the
+keyword parameters to call it with, and the source glyphs it reads.  Sources
+are the string-valued arguments of the call (base_name, mark_name, ... —
+defaults included), plus any glyphs the builder declares with @reads().  When
+a source is itself the target of a recipe, that recipe is evaluated first.
+
+Each evaluated recipe gets a signature: a hash of the builder's code, its
+parameters and the signatures of its sources.  The code includes every
+function of the builder's module that it calls, directly or through other
+helpers, the plain constants (numbers, strings and containers of them) those
+functions read, and the source of the shared modules the RecipeBook is given
+(pt6 passes glyph_geometry and outline_geometry), so editing a helper
+rebuilds the recipes that use it.  A source that no recipe makes (a pt5
+glyph, or a mark pt6 draws directly) is signed by its outline, advance width
+and, recursively, the glyphs it references.  pt6 keeps the signatures in
+../generated/pt6_recipes.json alongside the SFD; a recipe whose signature is
+unchanged is copied from the previous SFD rather than rebuilt, and a changed
+source invalidates everything built on top of it.
+
+Setting XKCD_PT6_SUBSET to codepoint ranges (e.g. "U+00A0-U+00FF") evaluates
+only the recipes for those codepoints and the recipes they depend on; pt6
+saves that font separately and does not record its signatures.
+"""
+import collections
+import hashlib
+import inspect
+import json
+import os
+import re
+
+
+STATE_FNAME = '../generated/pt6_recipes.json'
+SUBSET_ENV = 'XKCD_PT6_SUBSET'
+
+Recipe = collections.namedtuple('Recipe', 'name codepoint target builder params sources')
+
+
+def reads(*names):
+    """Declare glyphs a builder always reads, besides the ones passed to it by name."""
+    def decorate(builder):
+        builder.reads = names
+        return builder
+    return decorate
+
+
+def parse_codepoint_ranges(text):
+    """[(first, last), ...] from "U+00A0-U+00FF,U+0100" style text."""
+    ranges = []
+    for part in text.split(','):
+        match = re.fullmatch(r'\s*(?:U\+)?([0-9A-Fa-f]+)\s*(?:-\s*(?:U\+)?([0-9A-Fa-f]+))?\s*', part)
+        if not match:
+            raise ValueError('Bad codepoint range {!r}'.format(part))
+        first = int(match.group(1), 16)
+        last = int(match.group(2), 16) if match.group(2) else first
+        ranges.append((first, last))
+    return ranges
+
+
+def _plain(value):
+    """Whether value is a constant whose repr is stable from run to run."""
+    if isinstance(value, (type(None), bool, int, float, str, bytes)):
+        return True
+    if isinstance(value, (tuple, list, frozenset, set)):
+        return all(_plain(item) for item in value)
+    if isinstance(value, dict):
+        return all(_plain(key) and _plain(item) for key, item in value.items())
+    return False
+
+
+def _global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _global_names(const)
+    return names
+
+
+def code_digest(function):
+    """Hash of a function's source, the same-module functions it calls and the plain constants they read."""
+    digest = hashlib.sha256()
+    pending, seen = [function], set()
+    while pending:
+        function = pending.pop()
+        if function in seen:
+            continue
+        seen.add(function)
+        digest.update('\0{}\0{}'.format(function.__qualname__, inspect.getsource(function)).encode('utf-8'))
+        for name in sorted(_global_names(function.__code__)):
+            if name not in function.__globals__:
+                continue
+            value = function.__globals__[name]
+            if inspect.isfunction(value) and value.__module__ == function.__module__:
+                pending.append(value)
+            elif _plain(value):
+                digest.update('\0{}={!r}'.format(name, value).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def glyph_digest(font, name, memo=None):
+    """Hash of a glyph's outline, advance width and the glyphs it references."""
+    if memo is None:
+        memo = {}
+    if name not in memo:
+        digest = hashlib.sha256()
+        if name not in font:
+            digest.update(b'missing')
+        else:
+            glyph = font[name]
+            digest.update(repr(glyph.width).encode('utf-8'))
+            for contour in glyph.foreground:
+                points = [(point.x, point.y, point.on_curve) for point in contour]
+                digest.update(b'\0' + repr(points).encode('utf-8'))
+            for reference in glyph.references:
+                ref_name, matrix = reference[:2]
+                digest.update('\0{}{}'.format(ref_name, tuple(matrix)).encode('utf-8'))
+                digest.update(glyph_digest(font, ref_name, memo).encode('utf-8'))
+        memo[name] = digest.hexdigest()
+    return memo[name]
+
+
+class RecipeBook(object):
+    """The registered recipes, keyed by target glyph name.
+
+    name_of maps a codepoint to the glyph name createMappedChar gives it
+    (fontforge.nameFromUnicode in pt6).  shared_code lists modules whose
+    source goes into every signature, for code builders reach through
+    objects rather than by name.
+    """
+
+    def __init__(self, name_of, shared_code=()):
+        self.name_of = name_of
+        self.recipes = collections.OrderedDict()
+        shared = hashlib.sha256()
+        for module in shared_code:
+            shared.update('\0{}\0{}'.format(module.__name__, inspect.getsource(module)).encode('utf-8'))
+        self._shared_code = shared.hexdigest()
+        self._code_digests = {}
+
+    def add(self, target, builder, *args, **params):
+        """Register builder(font, target, *args, **params) as the recipe for target (a codepoint or glyph name)."""
+        codepoint = None if isinstance(target, str) else target
+        name = target if codepoint is None else self.name_of(codepoint)
+        if name in self.recipes:
+            raise ValueError('Glyph {} already has a recipe'.format(name))
+        bound = inspect.signature(builder).bind(None, target, *args, **params)
+        # Recorded by keyword, so the signature does not depend on how the call was spelled.
+        params = dict(list(bound.arguments.items())[2:])
+        bound.apply_defaults()
+        values = list(bound.arguments.values())[2:]
+        sources = (tuple(getattr(builder, 'reads', ()))
+                   + tuple(value for value in values if isinstance(value, str)))
+        recipe = Recipe(name, codepoint, target, builder, params, sources)
+        self.recipes[name] = recipe
+        return recipe
+
+    def select(self, ranges):
+        """Names of the recipes whose target codepoint lies in one of the (first, last) ranges."""
+        return [name for name, recipe in self.recipes.items()
+                if recipe.codepoint is not None
+                and any(first <= recipe.codepoint <= last for first, last in ranges)]
+
+    def order(self, names=None):
+        """The named recipes and the recipes they depend on, each after its dependencies."""
+        ordered, state = [], {}
+
+        def visit(name):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError('Recipe cycle through {}'.format(name))
+            state[name] = 'visiting'
+            for source in self.recipes[name].sources:
+                if source in self.recipes:
+                    visit(source)
+            state[name] = 'done'
+            ordered.append(name)
+
+        for name in (self.recipes if names is None else names):
+            visit(name)
+        return ordered
+
+    def signature(self, recipe, signatures, font, memo):
+        if recipe.builder not in self._code_digests:
+            self._code_digests[recipe.builder] = code_digest(recipe.builder)
+        digest = hashlib.sha256()
+        digest.update(recipe.builder.__name__.encode('utf-8'))
+        digest.update(self._code_digests[recipe.builder].encode('utf-8'))
+        digest.update(self._shared_code.encode('utf-8'))
+        digest.update(repr(sorted(recipe.params.items())).encode('utf-8'))
+        for source in recipe.sources:
+            source_signature = (signatures[source] if source in self.recipes
+                                else glyph_digest(font, source, memo))
+            digest.update('\0{}\0{}'.format(source, source_signature).encode('utf-8'))
+        return digest.hexdigest()
+
+    def evaluate(self, font, names=None, previous=None, reuse=None, changed=None):
+        """Build (or reuse) the named recipes and their dependencies, in dependency order.
+
+        previous maps names to the signatures recorded with the previous
+        output; reuse(recipe) copies the recipe's glyph from that output and
+        returns False if it cannot.  changed(name), if given, is called once
+        each glyph has been built or copied.  Returns (signatures, built, reused).
+        """
+        previous = previous or {}
+        signatures, built, reused = {}, [], []
+        memo = {}
+        for name in self.order(names):
+            recipe = self.recipes[name]
+            signature = self.signature(recipe, signatures, font, memo)
+            if reuse is not None and previous.get(name) == signature and reuse(recipe):
+                reused.append(name)
+            else:
+                recipe.builder(font, recipe.target, **recipe.params)
+                built.append(name)
+            if changed is not None:
+                changed(name)
+            signatures[name] = signature
+        return signatures, built, reused
+
+
+def load_state(fname=STATE_FNAME):
+    try:
+        with open(fname) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(signatures, fname=STATE_FNAME):
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname + '.tmp', 'w') as fh:
+        json.dump(signatures, fh, indent=1, sort_keys=True)
+    os.replace(fname + '.tmp', fname)
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+Optical pair kerning from glyph side profiles, in NumPy.
+
+font.autoKern walks both outlines of every pair it is given, on every call,
+and pt7 makes some 25 calls over overlapping sets of glyphs.  Kerner instead
+samples each glyph once: its ink (references resolved) is cut into
+BAND-high horizontal bands, and the side bearings of the ink in each band
+make the glyph's left and right profiles.  The distance between two glyphs
+in a band is the left glyph's right bearing plus the right glyph's left
+bearing, so a whole rule is a few array operations over
+lefts x rights x bands.
+
+A pair's optical distance is the power mean, with exponent OPTICAL_POWER,
+of its distances in the bands where both glyphs have ink; the negative
+exponent lets the closest bands dominate without ignoring the rest (a
+distance of zero or less, where the outlines overlap, counts as one unit).
+The pair is kerned so that this distance becomes sep, or with touch=True so
+that the closest band does.  Otherwise the rules behave like font.autoKern,
+and take the same keywords: a kern smaller than minKern, or with
+onlyCloser=True any kern that would open the pair up, is set to 0, and every
+rule overwrites the pairs it covers, so the rule written last wins.  The
+optional damper scales the kerns the rule wrote, as pt7 has always done.
+
+These choices (band height, exponent, minKern) put the kerns of pt7's rule
+table within a few units of FontForge's on most pairs, and the pairs its
+comments tune (FO, ES, Tr, CK) within six.  pt7 kerns with Kerner;
+XKCD_KERN_ENGINE=fontforge switches it back to font.autoKern.
+
+A pair's optical and touching distances depend only on the two glyphs, so
+Kerner keeps them in ../generated/pt7_kerns.json between runs, keyed by
+each glyph's digest (outline, advance width and references, as
+glyph_recipes signs pt6's sources).  Only pairs with a new or edited glyph
+are measured again; the separation, damper and flags of each rule are
+applied to the stored distances.  Entries that no rule used are dropped
+when the cache is saved, and the whole cache is dropped when the band
+height, the exponent or the source of the code that measures distances
+changes.  font.autoKern keeps nothing between runs, so with
+XKCD_KERN_ENGINE=fontforge every run measures every pair again.
+
+Whichever engine measured them, pt7 writes the kerns as class kerning
+(class_kerning): each glyph joins the class of a key glyph, and each pair of
+classes gets one kern, the most common one among its member pairs.
+Accented letters and ligatures rarely kern exactly like their base, so the
+pairs that differ from their class's value are kept as exceptions in a pair
+subtable placed before the class subtable, which takes precedence; an
+unkerned member of a kerned class pair is an exception of 0.  The kerning
+every pair ends up with is therefore exactly the measured one;
+verify_class_kerning checks that on what FontForge stored.
+
+Both engines keep the kerns in a KernMatrix, a dict of rows by left glyph,
+so reading a pair, damping a rule and exporting the table never scan a
+glyph's whole pair list.  With font.autoKern, pt7 reloads the rows of a
+rule's left glyphs from the subtable after each call.
+"""
+import collections
+import hashlib
+import inspect
+import json
+import math
+import os
+
+import numpy as np
+
+import glyph_recipes
+import outline_geometry
+
+
+ENGINE_ENV = 'XKCD_KERN_ENGINE'
+ENGINES = ('numpy', 'fontforge')
+CACHE_FNAME = '../generated/pt7_kerns.json'
+
+BAND = 5  # font units
+OPTICAL_POWER = -4
+MIN_KERN = 5
+
+# Left glyphs measured at a time, which bounds the lefts x rights x bands array.
+_CHUNK = 32
+
+# firsts and seconds are tuples of classes (tuples of glyph names), class 0
+# empty on both sides; offsets holds the kern of every (first, second) class
+# pair, row by row; exceptions maps (left, right) to the pairs' own kerns.
+ClassKerning = collections.namedtuple('ClassKerning', 'firsts seconds offsets exceptions')
+
+
+def engine():
+    """$XKCD_KERN_ENGINE, or 'numpy'."""
+    name = os.environ.get(ENGINE_ENV) or ENGINES[0]
+    if name not in ENGINES:
+        raise ValueError('{} must be one of {}, not {!r}'.format(ENGINE_ENV, ', '.join(ENGINES), name))
+    return name
+
+
+class KernMatrix(object):
+    """Pair kerns as {left: {right: kern}}, rows in the order they were first written."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def get(self, left, right):
+        """The kern written for the pair, or None (like reading it back with getPosSub)."""
+        return self.rows.get(left, {}).get(right)
+
+    def set(self, left, right, value):
+        """Write a kern; a 0 is only kept where it overwrites an earlier kern, as with autoKern.
+
+        A stored 0 is a pair like any other: pairs() returns it, and it
+        reads back as 0 rather than None.
+        """
+        row = self.rows.get(left)
+        if row is None:
+            if not value:
+                return
+            row = self.rows[left] = {}
+        if value or right in row:
+            row[right] = value
+
+    def read_rows(self, font, subtable, lefts):
+        """Replace the rows of lefts with their pairs in a FontForge pair subtable."""
+        for left in lefts:
+            row = {possub[2]: possub[5] for possub in font[left].getPosSub(subtable)
+                   if possub[1] == 'Pair'}
+            if row or left in self.rows:
+                self.rows[left] = row
+
+    def damp(self, lefts, rights, damper):
+        """Scale the kerns of lefts x rights by damper; returns the [(left, right, kern)] changed."""
+        changed = []
+        for left in lefts:
+            row = self.rows.get(left, {})
+            for right in rights:
+                value = row.get(right)
+                if value and int(value * damper) != value:
+                    row[right] = int(value * damper)
+                    changed.append((left, right, row[right]))
+        return changed
+
+    def array(self, lefts, rights):
+        """(len(lefts), len(rights)) array of the pairs' kerns, 0 where unkerned."""
+        kerns = np.zeros((len(lefts), len(rights)), dtype=int)
+        for row, left in enumerate(lefts):
+            values = self.rows.get(left)
+            if values:
+                kerns[row] = [values.get(right, 0) for right in rights]
+        return kerns
+
+    def pairs(self):
+        """{(left, right): kern} of every pair written, for class_kerning."""
+        return {(left, right): value
+                for left, row in self.rows.items() for right, value in row.items()}
+
+
+class Kerner(object):
+    """Pair kerns for the glyphs of a font, measured on the ink GlyphGeometry gives."""
+
+    def __init__(self, font, geometry, band=BAND, cache=None):
+        self.font = font
+        self.geometry = geometry
+        self.band = band
+        self._profiles = {}
+        self.matrix = KernMatrix()
+        # 'optical'/'touch' -> left digest -> right digest -> distance (None
+        # where the glyphs share no band): what load_cache returned, plus
+        # whatever this run measures; _used is the part this run read.
+        self.cache = cache if cache is not None else {}
+        self._used = collections.defaultdict(lambda: collections.defaultdict(set))
+        self._digests = {}
+        self.measured = self.reused = 0
+
+    def profile(self, name):
+        """(first band, left bearings, right bearings) of the glyph, or None if it has no ink."""
+        if name not in self._profiles:
+            ink = self.geometry.ink(name)
+            bbox = ink.bounding_box()
+            if bbox is None:
+                self._profiles[name] = None
+            else:
+                first, stop = math.floor(bbox[1] / self.band), math.ceil(bbox[3] / self.band)
+                xmin, xmax = ink.band_x_bounds(np.arange(first, stop + 1) * self.band)
+                self._profiles[name] = (first, xmin, self.font[name].width - xmax)
+        return self._profiles[name]
+
+    def _sides(self, names, side, first, stop):
+        """(len(names), stop - first) array of the names' side bearings, NaN where there is no ink."""
+        sides = np.full((len(names), stop - first), np.nan)
+        for row, name in enumerate(names):
+            profile = self.profile(name)
+            if profile is not None:
+                bearings = profile[1 if side == 'left' else 2]
+                sides[row, profile[0] - first:profile[0] - first + len(bearings)] = bearings
+        return sides
+
+    def digest(self, name):
+        # 64 bits are plenty to tell a few thousand glyphs apart, and keep the cache small.
+        return glyph_recipes.glyph_digest(self.font, name, self._digests)[:16]
+
+    def distances(self, lefts, rights, touch=False):
+        """(len(lefts), len(rights)) array of the pairs' optical (or touching) distances, NaN
+        where the glyphs share no band; pairs found in the cache are not measured again."""
+        mode = 'touch' if touch else 'optical'
+        table = self.cache.setdefault(mode, {})
+        left_digests = [self.digest(name) for name in lefts]
+        right_digests = [self.digest(name) for name in rights]
+        result = np.full((len(lefts), len(rights)), np.nan)
+        missing = np.zeros((len(lefts), len(rights)), dtype=bool)
+        for row, left_digest in enumerate(left_digests):
+            known = table.get(left_digest, {})
+            self._used[mode][left_digest].update(right_digests)
+            for column, right_digest in enumerate(right_digests):
+                if right_digest in known:
+                    if known[right_digest] is not None:
+                        result[row, column] = known[right_digest]
+                else:
+                    missing[row, column] = True
+        self.measured += int(missing.sum())
+        self.reused += int(missing.size - missing.sum())
+
+        rows, columns = np.flatnonzero(missing.any(axis=1)), np.flatnonzero(missing.any(axis=0))
+        if len(rows):
+            fresh = self._measure([lefts[row] for row in rows], [rights[column] for column in columns],
+                                  touch)
+            for row, values in zip(rows, fresh):
+                known = table.setdefault(left_digests[row], {})
+                for column, value in zip(columns, values):
+                    result[row, column] = value
+                    known[right_digests[column]] = None if np.isnan(value) else float(value)
+        return result
+
+    def measure(self, sep, lefts, rights, touch=False):
+        """(len(lefts), len(rights)) array of the kerns that bring each pair to sep; NaN where
+        the glyphs share no band."""
+        return sep - self.distances(list(lefts), list(rights), touch)
+
+    def _measure(self, lefts, rights, touch):
+        profiles = [self.profile(name) for name in list(lefts) + list(rights)]
+        profiles = [profile for profile in profiles if profile is not None]
+        distances = np.full((len(lefts), len(rights)), np.nan)
+        if not profiles:
+            return distances
+        first = min(profile[0] for profile in profiles)
+        stop = max(profile[0] + len(profile[1]) for profile in profiles)
+        right_bearings = self._sides(lefts, 'right', first, stop)
+        left_bearings = self._sides(rights, 'left', first, stop)
+        for start in range(0, len(lefts), _CHUNK):
+            # (lefts, rights, bands)
+            distance = right_bearings[start:start + _CHUNK, None, :] + left_bearings[None, :, :]
+            inked = ~np.isnan(distance)
+            count = inked.sum(axis=2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if touch:
+                    optical = np.where(inked, distance, np.inf).min(axis=2)
+                else:
+                    powered = np.where(inked, np.maximum(distance, 1.0), 1.0) ** OPTICAL_POWER
+                    optical = ((powered * inked).sum(axis=2) / count) ** (1.0 / OPTICAL_POWER)
+            distances[start:start + _CHUNK] = np.where(count > 0, optical, np.nan)
+        return distances
+
+    def used_cache(self):
+        """The part of the cache this run read, for save_cache."""
+        return {mode: {left: {right: self.cache[mode][left][right] for right in sorted(rights)}
+                       for left, rights in sorted(lefts.items())}
+                for mode, lefts in sorted(self._used.items())}
+
+    def kern(self, sep, lefts, rights, minKern=MIN_KERN, onlyCloser=False, touch=False, damper=None):
+        """Kern every pair of lefts x rights to sep, like font.autoKern(subtable, sep, lefts, rights, ...)."""
+        lefts, rights = list(lefts), list(rights)
+        kerns = np.rint(np.nan_to_num(self.measure(sep, lefts, rights, touch)))
+        kerns[np.abs(kerns) < minKern] = 0
+        if onlyCloser:
+            kerns[kerns > 0] = 0
+        for row, left in enumerate(lefts):
+            for column, right in enumerate(rights):
+                value = int(kerns[row, column])
+                if damper and damper != 1.0:
+                    value = int(value * damper)
+                self.matrix.set(left, right, value)
+
+    def get(self, left, right):
+        """The kern written for the pair, or None (like reading it back with getPosSub)."""
+        return self.matrix.get(left, right)
+
+
+# The functions the cached distances are computed by.
+_MEASURING_CODE = (Kerner.profile, Kerner._sides, Kerner._measure,
+                   outline_geometry.OutlineGeometry.band_x_bounds)
+
+
+def _cache_profile():
+    # Distances measured with other settings, or by other code, are not reused.
+    code = hashlib.sha256()
+    for function in _MEASURING_CODE:
+        code.update('\0{}\0{}'.format(function.__qualname__, inspect.getsource(function)).encode('utf-8'))
+    return {'band': BAND, 'optical_power': OPTICAL_POWER, 'code': code.hexdigest()[:16]}
+
+
+def load_cache(fname=CACHE_FNAME):
+    """The distances save_cache stored, or {} if there are none for the current settings."""
+    try:
+        with open(fname) as fh:
+            state = json.load(fh)
+    except FileNotFoundError:
+        return {}
+    return state['distances'] if state.get('profile') == _cache_profile() else {}
+
+
+def save_cache(kerner, fname=CACHE_FNAME):
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname + '.tmp', 'w') as fh:
+        json.dump({'profile': _cache_profile(), 'distances': kerner.used_cache()}, fh, sort_keys=True)
+    os.replace(fname + '.tmp', fname)
+
+
+def _classes(names, key):
+    groups = collections.defaultdict(list)
+    for name in names:
+        groups[key(name)].append(name)
+    return ((),) + tuple(tuple(groups[k]) for k in sorted(groups))
+
+
+def class_kerning(pairs, left_key, right_key):
+    """Split {(left, right): kern} into a ClassKerning; glyphs with the same key share a class.
+
+    A class pair's kern is the most common kern of its member pairs, unkerned
+    ones counting as 0, and every member pair with another kern is an
+    exception, with a kern of 0 where the pair is unkerned.  Only glyphs with
+    a nonzero kern join a class.
+    """
+    kerns = {pair: value for pair, value in pairs.items() if value}
+    firsts = _classes(sorted({left for left, _ in kerns}), left_key)
+    seconds = _classes(sorted({right for _, right in kerns}), right_key)
+
+    offsets, exceptions = [], {}
+    for first in firsts:
+        for second in seconds:
+            values = collections.Counter(kerns.get((left, right), 0)
+                                         for left in first for right in second)
+            offset = values.most_common(1)[0][0] if values else 0
+            offsets.append(offset)
+            exceptions.update(((left, right), kerns.get((left, right), 0))
+                              for left in first for right in second
+                              if kerns.get((left, right), 0) != offset)
+    return ClassKerning(firsts, seconds, tuple(offsets), exceptions)
+
+
+def effective_kerns(classes):
+    """{(left, right): kern} of every pair the ClassKerning stores a kern for, exceptions first.
+
+    Exceptions of 0 are kept, like the zeros a KernMatrix stores; class pairs
+    of 0 kern nothing.
+    """
+    kerns = {}
+    for row, first in enumerate(classes.firsts):
+        for column, second in enumerate(classes.seconds):
+            offset = classes.offsets[row * len(classes.seconds) + column]
+            if offset:
+                kerns.update(((left, right), offset) for left in first for right in second)
+    kerns.update(classes.exceptions)
+    return kerns
+
+
+def verify_class_kerning(pairs, classes):
+    """Raise ValueError unless the ClassKerning kerns every pair by the same amount, unkerned as 0."""
+    actual = effective_kerns(classes)
+    changed = sorted(pair for pair in set(pairs) | set(actual)
+                     if pairs.get(pair, 0) != actual.get(pair, 0))
+    if changed:
+        raise ValueError('Class kerning changes {} pairs, e.g. {}'.format(
+            len(changed), ', '.join('{}+{}: {} -> {}'.format(
+                left, right, pairs.get((left, right), 0), actual.get((left, right), 0))
+                for left, right in changed[:5])))
+
+
+def read_pairs(font, subtable):
+    """{(left, right): kern} of a FontForge pair-positioning subtable."""
+    return {(glyph.glyphname, possub[2]): possub[5]
+            for glyph in font.glyphs() for possub in glyph.getPosSub(subtable)
+            if possub[1] == 'Pair'}
+
+
+def write_class_kerning(font, lookup, subtable, classes):
+    """Put the exceptions in the (empty) pair subtable and the classes in a new subtable after it."""
+    for (left, right), value in classes.exceptions.items():
+        font[left].addPosSub(subtable, right, 0, 0, value, 0, 0, 0, 0, 0)
+    font.addKerningClass(lookup, subtable + '-classes', classes.firsts, classes.seconds,
+                         classes.offsets, subtable)
+
+
+def read_class_kerning(font, subtable):
+    """The ClassKerning that write_class_kerning(font, ..., subtable, ...) stored."""
+    firsts, seconds, offsets = font.getKerningClass(subtable + '-classes')
+    return ClassKerning(tuple(tuple(first or ()) for first in firsts),
+                        tuple(tuple(second or ()) for second in seconds),
+                        tuple(offsets), read_pairs(font, subtable))
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed outline geometry for repeated scanline and bounds queries.
+
+FontForge's layer.xBoundsAtY / yBoundsAtX walk every contour of the glyph on
+each call, and reading points back through the Python API costs a round trip
+per point.  OutlineGeometry reads a glyph's contours once into NumPy arrays:
+
+  * the control polygon — the contour points in order, on- and off-curve,
+    joined by straight edges (what _scan_stroke_width has always measured);
+  * a flattened polyline — each curve sampled at SAMPLES even steps plus its
+    x and y turning points.  Extremes of a curve therefore lie on sample
+    points, and where a band edge cuts a curve the crossing is refined on the
+    curve itself, so band bounds match FontForge's exact ones.
+
+Every query is then a handful of array operations over all segments at once.
+The geometry is a snapshot: rebuild it after transforming the glyph.
+"""
+import numpy as np
+
+
+SAMPLES = 16
+BISECTIONS = 40
+
+
+def _as_cubic(ctrl):
+    """Degree-elevate the control points of a line or quadratic to an exact cubic."""
+    if len(ctrl) == 4:
+        return ctrl
+    if len(ctrl) == 3:
+        p0, p1, p2 = ctrl
+        return np.array([p0, p0 + 2 / 3 * (p1 - p0), p2 + 2 / 3 * (p1 - p2), p2])
+    p0, p1 = ctrl
+    return np.array([p0, p0 + (p1 - p0) / 3, p0 + 2 * (p1 - p0) / 3, p1])
+
+
+def _bezier(ctrl, t):
+    """Evaluate (M, 4, 2) cubic control points at (M, S) parameters, giving (M, S, 2)."""
+    t = t[..., None]
+    mt = 1 - t
+    return (mt ** 3 * ctrl[:, None, 0] + 3 * mt ** 2 * t * ctrl[:, None, 1]
+            + 3 * mt * t ** 2 * ctrl[:, None, 2] + t ** 3 * ctrl[:, None, 3])
+
+
+def _turning_points(ctrl):
+    """(M, 4) parameters in (0, 1) where each cubic's x or y derivative vanishes, else 0."""
+    p0, p1, p2, p3 = ctrl.transpose(1, 0, 2)
+    # The derivative is a t^2 + b t + c, per curve and axis.
+    a = 3 * (-p0 + 3 * p1 - 3 * p2 + p3)
+    b = 6 * (p0 - 2 * p1 + p2)
+    c = 3 * (p1 - p0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root = np.sqrt(np.maximum(b * b - 4 * a * c, 0))
+        quadratic = np.abs(a) > 1e-12
+        ts = np.concatenate([np.where(quadratic, (-b + root) / (2 * a), -c / b),
+                             np.where(quadratic, (-b - root) / (2 * a), np.nan)], axis=1)
+    return np.where((ts > 0) & (ts < 1), ts, 0.0)
+
+
+class OutlineGeometry(object):
+    """Scanline and bounds queries over a snapshot of a glyph's contours.
+
+    contours is a sequence of closed (points, on_curve) pairs, as produced by
+    svg_outlines or from_layer().
+    """
+
+    def __init__(self, contours):
+        self.contours = [(np.asarray(points, dtype=float).reshape(-1, 2),
+                          np.asarray(on_curve, dtype=bool)) for points, on_curve in contours]
+
+        control, control_contour, lines, curves = [], [], [], []
+        for index, (points, on_curve) in enumerate(self.contours):
+            if not len(points):
+                continue
+            control.append(np.stack([points, np.roll(points, -1, axis=0)], axis=1))
+            control_contour.append(np.full(len(points), index))
+
+            on = np.flatnonzero(on_curve)
+            for start, stop in zip(on, np.append(on[1:], on[0] + len(points))):
+                ctrl = _as_cubic(points[np.arange(start, stop + 1) % len(points)])
+                (lines if stop - start == 1 else curves).append(ctrl)
+
+        # Straight edges are one segment each; curves are cut at the sample
+        # parameters.  Each flattened segment remembers its cubic and the
+        # parameter interval it spans, for refining band-edge crossings.
+        self.cubics = np.array(lines + curves).reshape(-1, 4, 2)
+        ts = [np.broadcast_to([0.0, 1.0], (len(lines), 2))]
+        if curves:
+            even = np.broadcast_to(np.linspace(0, 1, SAMPLES + 1), (len(curves), SAMPLES + 1))
+            ts.append(np.sort(np.concatenate(
+                [even, _turning_points(self.cubics[len(lines):])], axis=1), axis=1))
+        self.segment_cubic = np.concatenate(
+            [np.arange(len(lines)),
+             np.repeat(np.arange(len(lines), len(self.cubics)), SAMPLES + 4)]).astype(int)
+        self.segment_t = np.concatenate(
+            [np.stack([t[:, :-1], t[:, 1:]], axis=2).reshape(-1, 2) for t in ts])
+        samples = _bezier(self.cubics[self.segment_cubic], self.segment_t)
+        # (N, 2, 2) flattened segments: [segment, end, axis].
+        self.segments = samples
+
+        empty = np.zeros((0, 2, 2))
+        self.control_segments = np.concatenate(control) if control else empty
+        self.control_contour = (np.concatenate(control_contour) if control_contour
+                                else np.zeros(0, dtype=int))
+
+    @classmethod
+    def from_layer(cls, layer):
+        """Snapshot a fontforge.layer (or any iterable of contours of points with x, y, on_curve)."""
+        contours = []
+        for contour in layer:
+            points = [(p.x, p.y, p.on_curve) for p in contour]
+            contours.append((np.array([p[:2] for p in points], dtype=float).reshape(-1, 2),
+                             np.array([p[2] for p in points], dtype=bool)))
+        return cls(contours)
+
+    def bounding_box(self):
+        """(xmin, ymin, xmax, ymax) of the outline, or None if it is empty.
+
+        Curves are sampled at their turning points, so this is exact, like
+        FontForge's boundingBox() once extrema have been added.
+        """
+        if not len(self.segments):
+            return None
+        ends = self.segments.reshape(-1, 2)
+        return (*ends.min(axis=0), *ends.max(axis=0))
+
+    def centroid(self):
+        """(x, y) centre of mass of the area the contours enclose, or None if they enclose none.
+
+        Computed on the flattened polyline; counters, wound against their
+        outer contour, subtract from the area.
+        """
+        (x0, y0), (x1, y1) = self.segments[:, 0].T, self.segments[:, 1].T
+        cross = x0 * y1 - x1 * y0
+        area = cross.sum() / 2
+        if abs(area) < 1e-9:
+            return None
+        return ((x0 + x1) @ cross / (6 * area), (y0 + y1) @ cross / (6 * area))
+
+    def _bounds_in_band(self, along, across, lo, hi):
+        """Extent along `along` of the outline parts whose `across` coordinate is in [lo, hi]."""
+        c0, c1 = self.segments[:, 0, across], self.segments[:, 1, across]
+        delta = c1 - c0
+        flat = delta == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_lo = np.where(flat, 0.0, (lo - c0) / delta)
+            t_hi = np.where(flat, 1.0, (hi - c0) / delta)
+        t_min = np.maximum(np.minimum(t_lo, t_hi), 0)
+        t_max = np.minimum(np.maximum(t_lo, t_hi), 1)
+        inside = (t_min <= t_max) & (~flat | ((c0 >= lo) & (c0 <= hi)))
+        if not inside.any():
+            return None
+
+        # Segment ends inside the band are points on the curve; where the band
+        # edge cuts a segment instead, find where it cuts the curve.
+        index = np.flatnonzero(inside)
+        ends, cuts = [], []
+        for fraction, end in ((t_min[index], 0), (t_max[index], 1)):
+            whole = (fraction == end)
+            ends.append(self.segments[index[whole], end, along])
+            cut = index[~whole]
+            cuts.append((cut, c0[cut] + fraction[~whole] * delta[cut]))
+        cut = np.concatenate([cut for cut, _ in cuts])
+        edge = np.concatenate([edge for _, edge in cuts])
+        if len(cut):
+            ends.append(self._cut(cut, across, edge)[:, along])
+        ends = np.concatenate(ends)
+        return ends.min(), ends.max()
+
+    def _cut(self, segments, across, edge):
+        """Where each segment's curve crosses across == edge, found by bisection on the curve."""
+        cubics = self.cubics[self.segment_cubic[segments]]
+        t_a, t_b = self.segment_t[segments].T
+        sign_a = np.sign(self.segments[segments, 0, across] - edge)
+        for _ in range(BISECTIONS):
+            mid = (t_a + t_b) / 2
+            value = _bezier(cubics, mid[:, None])[:, 0, across] - edge
+            same = np.sign(value) == sign_a
+            t_a, t_b = np.where(same, mid, t_a), np.where(same, t_b, mid)
+        return _bezier(cubics, ((t_a + t_b) / 2)[:, None])[:, 0]
+
+    def x_bounds_at_y(self, y_lo, y_hi):
+        """Like layer.xBoundsAtY: (xmin, xmax) of the outline where y_lo <= y <= y_hi, or None."""
+        return self._bounds_in_band(0, 1, y_lo, y_hi)
+
+    def band_x_bounds(self, edges):
+        """(xmin, xmax) arrays of the outline in each band edges[k] <= y <= edges[k + 1].
+
+        All bands are measured at once on the flattened polyline, without
+        refining band-edge cuts on the curve, so a bound that falls on a cut
+        may be off by the flattening error.  Bands without ink are NaN.
+        """
+        edges = np.asarray(edges, dtype=float)
+        lo, hi = edges[:-1, None], edges[1:, None]
+        (x0, y0), (x1, y1) = self.segments[:, 0].T, self.segments[:, 1].T
+        dx, dy = x1 - x0, y1 - y0
+        flat = dy == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_lo = np.where(flat, 0.0, (lo - y0) / dy)
+            t_hi = np.where(flat, 1.0, (hi - y0) / dy)
+        t_min = np.maximum(np.minimum(t_lo, t_hi), 0)
+        t_max = np.minimum(np.maximum(t_lo, t_hi), 1)
+        # (bands, segments): which part of each segment lies in each band.
+        inside = (t_min <= t_max) & (~flat | ((y0 >= lo) & (y0 <= hi)))
+        xa, xb = x0 + t_min * dx, x0 + t_max * dx
+        xmin = np.where(inside, np.minimum(xa, xb), np.inf).min(axis=1, initial=np.inf)
+        xmax = np.where(inside, np.maximum(xa, xb), -np.inf).max(axis=1, initial=-np.inf)
+        empty = ~inside.any(axis=1)
+        return np.where(empty, np.nan, xmin), np.where(empty, np.nan, xmax)
+
+    def y_bounds_at_x(self, x_lo, x_hi):
+        """Like layer.yBoundsAtX: (ymin, ymax) of the outline where x_lo <= x <= x_hi, or None."""
+        return self._bounds_in_band(1, 0, x_lo, x_hi)
+
+    def contour_ymins(self):
+        """The lowest point (on- or off-curve) of each contour, in contour order."""
+        return np.array([points[:, 1].min() if len(points) else np.inf
+                         for points, _ in self.contours])
+
+    def scanline_crossings(self, ys):
+        """Sorted control-polygon crossings of every horizontal line in ys at once.
+
+        Row k holds the x positions where the control polygon strictly crosses
+        y = ys[k], in increasing order and padded with NaN to a common length.
+        """
+        ys = np.asarray(ys, dtype=float)[:, None]
+        (x0, y0), (x1, y1) = self.control_segments[:, 0].T, self.control_segments[:, 1].T
+        # (scanlines, segments): which segment each line crosses, and where.
+        crossing = (y0 - ys) * (y1 - ys) < 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xs = np.where(crossing, x0 + (ys - y0) / (y1 - y0) * (x1 - x0), np.nan)
+        xs = np.sort(xs, axis=1)
+        return xs[:, :crossing.sum(axis=1).max(initial=0)]
+
+    def scan_widths(self, ys):
+        """The smallest gap between consecutive crossings on each line in ys, or NaN with fewer than two."""
+        gaps = np.diff(self.scanline_crossings(ys), axis=1)
+        if not gaps.shape[1]:
+            return np.full(len(gaps), np.nan)
+        with np.errstate(invalid='ignore'):
+            gaps = np.where(np.isnan(gaps), np.inf, gaps).min(axis=1)
+        return np.where(np.isinf(gaps), np.nan, gaps)
+
+    def stroke_width_histogram(self, ys, bins):
+        """np.histogram of scan_widths(ys) over the lines that have one."""
+        widths = self.scan_widths(ys)
+        return np.histogram(widths[~np.isnan(widths)], bins=bins)
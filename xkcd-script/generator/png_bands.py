@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Decode a PNG a band of rows at a time, for scans too big to decode whole.
+
+A PNG's pixels are one zlib stream of rows, each prefixed by a filter byte;
+the filters (Sub, Up, Average, Paeth) refer to the row above.  read_bands()
+inflates the stream incrementally, never holding more than a band of
+filtered rows, and hands each band to PIL as a small PNG of its own: the
+band's rows as they are, preceded by the last decoded row of the previous
+band stored unfiltered, so that PIL's C unfiltering sees the row above and
+every band decodes exactly as it would in the whole image.
+
+Only non-interlaced 8-bit greyscale, grey+alpha, RGB and RGBA images are
+read this way; PNGs that need a palette or other bit depths are rare for
+scans, and shape() returns None for them.
+"""
+import io
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+
+SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Samples per pixel of the 8-bit colour types read_bands() decodes.
+SAMPLES = {0: 1, 2: 3, 4: 2, 6: 4}
+
+# Compressed bytes read from the file at a time.
+_READ_SIZE = 1 << 16
+
+
+def _chunks(fh):
+    """(type, data) of each chunk of the PNG, IDAT data in pieces of at most _READ_SIZE."""
+    while True:
+        length, kind = struct.unpack('>I4s', fh.read(8))
+        if kind == b'IDAT':
+            while length:
+                piece = fh.read(min(length, _READ_SIZE))
+                length -= len(piece)
+                yield kind, piece
+        else:
+            yield kind, fh.read(length)
+        fh.read(4)  # CRC
+        if kind == b'IEND':
+            return
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def shape(fname):
+    """The (rows, columns[, samples]) array shape of a PNG read_bands() can decode, or None."""
+    with open(fname, 'rb') as fh:
+        if fh.read(8) != SIGNATURE:
+            return None
+        kind, ihdr = next(_chunks(fh))
+    width, height, depth, colour, _, _, interlace = struct.unpack('>IIBBBBB', ihdr)
+    if kind != b'IHDR' or depth != 8 or colour not in SAMPLES or interlace:
+        return None
+    return (height, width) if SAMPLES[colour] == 1 else (height, width, SAMPLES[colour])
+
+
+def read_bands(fname, band_height):
+    """Yield (first row, rows) for consecutive bands of at most band_height rows."""
+    rows_shape = shape(fname)
+    if rows_shape is None:
+        raise ValueError('{} is not a non-interlaced 8-bit PNG without a palette'.format(fname))
+    height, width = rows_shape[:2]
+    with open(fname, 'rb') as fh:
+        fh.read(8)
+        chunks = _chunks(fh)
+        _, ihdr = next(chunks)
+        colour = ihdr[9]
+        row_bytes = 1 + width * SAMPLES[colour]
+        stream = zlib.decompressobj()
+        pending = b''
+        filtered = bytearray()
+        above = None
+        for start in range(0, height, band_height):
+            rows = min(band_height, height - start)
+            while len(filtered) < rows * row_bytes:
+                if not pending:
+                    kind, pending = next(chunks)
+                    if kind != b'IDAT':
+                        pending = b''
+                        continue
+                filtered += stream.decompress(pending, rows * row_bytes - len(filtered))
+                pending = stream.unconsumed_tail
+            seed = b'' if above is None else b'\0' + above
+            png = (SIGNATURE +
+                   _chunk(b'IHDR', struct.pack('>IIBBBBB', width, rows + (above is not None),
+                                               8, colour, 0, 0, 0)) +
+                   _chunk(b'IDAT', zlib.compress(seed + bytes(filtered), 1)) +
+                   _chunk(b'IEND', b''))
+            del filtered[:]
+            band = np.asarray(Image.open(io.BytesIO(png)))
+            if above is not None:
+                band = band[1:]
+            above = band[-1].tobytes()
+            yield start, band
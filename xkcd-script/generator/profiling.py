@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight timing and memory spans for the generator scripts.
+
+Wrap a step in `with profiling.span('name'):` to record its wall time, CPU
+time and the process's peak RSS as a Chrome trace "complete" event.  Events
+are appended, one JSON object per line, to the file named by $XKCD_PROFILE;
+when that variable is unset, span() does nothing.  `build.py --profile
+trace.json` sets it for every stage and gathers the events, together with
+one event per stage, into a trace that chrome://tracing or Perfetto can open.
+"""
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+
+
+PROFILE_ENV = 'XKCD_PROFILE'
+
+
+def trace_event(name, start_ns, end_ns, pid, tid, args):
+    """A Chrome trace complete ("X") event; timestamps are microseconds since the epoch."""
+    return {'name': name, 'ph': 'X', 'ts': start_ns // 1000, 'dur': (end_ns - start_ns) // 1000,
+            'pid': pid, 'tid': tid, 'args': args}
+
+
+def write_event(event, fname=None):
+    fname = fname or os.environ[PROFILE_ENV]
+    # A single O_APPEND write per line keeps events from concurrent workers whole.
+    with open(fname, 'a') as fh:
+        fh.write(json.dumps(event, sort_keys=True) + '\n')
+
+
+@contextlib.contextmanager
+def span(name, **args):
+    """Record the enclosed block as one trace event, if $XKCD_PROFILE is set.
+
+    Yields the event's args dict, so the block can attach results (e.g. how
+    many pairs it produced) that are only known once it has run.
+    """
+    if not os.environ.get(PROFILE_ENV):
+        yield args
+        return
+    start_ns = time.time_ns()
+    start_cpu = time.process_time()
+    try:
+        yield args
+    finally:
+        end_ns = time.time_ns()
+        args['cpu_ms'] = round((time.process_time() - start_cpu) * 1000, 3)
+        args['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        write_event(trace_event(name, start_ns, end_ns, os.getpid(),
+                                threading.get_native_id(), args))
+
+
+def read_events(fname):
+    """The events appended to fname, or [] if nothing was recorded."""
+    try:
+        with open(fname) as fh:
+            return [json.loads(line) for line in fh if line.strip()]
+    except FileNotFoundError:
+        return []
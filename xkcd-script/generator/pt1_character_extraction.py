@@ -1,24 +1,132 @@
 import os
 #import matplotlib.pyplot as plt
-from skimage.color import rgb2gray
-import scipy.ndimage.measurements
-from skimage import measure
 import numpy as np
 from scipy import ndimage as ndi
 
 import skimage.io
 
+import png_bands
 
 
-#handwriting_img = plt.imread('handwriting_minimal.png')
-handwriting_img = skimage.io.imread('handwriting_minimal.png')
-handwriting_img_gray = rgb2gray(handwriting_img)
+SCAN_FNAME = 'handwriting_minimal.png'
+
+# Scratch files backing the scan and its labels, so that neither has to be held in memory.
+SCAN_CACHE_DIR = '../generated/scan_cache'
 
-labels, _ = ndi.label(handwriting_img_gray < 1)
+# The number of scan rows that are decoded and labelled at a time.
+BAND_HEIGHT = 1024
 
-stroke_locations = measure.regionprops(labels)
 
-from collections import OrderedDict, namedtuple
+def load_scan(fname, cache_dir=SCAN_CACHE_DIR):
+    """
+    Return the scan as a read-only, memory-mapped uint8 array.
+
+    The decoded pixels are cached as a .npy file next to the other generated
+    files, and only re-decoded when the scan is newer than the cache. The scan
+    is decoded BAND_HEIGHT rows at a time straight into the cache, so the whole
+    image is never in memory; PNGs png_bands can't read are decoded whole.
+
+    """
+    cache_fname = os.path.join(cache_dir, os.path.splitext(os.path.basename(fname))[0] + '.npy')
+    if (not os.path.exists(cache_fname) or
+            os.path.getmtime(cache_fname) < os.path.getmtime(fname)):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        shape = png_bands.shape(fname)
+        if shape is None:
+            img = skimage.io.imread(fname)
+            bands, shape = [(0, img)], img.shape
+        else:
+            bands = png_bands.read_bands(fname, BAND_HEIGHT)
+        cache = np.lib.format.open_memmap(cache_fname + '.tmp', mode='w+',
+                                          dtype=np.uint8, shape=shape)
+        for start, band in bands:
+            cache[start:start + len(band)] = band
+        cache.flush()
+        del bands, cache
+        os.replace(cache_fname + '.tmp', cache_fname)
+    return np.load(cache_fname, mmap_mode='r')
+
+
+def label_scan(img, labels_fname, band_height=BAND_HEIGHT):
+    """
+    Label the 4-connected ink (anything that isn't pure white) of the scan.
+
+    The scan is labelled in horizontal bands of band_height rows. Labels that
+    meet across a band boundary are joined, and the result is renumbered so that
+    the labels and slices are exactly those of ndi.label and ndi.find_objects
+    over the whole scan. Returns the (memory-mapped) labels and the slices.
+
+    """
+    height, width = img.shape[:2]
+    labels = np.lib.format.open_memmap(labels_fname, mode='w+', dtype=np.int32,
+                                       shape=(height, width))
+
+    # Provisional labels are numbered band by band. Track which of them join up
+    # (a union-find forest) and the bounding box of each.
+    parents = [0]
+    band_slices = [None]
+
+    def find(label):
+        while parents[label] != label:
+            parents[label] = parents[parents[label]]
+            label = parents[label]
+        return label
+
+    for start in range(0, height, band_height):
+        band = img[start:start + band_height]
+        band_labels, n_labels = ndi.label((band[..., :3] != 255).any(axis=-1))
+        first = len(parents)
+        band_labels[band_labels > 0] += first - 1
+        labels[start:start + band.shape[0]] = band_labels
+
+        parents.extend(range(first, first + n_labels))
+        for rows, cols in ndi.find_objects(band_labels)[first - 1:]:
+            band_slices.append((slice(rows.start + start, rows.stop + start), cols))
+
+        if start:
+            # Ink that touches vertically across the boundary is the same stroke.
+            above, below = labels[start - 1], labels[start]
+            touching = (above > 0) & (below > 0)
+            for label_above, label_below in set(zip(above[touching].tolist(),
+                                                    below[touching].tolist())):
+                root_above, root_below = find(label_above), find(label_below)
+                if root_above != root_below:
+                    # Keep the smaller label as the root, so that a root is always
+                    # the first of its stroke's labels in raster order.
+                    parents[max(root_above, root_below)] = min(root_above, root_below)
+
+    # Number the final labels in order of their roots, which is the order that
+    # ndi.label would have given them.
+    roots = [find(label) for label in range(len(parents))]
+    final = np.zeros(len(parents), dtype=np.int32)
+    stroke_slices = []
+    for label, root in enumerate(roots[1:], start=1):
+        if root == label:
+            stroke_slices.append(band_slices[label])
+            final[label] = len(stroke_slices)
+        else:
+            final[label] = final[root]
+            rows, cols = stroke_slices[final[root] - 1]
+            other_rows, other_cols = band_slices[label]
+            stroke_slices[final[root] - 1] = (
+                slice(min(rows.start, other_rows.start), max(rows.stop, other_rows.stop)),
+                slice(min(cols.start, other_cols.start), max(cols.stop, other_cols.stop)))
+
+    for start in range(0, height, band_height):
+        labels[start:start + band_height] = final[labels[start:start + band_height]]
+    labels.flush()
+
+    return labels, stroke_slices
+
+
+#handwriting_img = plt.imread('handwriting_minimal.png')
+handwriting_img = load_scan(SCAN_FNAME)
+
+# One (row slice, column slice) pair per label, in label order.
+labels, stroke_slices = label_scan(handwriting_img, os.path.join(SCAN_CACHE_DIR, 'labels.npy'))
+
+from collections import OrderedDict, defaultdict, namedtuple
 
 Metric = namedtuple('Metric', ['maxx', 'maxy', 'minx', 'miny', 'withinx', 'withiny'])
 
@@ -61,99 +169,134 @@ def merge_images(img1, img1_bbox, img2, img2_bbox):
     return merged_image, bbox
 
 
-def min_interval_distance(interval_1, interval_2):
+def _interval_metrics(lo, hi, other_lo, other_hi):
     """
-    Calculate the distance between two intervals.
-    
-       >>> min_interval_distance([0, 1], [2, 3])
-       1
-       >>> min_interval_distance([0, 1], [0.5, 3])
-       0
-       >>> min_interval_distance([10, 11], [5, 8])
-       2
-       >>> min_interval_distance([10, 11], [8, 5])
-       2
-
-    There is so much room for more elegance here, but hey-ho...
+    Compare the interval [lo, hi] against many others at once, returning the
+    (min distance, max distance, containment) arrays. Interval end points may
+    be given in either order.
 
     """
-    interval_1_sorted = sorted(interval_1)
-    interval_2_sorted = sorted(interval_2)
+    lo, hi = np.minimum(lo, hi), np.maximum(lo, hi)
+    other_lo, other_hi = np.minimum(other_lo, other_hi), np.maximum(other_lo, other_hi)
 
-    min_distance = min([np.abs(i_1 - i_2) for i_1 in interval_1 for i_2 in interval_2])
-    within_1 = any(interval_1_sorted[0] <= i_2 <= interval_1_sorted[1] for i_2 in interval_2)    
-    within_2 = any(interval_2_sorted[0] <= i_1 <= interval_2_sorted[1] for i_1 in interval_1)
+    # The distance between every pair of end points.
+    distances = np.abs(np.stack([other_lo - lo, other_lo - hi,
+                                 other_hi - lo, other_hi - hi]))
 
-    if within_1 or within_2:
-        min_distance = 0
-    return min_distance
+    # Closed intervals that overlap (or touch) are no distance apart.
+    overlap = (other_lo <= hi) & (lo <= other_hi)
+    min_distance = np.where(overlap, 0, distances.min(axis=0))
+    max_distance = distances.max(axis=0)
 
+    within = (((other_lo <= lo) & (hi <= other_hi)) |
+              ((lo <= other_lo) & (other_hi <= hi)))
+    return min_distance, max_distance, within
 
-def max_interval_distance(interval_1, interval_2):
+
+def bbox_metrics(bbox, other_bboxes):
     """
-    Calculate the distance between two intervals.
-    
-       >>> max_interval_distance([0, 1], [2, 3])
-       3
-       >>> max_interval_distance([0, 1], [0.5, 3])
-       3
-       >>> max_interval_distance([10, 11], [5, 8])
-       6
-       >>> max_interval_distance([10, 11], [8, 5])
-       6
+    Measure one [miny, minx, maxy, maxx] bounding box against an (N, 4) array of
+    others, returning a Metric whose fields are length N arrays:
+
+     * minx/miny - the distance between the boxes along each axis (0 if they overlap)
+     * maxx/maxy - the distance between the furthest apart edges along each axis
+     * withinx/withiny - whether one box's extent contains the other's along each axis
 
-    There is so much room for more elegance here, but hey-ho...
+       >>> metric = bbox_metrics([0, 0, 1, 1], [[0, 2, 1, 3], [0, 0.5, 1, 3],
+       ...                                      [0, 5, 1, 8], [0, 2, 1, 3]])
+       >>> metric.minx.tolist(), metric.maxx.tolist()
+       ([1.0, 0.0, 4.0, 1.0], [3.0, 3.0, 8.0, 3.0])
+       >>> metric = bbox_metrics([0, 2, 0, 3], [[0, 0, 0, 4], [0, 0, 0, 1], [0, 4, 0, 0]])
+       >>> metric.withinx.tolist()
+       [True, False, True]
 
     """
-    max_distance = max([np.abs(i_1 - i_2) for i_1 in interval_1 for i_2 in interval_2])
-    return max_distance
+    bbox = np.asarray(bbox)
+    other_bboxes = np.asarray(other_bboxes).reshape(-1, 4)
+    minx, maxx, withinx = _interval_metrics(bbox[1], bbox[3],
+                                            other_bboxes[:, 1], other_bboxes[:, 3])
+    miny, maxy, withiny = _interval_metrics(bbox[0], bbox[2],
+                                            other_bboxes[:, 0], other_bboxes[:, 2])
+    return Metric(maxx=maxx, maxy=maxy, minx=minx, miny=miny,
+                  withinx=withinx, withiny=withiny)
 
 
-def contains(interval_1, interval_2):
-    """
-    Whether one bounding box entirely contains another
-    
-       >>> contains([0, 4], [2, 3])
-       True
-       >>> contains([0, 1], [0.5, 3])
-       False
-       >>> contains([2, 3], [4, 0])
-       True
+class BBoxGrid(object):
     """
-    interval_1_sorted = sorted(interval_1)
-    interval_2_sorted = sorted(interval_2)
-
-    within_1 = all(interval_1_sorted[0] <= i_2 <= interval_1_sorted[1] for i_2 in interval_2)    
-    within_2 = all(interval_2_sorted[0] <= i_1 <= interval_2_sorted[1] for i_1 in interval_1)
-    return within_1 or within_2
+    A uniform grid over stroke bounding boxes, used to find the strokes that are
+    close enough to a given stroke to be worth measuring.
+
+    Each bbox is registered in every cell that its (closed) extent touches, so
+    a window query returns every registered bbox that touches the window, plus
+    some that don't (the caller is expected to apply the exact test).
+
+       >>> grid = BBoxGrid(cell_size=100)
+       >>> grid.insert((0, 0, 10, 10))
+       >>> grid.insert((500, 500, 510, 510))
+       >>> sorted(grid.query((0, 0, 10, 10), pad_y=5, pad_x=5))
+       [(0, 0, 10, 10)]
+       >>> grid.remove((0, 0, 10, 10))
+       >>> sorted(grid.query((0, 0, 10, 10), pad_y=5, pad_x=5))
+       []
 
+    """
+    def __init__(self, cell_size=256):
+        self.cell_size = cell_size
+        self._cells = defaultdict(set)
+
+    def _cell_keys(self, miny, minx, maxy, maxx):
+        size = self.cell_size
+        for cell_y in range(int(miny) // size, int(maxy) // size + 1):
+            for cell_x in range(int(minx) // size, int(maxx) // size + 1):
+                yield cell_y, cell_x
+
+    def insert(self, bbox):
+        for key in self._cell_keys(*bbox):
+            self._cells[key].add(bbox)
+
+    def remove(self, bbox):
+        for key in self._cell_keys(*bbox):
+            cell = self._cells.get(key)
+            if cell is not None:
+                cell.discard(bbox)
+                if not cell:
+                    del self._cells[key]
+
+    def query(self, bbox, pad_y, pad_x):
+        """Return the set of registered bboxes near *bbox* grown by the given padding."""
+        found = set()
+        for key in self._cell_keys(bbox[0] - pad_y, bbox[1] - pad_x,
+                                   bbox[2] + pad_y, bbox[3] + pad_x):
+            cell = self._cells.get(key)
+            if cell:
+                found.update(cell)
+        return found
+
+
+# The stroke pixels have always been scaled by 255 in uint8 (a leftover from reading
+# the scan as floats), which wraps each value v to -v mod 256. That mapping is kept
+# (applied to each crop, as the scan itself is a read-only map) so the strokes are unchanged.
+# Every stroke is a view into one preallocated buffer, rather than its own array.
+stroke_shapes = [(rows.stop - rows.start, cols.stop - cols.start) + handwriting_img.shape[2:]
+                 for rows, cols in stroke_slices]
+stroke_buffer = np.empty(sum(int(np.prod(shape)) for shape in stroke_shapes), dtype=np.uint8)
 
 bbox_to_stroke_img = {}
+offset = 0
 
-for stroke in stroke_locations: 
-    # [miny, minx, maxy, maxx] (I don't know why its that way around...)
-    bbox = stroke.bbox
+for label, ((rows, cols), shape) in enumerate(zip(stroke_slices, stroke_shapes), start=1):
+    # [miny, minx, maxy, maxx] (matching skimage's regionprops bbox)
+    bbox = (rows.start, cols.start, rows.stop, cols.stop)
 
-    # Construct a slice that can be used to pick out this bounding box from
-    # the full image.
-    full_index = [slice(bbox[0], bbox[2]), slice(bbox[1], bbox[3])]
-    
-    # Pick out the sub-image, and take a copy so that we can modify it without
-    # modifying the original.
-    stroke_img = handwriting_img[tuple(full_index + [Ellipsis])].copy()
-    
-    # Using the "labels" array, produce a binary mask that is True for every
-    # pixel that is marked as this label, and False otherwise. 
-    stroke_mask = labels[tuple(full_index)] == stroke.label
-
-    # For each color channel, use the mask to maintain the full image pixels that
-    # are part of this stroke. Where a pixel remains that is not part of this stroke,
-    # replace it with 1 (ultimately making it white).
-    for channel in range(3):
-        stroke_img[:, :, channel] = np.where(stroke_mask, stroke_img[:, :, channel], 1)
-        
-    # Convert the image to an RGB byte array.
-    stroke_img = (stroke_img * 255).astype(np.uint8)
+    stroke_img = stroke_buffer[offset:offset + int(np.prod(shape))].reshape(shape)
+    offset += stroke_img.size
+
+    # Start from white, then copy across only the pixels that the "labels" array
+    # marks as part of this stroke.
+    stroke_img.fill(255)
+    stroke_mask = labels[rows, cols] == label
+    np.copyto(stroke_img, handwriting_img[rows, cols] * np.uint8(255),
+              where=stroke_mask[..., np.newaxis])
 
     bbox_to_stroke_img[bbox] = stroke_img
 
@@ -178,9 +321,19 @@ images_that_didnt_get_merged = []
 # with the composite.
 merged_bbox_to_stroke_img = bbox_to_stroke_img.copy()
 
-# We could use an RTree for efficient nearest neighbour lookup, but just use a greedy search for now.
 reduced_stroke_merge_contenders = stroke_merge_contenders.copy()
 
+# Every pair accepted by the merge condition below has minx < 10 and miny < 350
+# (containment in both axes implies both distances are 0), so only strokes within
+# that window of the contender need to be measured. The grid is kept in step with
+# merged_bbox_to_stroke_img as strokes are popped and merged.
+MERGE_WINDOW_X = 10
+MERGE_WINDOW_Y = 350
+
+stroke_grid = BBoxGrid()
+for bbox in merged_bbox_to_stroke_img:
+    stroke_grid.insert(bbox)
+
 
 while reduced_stroke_merge_contenders:
     bbox, img = reduced_stroke_merge_contenders.popitem()
@@ -191,36 +344,36 @@ while reduced_stroke_merge_contenders:
     
     # Remove this image from the final glyph set.
     merged_bbox_to_stroke_img.pop(bbox, None)
+    stroke_grid.remove(bbox)
+
+    # We don't want to merge with ourselves.
+    neighbours = stroke_grid.query(bbox, pad_y=MERGE_WINDOW_Y, pad_x=MERGE_WINDOW_X)
+    neighbours.discard(bbox)
+    neighbours = sorted(neighbours)
 
     candidates = []
-    for other_bbox, other_img in list(merged_bbox_to_stroke_img.items()):
-        if other_bbox == bbox:
-            # We don't want to merge with ourselves.
-            continue
-        
-        x_range, x_range_other = [other_bbox[1], other_bbox[3]], [bbox[1], bbox[3]]
-        minx = min_interval_distance(x_range, x_range_other)
-        miny = min_interval_distance([other_bbox[0], other_bbox[2]], [bbox[0], bbox[2]])
-        
-        maxx = max_interval_distance([other_bbox[1], other_bbox[3]], [bbox[1], bbox[3]])
-        maxy = max_interval_distance([other_bbox[0], other_bbox[2]], [bbox[0], bbox[2]])
-        
-        withinx = contains([other_bbox[1], other_bbox[3]], [bbox[1], bbox[3]])
-        withiny = contains([other_bbox[0], other_bbox[2]], [bbox[0], bbox[2]])
-        
-        metric = Metric(minx=minx, miny=miny, maxx=maxx, maxy=maxy, withinx=withinx, withiny=withiny)
-        
+    if neighbours:
+        metrics = bbox_metrics(bbox, neighbours)
+        minx, miny, maxx, maxy = metrics.minx, metrics.miny, metrics.maxx, metrics.maxy
+        is_contender = np.array([other_bbox in reduced_stroke_merge_contenders
+                                 for other_bbox in neighbours])
+
         # The condition for which a pair of glyphs will be consiered for merging.
         # This took a significant amount of iteration to get a good performance.
-        if (withinx and withiny) or \
-                (((maxx < 250 or minx == 0) and minx < 10) and miny < 50) or \
-                (other_bbox in reduced_stroke_merge_contenders and minx == 0 and maxy < 350):    
-            candidates.append([metric, other_bbox, other_img])
+        mergeable = ((metrics.withinx & metrics.withiny) |
+                     (((maxx < 250) | (minx == 0)) & (minx < 10) & (miny < 50)) |
+                     (is_contender & (minx == 0) & (maxy < 350)))
+
+        for index in np.flatnonzero(mergeable):
+            other_bbox = neighbours[index]
+            metric = Metric(*(field[index] for field in metrics))
+            candidates.append([metric, other_bbox, merged_bbox_to_stroke_img[other_bbox]])
 
     if not candidates:
         images_that_didnt_get_merged.append([img, bbox])
         # Put the stroke back into the new_bboxes so that we don't loose it.
         merged_bbox_to_stroke_img[bbox] = img
+        stroke_grid.insert(bbox)
     else:
         # Prefer the candidates with a small maximum x over anything else.
         candidates.sort(key=lambda candidate: (candidate[0].maxx, candidate))
@@ -230,6 +383,7 @@ while reduced_stroke_merge_contenders:
 
         # We're done with the other image too - remove it from the results.
         merged_bbox_to_stroke_img.pop(other_bbox)
+        stroke_grid.remove(other_bbox)
 
         # If the resulting image is *tiny* then consider putting it back
         # into the pool of items that may be merged. This really is only of
@@ -241,16 +395,25 @@ while reduced_stroke_merge_contenders:
 
         images_that_were_mergers.append(merged_bbox)
         merged_bbox_to_stroke_img[merged_bbox] = merged_image
+        stroke_grid.insert(merged_bbox)
 
 
 
 import os.path
 import skimage.io
 
-strokes_dir = '../generated/strokes'
-if not os.path.exists(strokes_dir):
-    os.makedirs(strokes_dir)
+import stroke_pack
+
+# Hand the strokes to pt2 as one packed archive, keyed on [minx, miny, maxx, maxy].
+stroke_pack.write_strokes({(bbox[1], bbox[0], bbox[3], bbox[2]): img_array
+                           for bbox, img_array in merged_bbox_to_stroke_img.items()})
+
+# Optionally also write each stroke as a PNG, for eyeballing the merge results.
+if os.environ.get('XKCD_DEBUG_STROKES'):
+    strokes_dir = '../generated/strokes'
+    if not os.path.exists(strokes_dir):
+        os.makedirs(strokes_dir)
 
-for bbox, img_array in merged_bbox_to_stroke_img.items():
-    fname = '../generated/strokes/stroke_x{1}_y{0}_x{3}_y{2}.png'.format(*bbox)
-    skimage.io.imsave(fname, img_array)
+    for bbox, img_array in merged_bbox_to_stroke_img.items():
+        fname = '../generated/strokes/stroke_x{1}_y{0}_x{3}_y{2}.png'.format(*bbox)
+        skimage.io.imsave(fname, img_array)
@@ -1,48 +1,26 @@
 # -*- coding: utf-8 -*-
 
+"""
+Assign pt1's strokes to the characters of the transcribed sample sheet.
+
+characters() streams one Character record per glyph, in transcript order.
+Single-stroke characters are read-only views into pt1's memory-mapped stroke
+archive.  Multi-stroke characters (the glyphs_needing_two_strokes and the
+_LIGATURE_SOURCES ligatures) are composited into one buffer allocated up
+front.  pt3 traces the records as they arrive.  Run as a script, this writes
+each record to ../generated/characters as a PPM for inspection.
+"""
 import base64
-import glob
+import collections
 import os
 
-import matplotlib
-matplotlib.use('agg')
-import matplotlib.pyplot as plt
 import numpy as np
-import parse
 
-
-pattern = 'stroke_x{x0:d}_y{y0:d}_x{x1:d}_y{y1:d}.png'
-strokes_by_bbox = {}
-for fname in glob.glob('../generated/strokes/stroke*.png'):
-    result = parse.parse(pattern, os.path.basename(fname))
-    bbox = (result['x0'], result['y0'], result['x1'], result['y1'])
-    img = (plt.imread(fname) * 255).astype(np.uint8)
-    strokes_by_bbox[bbox] = img
-
-
-import scipy.cluster.vq
-
-n_lines = 11
-
-xs, ys = zip(*[[bbox[0], bbox[3]]
-                for bbox, img in strokes_by_bbox.items()])
-xs = np.array(xs, dtype=float)
-ys = np.array(ys, dtype=float)
-
-np.random.seed(0)  # Ensure deterministic k-means initialisation for reproducible font output.
-lines, _ = scipy.cluster.vq.kmeans(ys, n_lines, iter=1000)
-lines = np.array(sorted(lines))
-
-glyphs_by_line = [[] for _ in range(n_lines)]
-for bbox, img  in list(strokes_by_bbox.items()):
-    nearest_line = np.argmin(np.abs(bbox[3] - lines))
-    glyphs_by_line[nearest_line].append([bbox, img])
-
-# Put the glyphs in order from left-to-right.
-for glyph_line in glyphs_by_line:
-    glyph_line.sort(key=lambda args: args[0][0])
+import stroke_pack
+import tracing
 
 
+OUT_DIR = '../generated/characters'
 
 paragraph = r"""
 a b c d e f g h i j k l m n o p q r s t u v w x y z
@@ -61,73 +39,174 @@ paragraphs = [[char for char in line.replace('   ', ' ').split(' ') if char]
               for line in paragraph.split('\n')]
 
 
-glyphs_needing_two_strokes = ['≪', '≫', '|>', '<|']
-
-
-
-def merge(img1, img1_bbox, img2, img2_bbox):
-    bbox = (min([img1_bbox[0], img2_bbox[0]]),
-            min([img1_bbox[1], img2_bbox[1]]),
-            max([img1_bbox[2], img2_bbox[2]]),
-            max([img1_bbox[3], img2_bbox[3]]),
-            )
-    shape = bbox[3] - bbox[1], bbox[2] - bbox[0], 3
-    img1_slice = [slice(img1_bbox[1] - bbox[1], img1_bbox[3] - bbox[1]),
-                  slice(img1_bbox[0] - bbox[0], img1_bbox[2] - bbox[0])]
-
-    img2_slice = [slice(img2_bbox[1] - bbox[1], img2_bbox[3] - bbox[1]),
-                  slice(img2_bbox[0] - bbox[0], img2_bbox[2] - bbox[0])]
-
-    merged_image = np.zeros(shape, dtype=np.uint8)
-    merged_image.fill(255)
-    merged_image[tuple(img1_slice)] = img1
-    merged_image[tuple(img2_slice)] = np.where(img2 != 255, img2, merged_image[tuple(img2_slice)])
-    return merged_image, bbox
-
-
-
-characters_by_line = []
-
-for line_no, (character_line, glyph_line) in enumerate(zip(paragraphs, glyphs_by_line)):
-    glyph_iter = iter(glyph_line)
-    characters_this_line = []
-    characters_by_line.append(characters_this_line)
-
-    for char_no, character in enumerate(character_line):
-        bbox, img = next(glyph_iter)
-        if character in glyphs_needing_two_strokes:
-            other_bbox, other_img = next(glyph_iter)
-            img, bbox = merge(img, bbox, other_img, other_bbox)
-        characters_this_line.append([character, bbox, img])
+def segment_lines(ys, n_lines):
+    """Return the centres, top to bottom, of the optimal 1-D k-means split of ys into n_lines.
+
+    The strokes of one line form a contiguous run of the sorted ys, so the best
+    split (least total squared distance to the line centres) is found exactly by
+    dynamic programming over the sorted values.  The split cost satisfies the
+    quadrangle inequality, so the best split point never moves left as the end
+    point moves right, and each row is filled by divide and conquer in O(n log n).
+    """
+    ys = np.sort(np.asarray(ys, dtype=float))
+    n = len(ys)
+    if n < n_lines:
+        raise ValueError('Cannot split {} strokes into {} lines'.format(n, n_lines))
+    sums = np.concatenate([[0], np.cumsum(ys)])
+    sq_sums = np.concatenate([[0], np.cumsum(ys * ys)])
+
+    def cost(starts, ends):
+        """Sum of squared deviations of ys[start:end] from their mean, for each (start, end)."""
+        total = sums[ends] - sums[starts]
+        return sq_sums[ends] - sq_sums[starts] - total * total / (ends - starts)
+
+    best = np.full(n + 1, np.inf)
+    best[0] = 0
+    splits = np.zeros((n_lines + 1, n + 1), dtype=int)
+    for k in range(1, n_lines + 1):
+        prev, best = best, np.full(n + 1, np.inf)
+        # Divide and conquer, one recursion level at a time: each pending range
+        # of end points [lo, hi] is known to split somewhere in [split_lo, split_hi].
+        lo, hi = np.array([k]), np.array([n])
+        split_lo, split_hi = np.array([k - 1]), np.array([n - 1])
+        while len(lo):
+            end = (lo + hi) // 2
+            counts = np.minimum(split_hi, end - 1) - split_lo + 1
+            offsets = np.cumsum(counts) - counts
+            starts = np.arange(counts.sum()) + np.repeat(split_lo - offsets, counts)
+            costs = prev[starts] + cost(starts, np.repeat(end, counts))
+            lowest = np.minimum.reduceat(costs, offsets)
+            # The first start in each range that reaches its minimum.
+            hits = np.flatnonzero(costs == np.repeat(lowest, counts))
+            _, first = np.unique(np.searchsorted(offsets, hits, side='right'), return_index=True)
+            choice = starts[hits[first]]
+            best[end] = lowest
+            splits[k, end] = choice
+
+            lo, hi = np.concatenate([lo, end + 1]), np.concatenate([end - 1, hi])
+            split_lo = np.concatenate([split_lo, choice])
+            split_hi = np.concatenate([choice, split_hi])
+            pending = lo <= hi
+            lo, hi = lo[pending], hi[pending]
+            split_lo, split_hi = split_lo[pending], split_hi[pending]
+
+    centres = []
+    end = n
+    for k in range(n_lines, 0, -1):
+        start = splits[k, end]
+        centres.append(ys[start:end].mean())
+        end = start
+    return np.array(centres[::-1])
+
+
+def strokes_by_line(strokes_by_bbox):
+    """Split {bbox: image} into one left-to-right list of (bbox, image) per transcript line."""
+    # The transcript has one row per written line, so it also says how many lines to find.
+    n_lines = len(paragraphs)
+
+    bboxes = list(strokes_by_bbox)
+    lines = segment_lines([bbox[3] for bbox in bboxes], n_lines)
+
+    # Each stroke belongs to the line whose centre is nearest its bottom edge.
+    line_of_stroke = np.searchsorted((lines[1:] + lines[:-1]) / 2,
+                                     [bbox[3] for bbox in bboxes])
+    glyphs_by_line = [[] for _ in range(n_lines)]
+    for bbox, line_no in zip(bboxes, line_of_stroke):
+        glyphs_by_line[line_no].append((bbox, strokes_by_bbox[bbox]))
+
+    # Put the glyphs in order from left-to-right.
+    for glyph_line in glyphs_by_line:
+        glyph_line.sort(key=lambda args: args[0][0])
+    return glyphs_by_line
 
 
+glyphs_needing_two_strokes = ['≪', '≫', '|>', '<|']
 
+# Ligatures built from two neighbouring characters of a line, as
+# (line, left character, right character, ligature).
 _LIGATURE_SOURCES = [
     (5, 4, 5, 'TH'),   # UNAUTHORITATIVENESS: T + H
     (5, 31, 32, 'TR'),  # INTRACOLIC: T + R
     (6, 24, 25, 'TI'),  # ALBERTITE: T + I
 ]
-for line_no, left_no, right_no, lig in _LIGATURE_SOURCES:
-    _, left_bbox, left_img = characters_by_line[line_no][left_no]
-    _, right_bbox, right_img = characters_by_line[line_no][right_no]
-    lig_img, lig_bbox = merge(left_img, left_bbox, right_img, right_bbox)
-    characters_by_line[line_no].append([lig, lig_bbox, lig_img])
-
-
-import skimage.io
-
-if not os.path.isdir('../generated/characters'):
-    os.makedirs('../generated/characters')
-
-replacements = {'/': 'forward-slash', '_': 'underscore'}
 
-for line_no, line in enumerate(characters_by_line):
-    for char_no, (char, bbox, img) in enumerate(line):
-        char_repr = '-'.join(replacements.get(c, c) for c in char)
-        hex_repr = '-'.join(str(hex(ord(c))) for c in char)
-        b64_repr = base64.b64encode(char.encode('utf-8')).decode('ascii')
 
-        fname = ('char_L{}_P{}_x{}_y{}_x{}_y{}_{b64_repr}.ppm'
-                 ''.format(line_no, char_no, *bbox, b64_repr=b64_repr))
-        fname = os.path.join('../generated/characters', fname)
-        skimage.io.imsave(fname, img)
+Character = collections.namedtuple('Character', 'line_no char_no char bbox img')
+
+
+def union_bbox(bboxes):
+    x0s, y0s, x1s, y1s = zip(*bboxes)
+    return min(x0s), min(y0s), max(x1s), max(y1s)
+
+
+def character_strokes(glyphs_by_line):
+    """Return [(line_no, char_no, char, [(bbox, image), ...])] for every character.
+
+    Each line's ligatures follow its characters, numbered on from them.
+    """
+    planned = []
+    for line_no, (character_line, glyph_line) in enumerate(zip(paragraphs, glyphs_by_line)):
+        glyph_iter = iter(glyph_line)
+        line_strokes = []
+        for character in character_line:
+            strokes = [next(glyph_iter)]
+            if character in glyphs_needing_two_strokes:
+                strokes.append(next(glyph_iter))
+            line_strokes.append(strokes)
+        for lig_line_no, left_no, right_no, lig in _LIGATURE_SOURCES:
+            if lig_line_no == line_no:
+                character_line = character_line + [lig]
+                line_strokes.append(line_strokes[left_no] + line_strokes[right_no])
+        planned.extend((line_no, char_no, char, strokes) for char_no, (char, strokes)
+                       in enumerate(zip(character_line, line_strokes)))
+    return planned
+
+
+def characters(strokes_by_bbox=None):
+    """Yield a Character for every glyph on the sample sheet, in transcript order.
+
+    Strokes never share an ink pixel (pt1 gives each its own mask and fills the
+    rest of its box with 255), so compositing several strokes with np.minimum
+    over a 255-filled box leaves each stroke's ink untouched.
+    """
+    if strokes_by_bbox is None:
+        strokes_by_bbox = stroke_pack.read_strokes()
+    planned = character_strokes(strokes_by_line(strokes_by_bbox))
+
+    # One buffer holds every multi-stroke character, each in its own slice.
+    composite_shapes = []
+    for _, _, _, strokes in planned:
+        if len(strokes) > 1:
+            x0, y0, x1, y1 = union_bbox([bbox for bbox, _ in strokes])
+            composite_shapes.append((y1 - y0, x1 - x0, stroke_pack.CHANNELS))
+    buffer = np.full(sum(int(np.prod(shape)) for shape in composite_shapes), 255, dtype=np.uint8)
+
+    offset = 0
+    for line_no, char_no, char, strokes in planned:
+        if len(strokes) == 1:
+            (bbox, img), = strokes
+        else:
+            bbox = union_bbox([stroke_bbox for stroke_bbox, _ in strokes])
+            shape = (bbox[3] - bbox[1], bbox[2] - bbox[0], stroke_pack.CHANNELS)
+            img = buffer[offset:offset + int(np.prod(shape))].reshape(shape)
+            offset += img.size
+            for (x0, y0, x1, y1), stroke_img in strokes:
+                region = img[y0 - bbox[1]:y1 - bbox[1], x0 - bbox[0]:x1 - bbox[0]]
+                np.minimum(region, stroke_img, out=region)
+        yield Character(line_no, char_no, char, bbox, img)
+
+
+def character_fname(character, ext='.ppm'):
+    """The file name pt3 and pt5 use for a character, e.g. char_L0_P0_x.._y.._x.._y.._YQ==.ppm."""
+    b64_repr = base64.b64encode(character.char.encode('utf-8')).decode('ascii')
+    fname = ('char_L{}_P{}_x{}_y{}_x{}_y{}_{b64_repr}{ext}'
+             ''.format(character.line_no, character.char_no, *character.bbox,
+                       b64_repr=b64_repr, ext=ext))
+    return os.path.join(OUT_DIR, fname)
+
+
+if __name__ == '__main__':
+    os.makedirs(OUT_DIR, exist_ok=True)
+    for character in characters():
+        with open(character_fname(character), 'wb') as fh:
+            fh.write(tracing.pnm_bytes(character.img))
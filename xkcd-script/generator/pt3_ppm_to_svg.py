@@ -1,16 +1,29 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import division
-import subprocess
 
-def potrace(input_fname, output_fname):
-    subprocess.check_call(['potrace', '-s', input_fname, '-o', output_fname])
+import os
 
+import pt2_character_classification as pt2
+import tracing
 
-import os
-import glob
 
-for fname in glob.glob('../generated/characters/char_*.ppm'):
-    new_name = os.path.splitext(fname)[0] + '.svg'
-    potrace(fname, new_name)
+# Characters are traced as pt2 streams them: each bitmap goes straight to
+# potrace's stdin, one potrace process per core, while pt2 is still compositing
+# the next ones.  Characters whose bitmap is unchanged since an earlier run come
+# from the trace cache instead.
+os.makedirs(pt2.OUT_DIR, exist_ok=True)
+cache = tracing.TraceCache('pt3')
+
+traced = []
+
+
+def bitmaps():
+    for character in pt2.characters():
+        traced.append(character)
+        yield tracing.pnm_bytes(character.img)
+
 
+for character_no, svg in enumerate(tracing.trace_all(bitmaps(), cache=cache)):
+    with open(pt2.character_fname(traced[character_no], ext='.svg'), 'wb') as fh:
+        fh.write(svg)
@@ -4,13 +4,18 @@ Extract hand-drawn glyphs from extras/ and convert them to SVG.
 
 Outputs go to ../generated/additional_chars/ and are consumed by pt5_svg_to_font.py.
 """
+import concurrent.futures
+import inspect
+import multiprocessing
 import os
-import subprocess
 import tempfile
 import numpy as np
 from PIL import Image
 import fontforge
 
+import cores
+import tracing
+
 OUT_DIR = '../generated/additional_chars'
 os.makedirs(OUT_DIR, exist_ok=True)
 
@@ -72,8 +77,8 @@ def _clean_potrace_svg(raw_svg_path, clean_svg_path):
     os.remove(clean_svg_path + '.sfd')
 
 
-def extract_symbol(arr, y0, y1, x0, x1, name, exclude=None, pad=0):
-    """Crop glyph region, upsample, binarise, run potrace, clean, save SVG.
+def crop_symbol(arr, y0, y1, x0, x1, exclude=None, pad=0):
+    """Crop a glyph region out of a greyscale source image.
 
     exclude: optional list of (y0, y1, x0, x1) regions in full-image coordinates
              to blank out (set to background) before potrace, for removing
@@ -89,26 +94,50 @@ def extract_symbol(arr, y0, y1, x0, x1, name, exclude=None, pad=0):
             crop[ey0 - y0:ey1 - y0, ex0 - x0:ex1 - x0] = 255
     if pad:
         crop = np.pad(crop, pad, mode='constant', constant_values=255)
+    return crop
+
+
+# Cleaned SVGs are cached against the PBM handed to potrace, so the key covers
+# the crop, exclude/pad, upsampling and threshold.  The tag covers the clean-up:
+# editing _clean_potrace_svg or switching FontForge versions retraces everything.
+TRACE_CACHE = tracing.TraceCache(
+    'pt4 fontforge {}\n{}'.format(fontforge.version(), inspect.getsource(_clean_potrace_svg)))
+
+
+def trace_symbol(crop, name):
+    """Upsample and binarise a cropped glyph, run potrace, clean, save SVG.
+
+    The binarised bitmap is handed to potrace as an in-memory PBM; potrace's
+    raw SVG only touches disk because FontForge imports outlines from a file.
+    """
     upsample = SPECIALUPSAMPLE.get(name, UPSAMPLE)
     big = Image.fromarray(crop).resize(
         (crop.shape[1] * upsample, crop.shape[0] * upsample),
         Image.BILINEAR)
-    binary = (np.array(big) >= THRESHOLD).astype(np.uint8) * 255
+    bitmap = tracing.pbm_bytes(np.array(big) < THRESHOLD)
+    svg_path = os.path.join(OUT_DIR, f'{name}.svg')
+
+    svg = TRACE_CACHE.lookup(bitmap)
+    if svg is not None:
+        with open(svg_path, 'wb') as fh:
+            fh.write(svg)
+        return svg_path
 
     with tempfile.TemporaryDirectory() as tmp:
-        png_path = os.path.join(tmp, f'{name}.png')
-        pbm_path = os.path.join(tmp, f'{name}.pbm')
-        raw_svg  = os.path.join(tmp, f'{name}_raw.svg')
-        Image.fromarray(binary, mode='L').save(png_path)
-        subprocess.check_call(['convert', png_path, '-threshold', '50%', pbm_path])
-        subprocess.check_call(['potrace', '-s', pbm_path, '-o', raw_svg])
-        svg_path = os.path.join(OUT_DIR, f'{name}.svg')
+        raw_svg = os.path.join(tmp, f'{name}_raw.svg')
+        with open(raw_svg, 'wb') as fh:
+            fh.write(tracing.potrace_svg(bitmap))
         _clean_potrace_svg(raw_svg, svg_path)
+    with open(svg_path, 'rb') as fh:
+        TRACE_CACHE.store(bitmap, fh.read())
 
-    print(f'  wrote {svg_path}')
     return svg_path
 
 
+# Crops from every source, as (crop, name), traced together once all are collected.
+symbol_crops = []
+
+
 # ---------------------------------------------------------------------------
 # xkcd 2586 "Greek Letters" — 2x image (889 × 1699 px)
 # Symbol column: cols 80–136; coordinates are 2× the 1x bounds.
@@ -150,8 +179,8 @@ _greek_image = os.path.join(os.path.dirname(__file__), '2586_greek_letters_2x.pn
 print(f'Extracting Greek letters from {_greek_image}...')
 arr_greek = np.array(Image.open(_greek_image).convert('L'))
 for name, (y0, y1, x0, x1) in GREEK_LETTERS_2586.items():
-    extract_symbol(arr_greek, y0, y1, x0, x1, name,
-                   exclude=GREEK_EXCLUDE_2586.get(name))
+    symbol_crops.append((crop_symbol(arr_greek, y0, y1, x0, x1,
+                                     exclude=GREEK_EXCLUDE_2586.get(name)), name))
 
 
 # ---------------------------------------------------------------------------
@@ -192,7 +221,7 @@ for name, filename in EXTRAS:
     src_path = os.path.join(EXTRAS_DIR, f'{filename}.png')
     arr_extra = np.array(Image.open(src_path).convert('L'))
     h, w = arr_extra.shape
-    extract_symbol(arr_extra, 0, h, 0, w, name, pad=10)
+    symbol_crops.append((crop_symbol(arr_extra, 0, h, 0, w, pad=10), name))
 
 
 # ---------------------------------------------------------------------------
@@ -211,4 +240,20 @@ _ai_ext_1_image = os.path.join(os.path.dirname(__file__), 'ai_extensions_1.png')
 print(f'Extracting ligatures from {_ai_ext_1_image}...')
 arr_ai1 = np.array(Image.open(_ai_ext_1_image).convert('L'))
 for name, (y0, y1, x0, x1) in AI_EXT_1.items():
-    extract_symbol(arr_ai1, y0, y1, x0, x1, name)
+    symbol_crops.append((crop_symbol(arr_ai1, y0, y1, x0, x1), name))
+
+
+# ---------------------------------------------------------------------------
+# Trace every crop, one worker process per core.  Each worker builds its own
+# scratch FontForge font in _clean_potrace_svg; results come back in table order.
+# ---------------------------------------------------------------------------
+
+print(f'Tracing {len(symbol_crops)} glyphs...')
+with concurrent.futures.ProcessPoolExecutor(
+        cores.available_cores(),
+        mp_context=multiprocessing.get_context('fork')) as pool:
+    crops, names = zip(*symbol_crops)
+    for svg_path in pool.map(trace_symbol, crops, names):
+        print(f'  wrote {svg_path}')
+TRACE_CACHE.prune()
+
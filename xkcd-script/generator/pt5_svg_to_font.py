@@ -18,6 +18,11 @@ import glob
 import parse
 import unicodedata
 
+import glyph_pool
+import outline_geometry
+import profiling
+import svg_outlines
+
 SPACE = 0
 RSPACE = 20
 
@@ -61,30 +66,7 @@ def basic_font():
     return font
 
 
-from contextlib import contextmanager
-import tempfile
-import shutil
-import os
-
-
-@contextmanager
-def tmp_symlink(fname):
-    """
-    Create a temporary symlink to a file, so that applications that can't handle
-    unicode filenames don't barf (I'm looking at you font-forge)
-
-    """
-    target = tempfile.mktemp(suffix=os.path.splitext(fname)[1])
-    fname = os.path.normpath(os.path.abspath(fname))
-    try:
-        os.symlink(fname, target)
-        yield target
-    finally:
-        if os.path.exists(target):
-            os.remove(target)
-
-
-def create_char(font, chars, fname):
+def create_char(font, chars, contours):
     if len(chars) == 1:
         # A single unicode character, so I create a character in the font for it.
 
@@ -109,12 +91,16 @@ def create_char(font, chars, fname):
 
     c.clear()
 
-    # Use the workaround to have non-unicode filenames.
-    with tmp_symlink(fname) as tmp_fname:
-        # At last, bring in the SVG image as an outline for this glyph.
-        c.importOutlines(tmp_fname)
-        # Call addExtrema() first to ensure the proper operation of boundingBox().
-        c.addExtrema()
+    # At last, bring in the (already scaled and positioned) outline for this glyph.
+    layer = fontforge.layer()
+    for points, on_curve in contours:
+        contour = fontforge.contour()
+        for (x, y), on in zip(points.tolist(), on_curve.tolist()):
+            contour += fontforge.point(x, y, on)
+        contour.closed = True
+        layer += contour
+    c.foreground = layer
+    c.addExtrema()
 
     return c
 
@@ -172,69 +158,30 @@ for line in line_stats.keys():
         # not yet for < 0.90 (pending)
 
 
-def scale_glyph(char, char_bbox, baseline, cap_height):
-    # TODO: The code in this function is convoluted - it can be hugely simplified.
-    # Essentially, all this function does is figure out how much
-    # space a normal glyph takes, then looks at how much space *this* glyph takes.
-    # With that magic ratio in hand, I now look at how much space the glyph *currently*
-    # takes, and scale it to the full EM. On second thoughts, this function really does
-    # need to be convoluted, so maybe the code isn't *that* bad...
-
-    font = char.font
-
-    # Get hold of the bounding box information for the imported glyph.
-    import_bbox = c.boundingBox()
-    import_width, import_height = import_bbox[2] - import_bbox[0], import_bbox[3] - import_bbox[1]
-
-    # Note that timportOutlines doesn't guarantee glyphs will be put in any particular location,
-    # so translate to the bottom and middle.
-
-    target_baseline = char.font.descent
-    top = char.font.ascent
-    top_ratio = top / (top + target_baseline)
-
-    y_base_delta_baseline = char_bbox[3] - baseline
-
-    width, height = char_bbox[2] - char_bbox[0], char_bbox[3] - char_bbox[1]
-
-    # This is the scale factor that font forge will have used for normal glyphs...
-    scale_factor = (top + target_baseline) / (cap_height - baseline)
-    glyph_ratio = (cap_height - baseline) / height
-
-    # A nice glyph size, in pixels. NOTE: In pixel space, cap_height is smaller than baseline, so make it positive.
-    full_glyph_size = -(cap_height - baseline) / top_ratio
-
-    to_canvas_coord_from_px = full_glyph_size / font.em
-
-    anchor_ratio = (top + target_baseline) / height
-
-    # pixel scale factor
-    px_sf = (top + target_baseline) / font.em
-
-    frac_of_full_size = (height / full_glyph_size)
-    import_frac_1000 = font.em / import_height
-
-    t = psMat.scale(frac_of_full_size * import_frac_1000)
-    c.transform(t)
-
-
-def translate_glyph(c, char_bbox, cap_height, baseline):
-    # Put the glyph in the middle, and move it relative to the baseline.
+def placement_matrix(font, import_bbox, char_bbox, baseline, cap_height):
+    """The psMat that scales and positions an imported outline in the EM.
 
+    Essentially: figure out how much space a normal glyph takes, then look at
+    how much space *this* glyph takes.  With that ratio in hand, scale the
+    outline (whose imported bounds are import_bbox) to its share of the full
+    EM, then take it to x=0 and a y based on its position relative to the
+    baseline in the original handwriting sample.
+    """
     # Compute the proportion of the full EM that cap_height - baseline should consume.
-    top_ratio = c.font.ascent / (c.font.ascent + c.font.descent)
+    top_ratio = font.ascent / (font.ascent + font.descent)
 
     # In the original pixel coordinate space, compute how big a nice full sized glyph
-    # should be.
+    # should be. NOTE: In pixel space, cap_height is smaller than baseline, so make it positive.
     full_glyph_size = -(cap_height - baseline) / top_ratio
 
-    # We know that the scale of the glyph is now good. But it is probably way off in terms of x & y, so we
-    # need to fix up its position.
-    glyph_bbox = c.boundingBox()
-    # No matter where it is currently, take the glyph to x=0 and a y based on its positioning in
-    # the original handwriting sample.
-    t = psMat.translate(-glyph_bbox[0], -glyph_bbox[1] + ((baseline - char_bbox[3]) * c.font.em / full_glyph_size))
-    c.transform(t)
+    height = char_bbox[3] - char_bbox[1]
+    frac_of_full_size = height / full_glyph_size
+    import_height = import_bbox[3] - import_bbox[1]
+    scale = frac_of_full_size * font.em / import_height
+
+    y_offset = (baseline - char_bbox[3]) * font.em / full_glyph_size
+    return (scale, 0, 0, scale, -import_bbox[0] * scale, -import_bbox[1] * scale + y_offset)
+
 
 def pad_glyph(c):
     # Put horizontal padding around the glyph. I choose a number here that looks reasonable,
@@ -243,10 +190,11 @@ def pad_glyph(c):
     space = SPACE
     rspace = RSPACE
     bbox = c.boundingBox()
+    geometry = outline_geometry.OutlineGeometry.from_layer(c.foreground)
     if c.glyphname in list('gjpqy'):
         # Recalculate the bounding box by excluding the tail of the glyph
         # Do not remove the glyph's tail if it is too close to the baseline
-        capxrange = c.foreground.xBoundsAtY(-40, 600)
+        capxrange = geometry.x_bounds_at_y(-40, 600)
         if c.glyphname == 'j':
             bbox = tuple([(capxrange[0]*2 + bbox[0])/3, bbox[1], capxrange[1], bbox[3]])
         else:
@@ -254,16 +202,16 @@ def pad_glyph(c):
     if c.glyphname == 'f':
         # Recalculate the bounding box by excluding the arm of the glyph
         # Restrict the arm so that it does not pierce through the stem of the next glyph
-        xxrange = c.foreground.xBoundsAtY(0, 420)
+        xxrange = geometry.x_bounds_at_y(0, 420)
         bbox = tuple([xxrange[0], bbox[1], max(xxrange[1], bbox[2] - (rspace + space + 0.12 * 600)), bbox[3]])
     # Measure the smoothness of a peak when there is one extremum.
-    lflatness = c.foreground.yBoundsAtX(bbox[0] - 20, bbox[0] + 20)
-    rflatness = c.foreground.yBoundsAtX(bbox[2] - 20, bbox[2] + 20)
+    lflatness = geometry.y_bounds_at_x(bbox[0] - 20, bbox[0] + 20)
+    rflatness = geometry.y_bounds_at_x(bbox[2] - 20, bbox[2] + 20)
     # In the case of a complex shape, the average depth is calculated from measurements taken at four points.
     # However, for a parabola, this is an algorithm that can accurately determine the coefficient of the quadratic term.
     roughness = []
     for i in range(4):
-        roughness.append(c.foreground.xBoundsAtY(100 + 100 * i, 150 + 100 * i) or tuple([bbox[2], bbox[0]]))
+        roughness.append(geometry.x_bounds_at_y(100 + 100 * i, 150 + 100 * i) or tuple([bbox[2], bbox[0]]))
     lroughness = np.median([np.sqrt(max(roughness[i][0] - bbox[0], 0)) for i in range(4)])**2
     rroughness = np.median([np.sqrt(max(bbox[2] - roughness[i][1], 0)) for i in range(4)])**2
     add_left = 0
@@ -363,61 +311,56 @@ special_choices = {('C', ): dict(line=4),
                    ('I', ): dict(line=4),
                    }
 
-for line, position, bbox, fname, chars in characters:
-    if chars in special_choices:
-        spec = special_choices[chars]
-        spec_line = spec.get('line', any)
-        if spec_line is not any and spec_line != line:
-            continue
-
-    c = create_char(font, chars, fname)
+# Parse every character outline up front; each is then placed with one matrix
+# and handed to FontForge as finished contours.
+with profiling.span('pt5 parse outlines'):
+    outlines = {fname: svg_outlines.read_outlines(fname)
+                for line, position, bbox, fname, chars in characters}
 
-    scale_glyph(
-        c, bbox,
-        baseline=_baselines[line],
-        cap_height=_baselines[line] - _spans[line])
 
-    translate_glyph(
-        c, bbox,
-        baseline=_baselines[line],
-        cap_height=_baselines[line] - _spans[line])
+def weight_corrections(line, chars, c):
+    """[(ops, height)] of the weight corrections for a freshly imported glyph, in order.
 
+    Each entry is a batch of glyph_pool ops, and the height to scale the glyph
+    back to once they have run (or None).
+    """
+    corrections = []
     # Correct for lines written at a significantly different scale than the median.
     # - Too large (fgs high): chars scaled down → thin strokes → fatten with changeWeight.
     # - Too small (fgs low): chars scaled up → thick/large glyphs → shrink with scale().
     _line_fgs = _full_glyph_sizes.get(line)
     if _line_fgs:
+        _scale_correction = _line_fgs / _median_full_glyph_size
+        _estimated_stroke = 0.12 * font.ascent
         if _line_fgs > _median_full_glyph_size * 1.10:
-            _scale_correction = _line_fgs / _median_full_glyph_size
-            _estimated_stroke = 0.12 * font.ascent
             _delta = int(round(_estimated_stroke * (_scale_correction - 1)))
-            c.removeOverlap()
-            c.changeWeight(_delta)
+            corrections.append(([('removeOverlap',), ('changeWeight', _delta)], None))
         elif _line_fgs < _median_full_glyph_size * 0.90:
-            _scale_correction = _line_fgs / _median_full_glyph_size
-            _estimated_stroke = 0.12 * font.ascent
             # Scale by 1.4 to compensate for the restore-scale partially undoing the thinning.
             _delta = int(round(_estimated_stroke * (_scale_correction - 1) * 1.4))
             _bb_before = c.boundingBox()
-            _h_before = _bb_before[3] - _bb_before[1]
-            c.removeOverlap()
-            c.changeWeight(_delta)
-            _bb_after = c.boundingBox()
-            _h_after = _bb_after[3] - _bb_after[1]
-            if _h_after > 0:
-                _restore = _h_before / _h_after
-                c.transform(psMat.scale(_restore))
-                c.width = int(round(c.width * _restore))
+            corrections.append(([('removeOverlap',), ('changeWeight', _delta)],
+                                _bb_before[3] - _bb_before[1]))
 
     # Per-character weight nudge: applied to source glyphs whose stroke weight
     # is noticeably off from the rest of the alphabet.
     _weight_nudge = _per_char_weight_nudge.get(chars)
     if _weight_nudge:
-        c.correctDirection()
-        c.removeOverlap()
-        c.changeWeight(_weight_nudge)
-        c.simplify()
+        corrections.append(([('correctDirection',), ('removeOverlap',),
+                             ('changeWeight', _weight_nudge), ('simplify',)], None))
+    return corrections
+
+
+def restore_height(c, h_before):
+    _bb_after = c.boundingBox()
+    _h_after = _bb_after[3] - _bb_after[1]
+    if _h_after > 0:
+        _restore = h_before / _h_after
+        c.transform(psMat.scale(_restore))
+        c.width = int(round(c.width * _restore))
 
+
+def finish_glyph(c, chars):
     # Per-character size adjustments: scale about the baseline (origin) to reduce
     # overall size while preserving stroke weight gained from changeWeight above.
     _operation_matrix = _per_char_operation.get(chars)
@@ -435,6 +378,60 @@ for line, position, bbox, fname, chars in characters:
     c.simplify()
     c.round()
 
+
+def finish_pending(pending):
+    """Run the pending glyphs' weight corrections as glyph_pool batches, then finish them in order."""
+    for step in range(max((len(corrections) for _, _, corrections in pending), default=0)):
+        jobs = [(c, corrections[step]) for c, _, corrections in pending if step < len(corrections)]
+        with profiling.span('pt5 weight corrections', glyphs=len(jobs)):
+            glyph_pool.run(font, [(c, ops) for c, (ops, _) in jobs])
+        for c, (_, height) in jobs:
+            if height is not None:
+                restore_height(c, height)
+    for c, chars, _ in pending:
+        finish_glyph(c, chars)
+    del pending[:]
+
+
+# Glyphs are imported and finished in sample order, but the weight corrections
+# of all glyphs other than the Latin letters wait in `pending` and run as
+# glyph_pool batches.  changeWeight measures its zones on the Latin letters,
+# so the batch is run before one of them is imported, and their own
+# corrections run in place.  Each glyph is therefore corrected against the
+# letters as they stood when it was imported, exactly as when every glyph was
+# finished before the next, and the output does not depend on XKCD_WORKERS.
+# A glyph imported again is finished first, so it keeps its last import.
+pending = []
+for line, position, bbox, fname, chars in characters:
+    if chars in special_choices:
+        spec = special_choices[chars]
+        spec_line = spec.get('line', any)
+        if spec_line is not any and spec_line != line:
+            continue
+
+    zone_letter = len(chars) == 1 and chars[0] in glyph_pool.ZONE_CHARS
+    if zone_letter or any(chars == pending_chars for _, pending_chars, _ in pending):
+        finish_pending(pending)
+
+    with profiling.span('pt5 import', glyph=''.join(chars)):
+        contours = outlines[fname]
+        matrix = placement_matrix(
+            font, svg_outlines.bounding_box(contours), bbox,
+            baseline=_baselines[line],
+            cap_height=_baselines[line] - _spans[line])
+        c = create_char(font, chars, svg_outlines.transform(contours, matrix))
+
+    corrections = weight_corrections(line, chars, c)
+    if not zone_letter:
+        pending.append((c, chars, corrections))
+        continue
+    for ops, height in corrections:
+        glyph_pool.apply_ops(c, ops)
+        if height is not None:
+            restore_height(c, height)
+    finish_glyph(c, chars)
+finish_pending(pending)
+
 c = font.createMappedChar(32)
 c.width = 256
 
@@ -458,26 +455,16 @@ def _scan_stroke_width(g, y_lo, y_hi, n=8):
     x-crossings of the contour edges (polyline approximation between consecutive
     points) and records the minimum gap between consecutive crossings.  Returns
     the median of those per-y minimums — approximating the typical thinnest
-    visible stroke in the scan band.
+    visible stroke in the scan band.  All n scanlines are intersected with all
+    edges in one pass (OutlineGeometry.scan_widths), so this is cheap enough to
+    run on every imported glyph (see _report_stroke_weights).
     """
-    results = []
-    for k in range(n):
-        y = y_lo + (y_hi - y_lo) * (k + 0.5) / n
-        xs = []
-        for contour in g.foreground:
-            pts = list(contour)
-            for i in range(len(pts)):
-                p1, p2 = pts[i], pts[(i + 1) % len(pts)]
-                if (p1.y - y) * (p2.y - y) < 0:
-                    t = (y - p1.y) / (p2.y - p1.y)
-                    xs.append(p1.x + t * (p2.x - p1.x))
-        xs.sort()
-        gaps = [xs[j + 1] - xs[j] for j in range(len(xs) - 1)]
-        if gaps:
-            results.append(min(gaps))
-    if not results:
+    geometry = outline_geometry.OutlineGeometry.from_layer(g.foreground)
+    ys = y_lo + (y_hi - y_lo) * (np.arange(n) + 0.5) / n
+    results = np.sort(geometry.scan_widths(ys))
+    results = results[~np.isnan(results)]
+    if not len(results):
         return None
-    results.sort()
     return results[len(results) // 2]
 
 
@@ -604,6 +591,7 @@ _GREEK_WEIGHT_NUDGE = {
     'lambda':  10,
 }
 
+_greek_glyphs = []
 for _name, _cp, _ref, _snap in _GREEK:
     _svg = os.path.join(_COMIC_CHARS_DIR, f'{_name}.svg')
     _target_top = font[_ref].boundingBox()[3]
@@ -632,36 +620,48 @@ for _name, _cp, _ref, _snap in _GREEK:
             if _bb[3] > 0:
                 _g.transform(psMat.scale(_target_top / _bb[3]))
                 _g.width = int(round(_g.boundingBox()[2] + 20))
-    # Normalise stroke width AFTER all positioning so that snap/descender
-    # re-scales do not alter the final stroke width.
+    _greek_glyphs.append((_name, _cp, _target_top, _g))
+
+
+def _reseat_greek(g, target_top):
+    """Restore a Greek letter's height and left bearing after changeWeight."""
+    bb = g.boundingBox()
+    if bb[3] > 0:
+        g.transform(psMat.scale(target_top / bb[3]))
+        bb = g.boundingBox()
+        g.transform(psMat.translate(-bb[0] + 20, 0))
+        g.width = int(round(g.boundingBox()[2] + 20))
+
+
+# Normalise stroke width AFTER all positioning so that snap/descender
+# re-scales do not alter the final stroke width.
+_norm_jobs = []
+for _name, _cp, _target_top, _g in _greek_glyphs:
     if _target_stroke is not None and _name not in _GREEK_NO_STROKE_NORM:
         _measured = _scan_stroke_width(_g, _target_top * 0.15, _target_top * 0.85)
         if _measured and _measured > 0:
             _delta = int(round(_target_stroke - _measured))
             if abs(_delta) > 3:
-                _g.correctDirection()
-                _g.addExtrema()
-                _g.removeOverlap()
-                _g.changeWeight(_delta)
-                _bb2 = _g.boundingBox()
-                if _bb2[3] > 0:
-                    _g.transform(psMat.scale(_target_top / _bb2[3]))
-                    _bb2 = _g.boundingBox()
-                    _g.transform(psMat.translate(-_bb2[0] + 20, 0))
-                    _g.width = int(round(_g.boundingBox()[2] + 20))
-    # Per-letter weight nudge (applied last so it overrides normalisation).
-    _nudge = _GREEK_WEIGHT_NUDGE.get(_name)
-    if _nudge:
-        _g.correctDirection()
-        _g.addExtrema()
-        _g.removeOverlap()
-        _g.changeWeight(_nudge)
-        _bb2 = _g.boundingBox()
-        if _bb2[3] > 0:
-            _g.transform(psMat.scale(_target_top / _bb2[3]))
-            _bb2 = _g.boundingBox()
-            _g.transform(psMat.translate(-_bb2[0] + 20, 0))
-            _g.width = int(round(_g.boundingBox()[2] + 20))
+                _norm_jobs.append((_g, [('correctDirection',), ('addExtrema',), ('removeOverlap',),
+                                        ('changeWeight', _delta)]))
+with profiling.span('pt5 Greek stroke normalisation', glyphs=len(_norm_jobs)):
+    glyph_pool.run(font, _norm_jobs)
+_normalised = {_g.glyphname for _g, _ in _norm_jobs}
+for _name, _cp, _target_top, _g in _greek_glyphs:
+    if _g.glyphname in _normalised:
+        _reseat_greek(_g, _target_top)
+
+# Per-letter weight nudge (applied last so it overrides normalisation).
+_nudge_jobs = [(_g, [('correctDirection',), ('addExtrema',), ('removeOverlap',),
+                     ('changeWeight', _GREEK_WEIGHT_NUDGE[_name])])
+               for _name, _cp, _target_top, _g in _greek_glyphs if _GREEK_WEIGHT_NUDGE.get(_name)]
+with profiling.span('pt5 Greek weight nudge', glyphs=len(_nudge_jobs)):
+    glyph_pool.run(font, _nudge_jobs)
+for _name, _cp, _target_top, _g in _greek_glyphs:
+    if _GREEK_WEIGHT_NUDGE.get(_name):
+        _reseat_greek(_g, _target_top)
+
+for _name, _cp, _target_top, _g in _greek_glyphs:
     _ch = font.createMappedChar(_cp)
     _ch.clear()
     for c in _g.foreground:
@@ -880,6 +880,43 @@ _paren_l = _import_math_centered('parenleft_tall', None, 0.8 * font.em,
 _mirror_glyph_x(_paren_l, 'parenright.tall')
 
 
+# ---------------------------------------------------------------------------
+# Stroke weight report
+# ---------------------------------------------------------------------------
+
+def _report_stroke_weights(font, target_stroke, n=32, tolerance=0.25):
+    """List the glyphs whose strokes are mostly off the target width.
+
+    Each glyph's stroke widths are scanned on n lines across the middle 70%
+    of its height and binned as thin / on target / heavy (within `tolerance`
+    of target_stroke).  The glyphs where most scanlines fall outside the
+    target bin are candidates for _per_char_weight_nudge or
+    _GREEK_WEIGHT_NUDGE; nothing is changed.  Like _scan_stroke_width, the
+    scan reads the length of horizontal bars as a width, so letters in
+    _GREEK_NO_STROKE_NORM and the like may show up as heavy.
+    """
+    bins = [0, target_stroke * (1 - tolerance), target_stroke * (1 + tolerance), np.inf]
+    off = []
+    for g in font.glyphs():
+        if g.glyphname.startswith('_') or not len(g.foreground):
+            continue
+        bb = g.boundingBox()
+        ys = bb[1] + (bb[3] - bb[1]) * (0.15 + 0.7 * (np.arange(n) + 0.5) / n)
+        geometry = outline_geometry.OutlineGeometry.from_layer(g.foreground)
+        (thin, on_target, heavy), _ = geometry.stroke_width_histogram(ys, bins)
+        if max(thin, heavy) > on_target:
+            off.append('{}{}'.format(g.glyphname, '-' if thin > heavy else '+'))
+    return off
+
+
+if _target_stroke is not None:
+    with profiling.span('pt5 stroke weight report') as _span_args:
+        _off_weight = _report_stroke_weights(font, _target_stroke)
+        _span_args.update(glyphs=len(_off_weight))
+    print(f'Stroke weight: {len(_off_weight)} glyphs mostly thinner (-) or heavier (+) than '
+          f'{_target_stroke:.0f} units: {" ".join(_off_weight)}')
+
+
 # ---------------------------------------------------------------------------
 # Save
 # ---------------------------------------------------------------------------
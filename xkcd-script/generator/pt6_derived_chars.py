@@ -4,13 +4,33 @@ Generate derived/composed characters: quote aliases, combining diacritical marks
 accented Latin letters, and Greek aliases and derived glyphs.
 
 Reads the base SFD produced by pt5_svg_to_font.py, adds derived glyphs, saves.
+
+Composed glyphs (accented letters, letters with strokes, Greek look-alikes,
+digraphs, spacing modifiers) are registered as recipes (see glyph_recipes)
+and evaluated together once every mark they use exists; a recipe whose
+sources, parameters and builder are unchanged since the last run is copied
+from the previous SFD instead of being rebuilt.
 """
 import math
+import os
+
 import fontforge
 import psMat
 
+import glyph_geometry
+import glyph_recipes
+import outline_geometry
+
 font_fname = '../generated/xkcd-script-pt6.sfd'
+# A XKCD_PT6_SUBSET build is saved here instead, and leaves the full font and
+# the recipe signatures recorded with it alone.
+subset_fname = '../generated/xkcd-script-pt6-subset.sfd'
 font = fontforge.open('../generated/xkcd-script-pt5.sfd')
+recipes = glyph_recipes.RecipeBook(fontforge.nameFromUnicode,
+                                   shared_code=[glyph_geometry, outline_geometry])
+# Recipe builders read base and mark boxes through this cache; evaluating a
+# recipe invalidates the glyph it builds.
+geometry = glyph_geometry.GlyphGeometry(font)
 
 
 # ---------------------------------------------------------------------------
@@ -25,10 +45,12 @@ def extract_top_contours(font, source_cp, n):
     source_cp may be an integer codepoint or a glyph name string.
     """
     layer = font[source_cp].foreground
-    contours = sorted(layer, key=lambda c: min(p.y for p in c), reverse=True)
-    ymins = [min(p.y for p in c) for c in contours]
+    contour_ymins = geometry.contour_ymins(source_cp)
+    ymins = sorted(contour_ymins, reverse=True)
     thresh = (ymins[n - 1] + ymins[n]) / 2
-    return [c for c in contours if min(p.y for p in c) > thresh]
+    return [c for c, ymin in sorted(zip(layer, contour_ymins), key=lambda item: item[1],
+                                    reverse=True)
+            if ymin > thresh]
 
 
 def make_mark(font, name, contours):
@@ -90,8 +112,8 @@ def _make_weighted_mark(font, src_name, scale, weight_delta, mark_glyph_name, fl
 
 def _place_above(font, base_name, mark_name, gap=20, x_adj=0):
     """Compute translation to place a pre-sized mark centered above base by bounding box."""
-    base_bb = font[base_name].boundingBox()
-    mark_bb = font[mark_name].boundingBox()
+    base_bb = geometry.bbox(base_name)
+    mark_bb = geometry.bbox(mark_name)
     base_cx = (base_bb[0] + base_bb[2]) / 2
     mark_cx = (mark_bb[0] + mark_bb[2]) / 2
     dx = base_cx - mark_cx + x_adj
@@ -109,6 +131,7 @@ def _make_accented(font, cp, base_name, mark_name, gap=20, x_adj=0):
     return c
 
 
+@glyph_recipes.reads('quoteright')
 def _make_dstroke(font, cp, base_name, gap=5, dy_offset=0, width_extra=0):
     """Czech ď/ť form: base + quoteright at natural size to the upper right (not caron above).
 
@@ -121,8 +144,8 @@ def _make_dstroke(font, cp, base_name, gap=5, dy_offset=0, width_extra=0):
     c.clear()
     c.addReference(base_name)
     base_width = font[base_name].width
-    base_bb = font[base_name].boundingBox()
-    apos_bb = font['quoteright'].boundingBox()
+    base_bb = geometry.bbox(base_name)
+    apos_bb = geometry.bbox('quoteright')
     dx = base_width + gap - apos_bb[0]
     dy = base_bb[3] - apos_bb[3] + dy_offset
     c.addReference('quoteright', psMat.translate(dx, dy))
@@ -136,8 +159,8 @@ def _place_below(font, base_name, mark_name, y_adj=10, x_adj=0):
     y_adj: positive = more space (mark lower), negative = closer/overlapping.
     x_adj: positive shifts mark right, negative shifts left.
     """
-    base_bb = font[base_name].boundingBox()
-    mark_bb = font[mark_name].boundingBox()
+    base_bb = geometry.bbox(base_name)
+    mark_bb = geometry.bbox(mark_name)
     base_cx = (base_bb[0] + base_bb[2]) / 2
     mark_cx = (mark_bb[0] + mark_bb[2]) / 2
     dx = base_cx - mark_cx + x_adj
@@ -146,8 +169,6 @@ def _place_below(font, base_name, mark_name, y_adj=10, x_adj=0):
 
 
 def _make_cedilla(font, cp, base_name, y_adj=8, mark='comma', x_adj=0):
-    if cp in _SKIP_CPS:
-        return
     c = font.createMappedChar(cp)
     c.clear()
     c.width = font[base_name].width
@@ -155,9 +176,8 @@ def _make_cedilla(font, cp, base_name, y_adj=8, mark='comma', x_adj=0):
     c.addReference(mark, _place_below(font, base_name, mark, y_adj, x_adj))
 
 
+@glyph_recipes.reads('_macron_below_mark')
 def _make_macron_below(font, cp, base_name, y_adj=15):
-    if cp in _SKIP_CPS:
-        return
     c = font.createMappedChar(cp)
     c.clear()
     c.addReference(base_name)
@@ -165,9 +185,8 @@ def _make_macron_below(font, cp, base_name, y_adj=15):
     c.addReference('_macron_below_mark', _place_below(font, base_name, '_macron_below_mark', y_adj))
 
 
+@glyph_recipes.reads('_dot_below_mark')
 def _make_dot_below(font, cp, base_name, y_adj=15):
-    if cp in _SKIP_CPS:
-        return
     c = font.createMappedChar(cp)
     c.clear()
     c.addReference(base_name)
@@ -175,15 +194,14 @@ def _make_dot_below(font, cp, base_name, y_adj=15):
     c.addReference('_dot_below_mark', _place_below(font, base_name, '_dot_below_mark', y_adj))
 
 
+@glyph_recipes.reads('comma')
 def _make_ogonek(font, cp, base_name):
-    if cp in _SKIP_CPS:
-        return
     c = font.createMappedChar(cp)
     c.clear()
     c.addReference(base_name)
     c.width = font[base_name].width
-    comma_bb = font['comma'].boundingBox()
-    base_bb = font[base_name].boundingBox()
+    comma_bb = geometry.bbox('comma')
+    base_bb = geometry.bbox(base_name)
     # Rotate comma 180° and position so the tail tip sits at the baseline (y=0)
     # and the right edge of the rotated shape attaches at the base ink right edge.
     # After scale(-1,-1): original left edge → right side, original bottom → top.
@@ -204,10 +222,10 @@ def _make_spacing_modifier(font, cp, mark_name, y_bottom=None, lsb=40, rsb=40):
     lsb/rsb: left/right side bearings of the resulting glyph.
     """
     if y_bottom is None:
-        y_bottom = int(round(font['a'].boundingBox()[3] + 20))
+        y_bottom = int(round(geometry.bbox('a')[3] + 20))
     g = font.createMappedChar(cp)
     g.clear()
-    mark_bb = font[mark_name].boundingBox()
+    mark_bb = geometry.bbox(mark_name)
     dx = lsb - mark_bb[0]
     dy = y_bottom - mark_bb[1]
     g.addReference(mark_name, psMat.translate(dx, dy))
@@ -223,9 +241,14 @@ _SKIP_CPS = frozenset({
 })
 
 
-def _accented(cp, base_name, mark_name, gap=20, x_adj=0):
+def _recipe(cp, builder, *args, **params):
+    """Register builder(font, cp, *args, **params) as the recipe for cp, unless cp is hand-drawn."""
     if cp not in _SKIP_CPS:
-        _make_accented(font, cp, base_name, mark_name, gap, x_adj)
+        recipes.add(cp, builder, *args, **params)
+
+
+def _accented(cp, base_name, mark_name, gap=20, x_adj=0):
+    _recipe(cp, _make_accented, base_name, mark_name, gap=gap, x_adj=x_adj)
 
 
 # ---------------------------------------------------------------------------
@@ -404,29 +427,33 @@ _breve_mark.transform(psMat.translate(-220, 0))
 
 # dotlessi (U+0131): i without the dot, so í etc. don't stack dot + acute.
 _i_layer = font['i'].foreground
-_dot_ymin = max(min(p.y for p in c) for c in _i_layer)
+_i_ymins = geometry.contour_ymins('i')
+_dot_ymin = _i_ymins.max()
 _dotlessi_glyph = font.createMappedChar(0x0131)
 _dotless_layer = fontforge.layer()
-for c in _i_layer:
-    if min(p.y for p in c) < _dot_ymin:
+for c, _ymin in zip(_i_layer, _i_ymins):
+    if _ymin < _dot_ymin:
         _dotless_layer += c
 _dotlessi_glyph.foreground = _dotless_layer
 _dotlessi_glyph.width = font['i'].width
 
 # dotlessj (U+0237): j without the dot, for ĵ ǰ etc. to avoid dot + accent stack.
 _j_layer = font['j'].foreground
-_j_dot_ymin = max(min(p.y for p in c) for c in _j_layer)
+_j_geometry = geometry.outline('j')
+_j_ymins = _j_geometry.contour_ymins()
+_j_dot_ymin = _j_ymins.max()
 _dotlessj_glyph = font.createMappedChar(0x0237)
 _dotlessj_layer = fontforge.layer()
-for c in _j_layer:
-    if min(p.y for p in c) < _j_dot_ymin:
+for c, _ymin in zip(_j_layer, _j_ymins):
+    if _ymin < _j_dot_ymin:
         _dotlessj_layer += c
 _dotlessj_glyph.foreground = _dotlessj_layer
 _dotlessj_glyph.width = font['j'].width
 
 # Marks above j/dotlessj should be centered over the dot position, not the body centre.
 # The body centre is at (bb[0]+bb[2])/2; the dot was further right.
-_j_dot_xs = [p.x for c in _j_layer for p in c if min(p.y for p in c) >= _j_dot_ymin]
+_j_dot_xs = [x for (points, _), _ymin in zip(_j_geometry.contours, _j_ymins)
+             if _ymin >= _j_dot_ymin for x in points[:, 0]]
 _j_dot_cx = (min(_j_dot_xs) + max(_j_dot_xs)) / 2
 _j_body_bb = _dotlessj_glyph.boundingBox()
 _j_body_cx = (_j_body_bb[0] + _j_body_bb[2]) / 2
@@ -521,14 +548,14 @@ _c0327.width = 0
 
 _sm_y = int(round(font['a'].boundingBox()[3] + 20))
 
-_make_spacing_modifier(font, 0x00A8, '_diaeresis_mark', _sm_y)   # ¨ spacing diaeresis
-_make_spacing_modifier(font, 0x00AF, '_macron_mark', _sm_y)      # ¯ spacing macron
-_make_spacing_modifier(font, 0x02C6, '_circumflex_mark', _sm_y)  # ˆ modifier letter circumflex accent
-_make_spacing_modifier(font, 0x02C7, '_caron_mark', _sm_y)       # ˇ modifier letter caron
-_make_spacing_modifier(font, 0x02D8, '_breve_mark', _sm_y)       # ˘ modifier letter breve
-_make_spacing_modifier(font, 0x02D9, '_dot_above_mark', _sm_y)   # ˙ modifier letter dot above
-_make_spacing_modifier(font, 0x02DC, '_tilde_mark', _sm_y)       # ˜ modifier letter small tilde
-_make_spacing_modifier(font, 0x02DD, '_double_acute_mark', _sm_y)  # ˝ modifier letter double acute accent
+_recipe(0x00A8, _make_spacing_modifier, '_diaeresis_mark', _sm_y)   # ¨ spacing diaeresis
+_recipe(0x00AF, _make_spacing_modifier, '_macron_mark', _sm_y)      # ¯ spacing macron
+_recipe(0x02C6, _make_spacing_modifier, '_circumflex_mark', _sm_y)  # ˆ modifier letter circumflex accent
+_recipe(0x02C7, _make_spacing_modifier, '_caron_mark', _sm_y)       # ˇ modifier letter caron
+_recipe(0x02D8, _make_spacing_modifier, '_breve_mark', _sm_y)       # ˘ modifier letter breve
+_recipe(0x02D9, _make_spacing_modifier, '_dot_above_mark', _sm_y)   # ˙ modifier letter dot above
+_recipe(0x02DC, _make_spacing_modifier, '_tilde_mark', _sm_y)       # ˜ modifier letter small tilde
+_recipe(0x02DD, _make_spacing_modifier, '_double_acute_mark', _sm_y)  # ˝ modifier letter double acute accent
 
 
 # ---------------------------------------------------------------------------
@@ -548,15 +575,15 @@ for cp, base in [
     (0x0179, 'Z'), (0x017A, 'z'),   # Ź ź  Polish
     (0x1E82, 'W'), (0x1E83, 'w'),   # Ẃ ẃ  Welsh
 ]:
-    _make_accented(font, cp, base, '_acute_mark')
+    _accented(cp, base, '_acute_mark')
 
 # Caron: uppercase consonants + vowels (gap=20); U slightly tighter (gap=15).
 for cp, base in [
     (0x010C, 'C'), (0x011A, 'E'), (0x01CF, 'I'), (0x0147, 'N'), (0x0158, 'R'), (0x0160, 'S'), (0x017D, 'Z'),
     (0x01CD, 'A'), (0x01D1, 'O'),
 ]:
-    _make_accented(font, cp, base, '_caron_mark')
-_make_accented(font, 0x01D3, 'U', '_caron_mark', gap=15)
+    _accented(cp, base, '_caron_mark')
+_accented(0x01D3, 'U', '_caron_mark', gap=15)
 
 # Caron: lowercase consonants + vowels (gap=8 — lowercase sits lower than caps).
 # ǐ keeps gap=40 since dotlessi is short.
@@ -564,34 +591,34 @@ for cp, base in [
     (0x010D, 'c'), (0x011B, 'e'), (0x0148, 'n'), (0x0159, 'r'), (0x0161, 's'), (0x017E, 'z'),
     (0x01CE, 'a'), (0x01D2, 'o'), (0x01D4, 'u'),
 ]:
-    _make_accented(font, cp, base, '_caron_mark', gap=8)
-_make_accented(font, 0x01D0, 'dotlessi', '_caron_mark', gap=40)
-_make_accented(font, 0x01F0, 'uni0237', '_caron_mark', gap=40, x_adj=_j_x_adj)  # ǰ — dotless to avoid dot+caron stack
+    _accented(cp, base, '_caron_mark', gap=8)
+_accented(0x01D0, 'dotlessi', '_caron_mark', gap=40)
+_accented(0x01F0, 'uni0237', '_caron_mark', gap=40, x_adj=_j_x_adj)  # ǰ — dotless to avoid dot+caron stack
 
 # Ring above: å Ů / ů
 for cp, base in [(0x00E5, 'a'), (0x016E, 'U'), (0x016F, 'u')]:
-    _make_accented(font, cp, base, '_ring_above_mark')
+    _accented(cp, base, '_ring_above_mark')
 
 # Breve: Ă Ĕ Ğ Ĭ Ŏ Ŭ / ă ĕ ğ ĭ ŏ ŭ  (Romanian, Turkish, Belarusian, Esperanto, transliteration)
 for cp, base in [
     (0x0102, 'A'), (0x0114, 'E'), (0x011E, 'G'), (0x012C, 'I'), (0x014E, 'O'), (0x016C, 'U'),
 ]:
-    _make_accented(font, cp, base, '_breve_mark', gap=20)
+    _accented(cp, base, '_breve_mark', gap=20)
 for cp, base in [
     (0x0103, 'a'), (0x0115, 'e'), (0x011F, 'g'), (0x014F, 'o'), (0x016D, 'u'),
 ]:
-    _make_accented(font, cp, base, '_breve_mark', gap=8)
-_make_accented(font, 0x012D, 'dotlessi', '_breve_mark', gap=40)  # ĭ — dotless to avoid dot+breve stack
+    _accented(cp, base, '_breve_mark', gap=8)
+_accented(0x012D, 'dotlessi', '_breve_mark', gap=40)  # ĭ — dotless to avoid dot+breve stack
 
 # Ď Ť (uppercase): caron above, like other uppercase caron letters.
 for cp, base in [(0x010E, 'D'), (0x0164, 'T')]:
-    _make_accented(font, cp, base, '_caron_mark')
+    _accented(cp, base, '_caron_mark')
 
 # ď ť ľ (lowercase) / Ľ (uppercase): raised apostrophe to the right.
-_make_dstroke(font, 0x010F, 'd', gap=-30)
-_make_dstroke(font, 0x0165, 't', gap=-50)
-_make_dstroke(font, 0x013E, 'l', gap=-50, width_extra=80)
-_make_dstroke(font, 0x013D, 'L', gap=-50, dy_offset=100, width_extra=80)
+_recipe(0x010F, _make_dstroke, 'd', gap=-30)
+_recipe(0x0165, _make_dstroke, 't', gap=-50)
+_recipe(0x013E, _make_dstroke, 'l', gap=-50, width_extra=80)
+_recipe(0x013D, _make_dstroke, 'L', gap=-50, dy_offset=100, width_extra=80)
 
 # ---------------------------------------------------------------------------
 # L with stroke: Ł U+0141 / ł U+0142
@@ -631,7 +658,7 @@ def _make_lslash(font, cp, base_name, crossbar_name, y_frac, x_center):
     c.clear()
     c.addReference(base_name)
     c.width = font[base_name].width
-    base_bb = font[base_name].boundingBox()
+    base_bb = geometry.bbox(base_name)
     target_y = base_bb[1] + (base_bb[3] - base_bb[1]) * y_frac
     c.addReference(crossbar_name, psMat.translate(x_center, target_y))
     return c
@@ -640,9 +667,9 @@ def _make_lslash(font, cp, base_name, crossbar_name, y_frac, x_center):
 _l_crossbar = _make_l_crossbar_mark(font, '_l_crossbar', bar_width=300, rotation=40)
 
 # Ł U+0141 — crossbar at 42% of cap height, centered on the vertical stroke (x≈75)
-_make_lslash(font, 0x0141, 'L', '_l_crossbar', y_frac=0.42, x_center=75)
+_recipe(0x0141, _make_lslash, 'L', '_l_crossbar', y_frac=0.42, x_center=75)
 # ł U+0142 — crossbar at 60% of ascender height, l's stroke is at x≈75
-_make_lslash(font, 0x0142, 'l', '_l_crossbar', y_frac=0.60, x_center=75)
+_recipe(0x0142, _make_lslash, 'l', '_l_crossbar', y_frac=0.60, x_center=75)
 
 
 # ---------------------------------------------------------------------------
@@ -658,7 +685,7 @@ def _make_oslash(font, cp, base_name, crossbar_name, y_offset=0):
     c.clear()
     c.addReference(base_name)
     c.width = font[base_name].width
-    base_bb = font[base_name].boundingBox()
+    base_bb = geometry.bbox(base_name)
     cx = (base_bb[0] + base_bb[2]) / 2
     cy = (base_bb[1] + base_bb[3]) / 2
     c.addReference(crossbar_name, psMat.translate(cx, cy + y_offset))
@@ -670,14 +697,15 @@ def _make_oslash(font, cp, base_name, crossbar_name, y_offset=0):
 _cap_o_crossbar = _make_l_crossbar_mark(font, '_cap_o_crossbar', bar_width=720, rotation=55)
 _lc_o_crossbar = _make_l_crossbar_mark(font, '_lc_o_crossbar', bar_width=558, rotation=55)
 
-_make_oslash(font, 0x00D8, 'O', '_cap_o_crossbar', y_offset=30)  # Ø
-_make_oslash(font, 0x00F8, 'o', '_lc_o_crossbar', y_offset=15)   # ø
+_recipe(0x00D8, _make_oslash, 'O', '_cap_o_crossbar', y_offset=30)  # Ø
+_recipe(0x00F8, _make_oslash, 'o', '_lc_o_crossbar', y_offset=15)   # ø
 
 
 # ---------------------------------------------------------------------------
 # L with middle dot: Ŀ U+013F / ŀ U+0140  (Catalan)
 # ---------------------------------------------------------------------------
 
+@glyph_recipes.reads('_dot_above_mark')
 def _make_l_middot(font, cp, base_name, dot_x=None, gap=35):
     """Catalan L-middot: base glyph + dot at mid-height.
 
@@ -690,8 +718,8 @@ def _make_l_middot(font, cp, base_name, dot_x=None, gap=35):
     c = font.createMappedChar(cp)
     c.clear()
     c.addReference(base_name)
-    base_bb = font[base_name].boundingBox()
-    dot_bb = font['_dot_above_mark'].boundingBox()
+    base_bb = geometry.bbox(base_name)
+    dot_bb = geometry.bbox('_dot_above_mark')
     dot_cx = (dot_bb[0] + dot_bb[2]) / 2
     dot_cy = (dot_bb[1] + dot_bb[3]) / 2
     target_x = dot_x if dot_x is not None else base_bb[2] + gap
@@ -702,8 +730,8 @@ def _make_l_middot(font, cp, base_name, dot_x=None, gap=35):
     c.width = max(font[base_name].width, int(round(dot_right)))
     return c
 
-_make_l_middot(font, 0x013F, 'L', dot_x=font['L'].boundingBox()[0] + 172)  # Ŀ
-_make_l_middot(font, 0x0140, 'l', gap=45)  # ŀ
+_recipe(0x013F, _make_l_middot, 'L', dot_x=font['L'].boundingBox()[0] + 172)  # Ŀ
+_recipe(0x0140, _make_l_middot, 'l', gap=45)  # ŀ
 
 
 # ---------------------------------------------------------------------------
@@ -715,19 +743,19 @@ _bar_220 = _make_l_crossbar_mark(font, '_bar_220', bar_width=220)  # T/t/h
 _bar_480 = _make_l_crossbar_mark(font, '_bar_480', bar_width=480)  # H (spans past both uprights)
 
 # Đ U+0110 — bar through D's left vertical stem (like Ł for L)
-_make_lslash(font, 0x0110, 'D', '_bar_300', y_frac=0.50, x_center=145)
+_recipe(0x0110, _make_lslash, 'D', '_bar_300', y_frac=0.50, x_center=145)
 # đ U+0111 — bar through d's right ascending stem
-_make_lslash(font, 0x0111, 'd', '_bar_300', y_frac=0.78, x_center=360)
+_recipe(0x0111, _make_lslash, 'd', '_bar_300', y_frac=0.78, x_center=360)
 # Ħ U+0126 — bar spanning past both H uprights, centred on full glyph width
-_make_lslash(font, 0x0126, 'H', '_bar_480', y_frac=0.85, x_center=239)
+_recipe(0x0126, _make_lslash, 'H', '_bar_480', y_frac=0.85, x_center=239)
 # ħ U+0127 — bar through h's left ascending stem
-_make_lslash(font, 0x0127, 'h', '_bar_220', y_frac=0.85, x_center=70)
+_recipe(0x0127, _make_lslash, 'h', '_bar_220', y_frac=0.85, x_center=70)
 # Ŧ U+0166 — bar through T's vertical stem
-_make_lslash(font, 0x0166, 'T', '_bar_220', y_frac=0.45, x_center=194)
+_recipe(0x0166, _make_lslash, 'T', '_bar_220', y_frac=0.45, x_center=194)
 # ŧ U+0167 — bar through t's stem, below t's existing crossbar
-_make_lslash(font, 0x0167, 't', '_bar_220', y_frac=0.35, x_center=148)
+_recipe(0x0167, _make_lslash, 't', '_bar_220', y_frac=0.35, x_center=148)
 # Ð U+00D0 — Eth: like Đ but slightly higher (upper curve of D)
-_make_lslash(font, 0x00D0, 'D', '_bar_300', y_frac=0.58, x_center=145)
+_recipe(0x00D0, _make_lslash, 'D', '_bar_300', y_frac=0.58, x_center=145)
 
 
 # ---------------------------------------------------------------------------
@@ -764,6 +792,7 @@ _eng_comma_lc = _make_eng_comma(font, '_eng_comma_lc', y_scale=1.3, x_scale=0.85
 _eng_stroke = int(round(0.12 * font.ascent))
 
 
+@glyph_recipes.reads('comma')
 def _make_eng(font, cp, base_name, comma_name, x_frac=0.88, x_offset=0, y_offset=0):
     """Eng: base (N/n) + comma hook hanging below the right stem.
 
@@ -771,10 +800,10 @@ def _make_eng(font, cp, base_name, comma_name, x_frac=0.88, x_offset=0, y_offset
     x_offset: additional horizontal nudge in font units (negative = left).
     y_offset: vertical nudge of the hook attachment point (positive = up).
     """
-    base_bb = font[base_name].boundingBox()
+    base_bb = geometry.bbox(base_name)
     target_x = base_bb[0] + (base_bb[2] - base_bb[0]) * x_frac + x_offset
     dx = target_x - _comma_cx
-    dy = -font[comma_name].boundingBox()[3] + y_offset
+    dy = -geometry.bbox(comma_name)[3] + y_offset
     c = font.createMappedChar(cp)
     c.clear()
     c.addReference(base_name)
@@ -783,8 +812,8 @@ def _make_eng(font, cp, base_name, comma_name, x_frac=0.88, x_offset=0, y_offset
     return c
 
 
-_make_eng(font, 0x014A, 'N', '_eng_comma_uc', x_offset=-_eng_stroke // 2 - 10, y_offset=3 * _eng_stroke)  # Ŋ
-_make_eng(font, 0x014B, 'n', '_eng_comma_lc', x_offset=-_eng_stroke // 2 + 15, y_offset=int(_eng_stroke * 1.5))  # ŋ
+_recipe(0x014A, _make_eng, 'N', '_eng_comma_uc', x_offset=-_eng_stroke // 2 - 10, y_offset=3 * _eng_stroke)  # Ŋ
+_recipe(0x014B, _make_eng, 'n', '_eng_comma_lc', x_offset=-_eng_stroke // 2 + 15, y_offset=int(_eng_stroke * 1.5))  # ŋ
 
 
 # Circumflex: Â Ê Î Ô Û / â ê î ô û  +  Esperanto Ĉ Ĝ Ĥ Ĵ Ŝ  +  Welsh Ŵ Ŷ
@@ -795,7 +824,7 @@ for cp, base in [
     (0x0109, 'c'), (0x011D, 'g'), (0x0125, 'h'), (0x015D, 's'), (0x0175, 'w'), (0x0177, 'y'),
 ]:
     _accented(cp, base, '_circumflex_mark')
-_make_accented(font, 0x0135, 'uni0237', '_circumflex_mark', x_adj=_j_x_adj)  # ĵ — dotless to avoid dot+circumflex stack
+_accented(0x0135, 'uni0237', '_circumflex_mark', x_adj=_j_x_adj)  # ĵ — dotless to avoid dot+circumflex stack
 
 # Grave: À È Ì Ò Ù Ỳ / à è ì ò ù ỳ  + Ẁ ẁ Ǹ ǹ
 for cp, base in [
@@ -841,22 +870,22 @@ for cp, base in [
 
 # Hook cedilla: Ç Ş Ţ / ç ş ţ  — French/Turkish/Cameroonian
 # C/c/S/s: curved base bottom leaves visual space — pull cedilla up to close the gap
-_make_cedilla(font, 0x00C7, 'C', mark='_hook_cedilla_mark', y_adj=-15)  # Ç
-_make_cedilla(font, 0x00E7, 'c', mark='_hook_cedilla_mark', y_adj=-15)  # ç
-_make_cedilla(font, 0x015E, 'S', mark='_hook_cedilla_mark', y_adj=-15)  # Ş
-_make_cedilla(font, 0x015F, 's', mark='_hook_cedilla_mark', y_adj=-15)  # ş
-_make_cedilla(font, 0x0162, 'T', mark='_hook_cedilla_mark', y_adj=-10, x_adj=-37)  # Ţ
-_make_cedilla(font, 0x0163, 't', mark='_hook_cedilla_mark', y_adj=-15, x_adj=40)  # ţ
+_recipe(0x00C7, _make_cedilla, 'C', mark='_hook_cedilla_mark', y_adj=-15)  # Ç
+_recipe(0x00E7, _make_cedilla, 'c', mark='_hook_cedilla_mark', y_adj=-15)  # ç
+_recipe(0x015E, _make_cedilla, 'S', mark='_hook_cedilla_mark', y_adj=-15)  # Ş
+_recipe(0x015F, _make_cedilla, 's', mark='_hook_cedilla_mark', y_adj=-15)  # ş
+_recipe(0x0162, _make_cedilla, 'T', mark='_hook_cedilla_mark', y_adj=-10, x_adj=-37)  # Ţ
+_recipe(0x0163, _make_cedilla, 't', mark='_hook_cedilla_mark', y_adj=-15, x_adj=40)  # ţ
 # Ȩ/ȩ U+0228/U+0229 — E with cedilla (Cameroonian)
-_make_cedilla(font, 0x0228, 'E', mark='_hook_cedilla_mark', y_adj=-25)  # Ȩ
-_make_cedilla(font, 0x0229, 'e', mark='_hook_cedilla_mark', y_adj=-15)  # ȩ
+_recipe(0x0228, _make_cedilla, 'E', mark='_hook_cedilla_mark', y_adj=-25)  # Ȩ
+_recipe(0x0229, _make_cedilla, 'e', mark='_hook_cedilla_mark', y_adj=-15)  # ȩ
 
 # Comma cedilla: Ģ Ķ Ļ Ņ Ŗ / ģ ķ ļ ņ ŗ  — Latvian
 for cp, base in [
     (0x0122, 'G'), (0x0136, 'K'), (0x013B, 'L'), (0x0145, 'N'), (0x0156, 'R'),
     (0x0123, 'g'), (0x0137, 'k'), (0x013C, 'l'), (0x0146, 'n'), (0x0157, 'r'),
 ]:
-    _make_cedilla(font, cp, base)
+    _recipe(cp, _make_cedilla, base)
 
 # Comma below: Ș ș Ț ț  (Romanian — U+0219/U+021B are the canonical forms;
 # U+015F/U+0163 cedilla variants already exist above)
@@ -864,7 +893,7 @@ for cp, base in [
     (0x0218, 'S'), (0x0219, 's'),
     (0x021A, 'T'), (0x021B, 't'),
 ]:
-    _make_cedilla(font, cp, base)
+    _recipe(cp, _make_cedilla, base)
 
 # Macron: Ā Ī Ō Ū / ā ī ō ū ē  (Ē skipped — hand-drawn)
 for cp, base in [
@@ -879,39 +908,53 @@ for cp, base in [
     (0x0104, 'A'), (0x0118, 'E'), (0x012E, 'I'), (0x0172, 'U'),
     (0x0105, 'a'), (0x0119, 'e'), (0x012F, 'i'), (0x0173, 'u'),
 ]:
-    _make_ogonek(font, cp, base)
+    _recipe(cp, _make_ogonek, base)
 
 # Dot below: Ạ Ẹ Ị Ọ Ụ Ỵ / ạ ẹ ị ọ ụ ỵ
 for cp, base in [
     (0x1EA0, 'A'), (0x1EB8, 'E'), (0x1ECA, 'I'), (0x1ECC, 'O'), (0x1EE4, 'U'), (0x1EF4, 'Y'),
     (0x1EA1, 'a'), (0x1EB9, 'e'), (0x1ECB, 'i'), (0x1ECD, 'o'), (0x1EE5, 'u'), (0x1EF5, 'y'),
 ]:
-    _make_dot_below(font, cp, base)
+    _recipe(cp, _make_dot_below, base)
 
 # Macron below: Ḏ Ḻ Ṉ Ṟ Ṯ Ẕ / ḏ ḻ ṉ ṟ ṯ ẕ  (Semitic transliteration)
 for cp, base in [
     (0x1E0E, 'D'), (0x1E3A, 'L'), (0x1E48, 'N'), (0x1E5E, 'R'), (0x1E6E, 'T'), (0x1E94, 'Z'),
     (0x1E0F, 'd'), (0x1E3B, 'l'), (0x1E49, 'n'), (0x1E6F, 't'), (0x1E95, 'z'),
 ]:
-    _make_macron_below(font, cp, base)
-_make_macron_below(font, 0x1E5F, 'r', y_adj=45)  # ṟ — r sits low, needs extra gap
+    _recipe(cp, _make_macron_below, base)
+_recipe(0x1E5F, _make_macron_below, 'r', y_adj=45)  # ṟ — r sits low, needs extra gap
+
+def _make_digraph(font, cp, left, right, ink_gap):
+    """Two-letter ligature glyph: right placed ink_gap units after left's ink edge."""
+    g = font.createMappedChar(cp)
+    g.clear()
+    g.addReference(left)
+    dx = int(round(geometry.bbox(left)[2] + ink_gap - geometry.bbox(right)[0]))
+    g.addReference(right, psMat.translate(dx, 0))
+    g.width = dx + font[right].width
+    return g
+
 
 # ĳ U+0133 / Ĳ U+0132: Dutch IJ digraph ligatures.
 # Position so the ink edges have the same gap as adjacent letters would after kerning (~40 units).
 for cp, left, right in [(0x0133, 'i', 'j'), (0x0132, 'I', 'J')]:
-    _ij = font.createMappedChar(cp)
-    _ij.clear()
-    _ij.addReference(left)
-    _ink_gap = 0
-    _dx = int(round(font[left].boundingBox()[2] + _ink_gap - font[right].boundingBox()[0]))
-    _ij.addReference(right, psMat.translate(_dx, 0))
-    _ij.width = _dx + font[right].width
+    _recipe(cp, _make_digraph, left, right, ink_gap=0)
 
 
 # ---------------------------------------------------------------------------
 # Greek letter aliases and derived glyphs
 # ---------------------------------------------------------------------------
 
+def _make_alias(font, cp, base_name):
+    """Glyph drawn as a plain reference to base_name, with its advance width."""
+    g = font.createMappedChar(cp)
+    g.clear()
+    g.addReference(base_name)
+    g.width = font[base_name].width
+    return g
+
+
 # Uppercase Greek letters visually identical to Latin capitals.
 for _cp, _name in [
     (0x0391, 'A'),   # Α Alpha
@@ -929,10 +972,7 @@ for _cp, _name in [
     (0x03A5, 'Y'),   # Υ Upsilon
     # Χ Chi handled separately below (needs weight adjustment)
 ]:
-    _g = font.createMappedChar(_cp)
-    _g.clear()
-    _g.addReference(_name)
-    _g.width = font[_name].width
+    _recipe(_cp, _make_alias, _name)
 
 # Χ (Chi, U+03A7): X thinned to match derived Greek uppercase weight.
 _chi_layer = fontforge.layer()
@@ -953,10 +993,7 @@ for _cp, _name in [
     (0x03BA, 'k'),          # κ kappa
     (0x03C7, 'x'),          # χ chi
 ]:
-    _g = font.createMappedChar(_cp)
-    _g.clear()
-    _g.addReference(_name)
-    _g.width = font[_name].width
+    _recipe(_cp, _make_alias, _name)
 
 # ɛ U+025B LATIN SMALL LETTER OPEN E — same letterform as Greek ε, 20% larger but
 # stroke-weight corrected back to match (scaling thickens strokes proportionally).
@@ -993,15 +1030,16 @@ _bb = _g.boundingBox()
 _g.width = int(round(_bb[2] + 20))
 
 
-def _greek_lc_to_uc(font, lc_cp, uc_cp, snap=True, weight_delta=0):
+@glyph_recipes.reads('A')
+def _greek_lc_to_uc(font, uc_cp, lc_name, snap=True, weight_delta=0):
     """Copy a Greek lowercase glyph and scale it to capital height.
 
     snap=True    → translate so bb[1]=0 then re-scale to cap height.
     snap=False   → keep natural position (for letters like ψ with a descender).
     weight_delta → changeWeight adjustment applied after scaling (negative = thinner).
     """
-    src = font[lc_cp]
-    src_bb = src.boundingBox()
+    src = font[lc_name]
+    src_bb = geometry.bbox(lc_name)
     if src_bb[3] <= 0:
         return
     uc = font.createMappedChar(uc_cp)
@@ -1030,9 +1068,9 @@ def _greek_lc_to_uc(font, lc_cp, uc_cp, snap=True, weight_delta=0):
     uc.width = int(round(_bb[2] + 20))
 
 
-_greek_lc_to_uc(font, 0x03B8, 0x0398)                          # Θ from θ
-_greek_lc_to_uc(font, 0x03C6, 0x03A6, weight_delta=-25)        # Φ from φ  (circle shape is sensitive to changeWeight)
-_greek_lc_to_uc(font, 0x03C8, 0x03A8, snap=False, weight_delta=-20)  # Ψ from ψ
+_recipe(0x0398, _greek_lc_to_uc, font[0x03B8].glyphname)                          # Θ from θ
+_recipe(0x03A6, _greek_lc_to_uc, font[0x03C6].glyphname, weight_delta=-25)        # Φ from φ  (circle shape is sensitive to changeWeight)
+_recipe(0x03A8, _greek_lc_to_uc, font[0x03C8].glyphname, snap=False, weight_delta=-20)  # Ψ from ψ
 
 # Γ (U+0393): L flipped vertically — vertical stroke on left, bar at top.
 _L_bb = font['L'].boundingBox()
@@ -1068,21 +1106,21 @@ _g.width = font['n'].width
 # chained composites (Alpha → A → A).
 # ---------------------------------------------------------------------------
 
-_make_accented(font, 0x03AC, 'alpha',    '_acute_mark')  # ά
-_make_accented(font, 0x03AD, 'epsilon',  '_acute_mark')  # έ
-_make_accented(font, 0x03AE, 'eta',      '_acute_mark')  # ή
-_make_accented(font, 0x03AF, 'dotlessi', '_acute_mark')  # ί  (dotless — iota has no dot)
-_make_accented(font, 0x03CC, 'o',        '_acute_mark')  # ό  (o for omicron)
-_make_accented(font, 0x03CD, 'upsilon',  '_acute_mark')  # ύ
-_make_accented(font, 0x03CE, 'omega',    '_acute_mark')  # ώ
+_accented(0x03AC, 'alpha',    '_acute_mark')  # ά
+_accented(0x03AD, 'epsilon',  '_acute_mark')  # έ
+_accented(0x03AE, 'eta',      '_acute_mark')  # ή
+_accented(0x03AF, 'dotlessi', '_acute_mark')  # ί  (dotless — iota has no dot)
+_accented(0x03CC, 'o',        '_acute_mark')  # ό  (o for omicron)
+_accented(0x03CD, 'upsilon',  '_acute_mark')  # ύ
+_accented(0x03CE, 'omega',    '_acute_mark')  # ώ
 
-_make_accented(font, 0x0386, 'A',     '_acute_mark')  # Ά
-_make_accented(font, 0x0388, 'E',     '_acute_mark')  # Έ
-_make_accented(font, 0x0389, 'H',     '_acute_mark')  # Ή
-_make_accented(font, 0x038A, 'I',     '_acute_mark')  # Ί
-_make_accented(font, 0x038C, 'O',     '_acute_mark')  # Ό
-_make_accented(font, 0x038E, 'Y',     '_acute_mark')  # Ύ
-_make_accented(font, 0x038F, font[0x03A9].glyphname, '_acute_mark')  # Ώ
+_accented(0x0386, 'A',     '_acute_mark')  # Ά
+_accented(0x0388, 'E',     '_acute_mark')  # Έ
+_accented(0x0389, 'H',     '_acute_mark')  # Ή
+_accented(0x038A, 'I',     '_acute_mark')  # Ί
+_accented(0x038C, 'O',     '_acute_mark')  # Ό
+_accented(0x038E, 'Y',     '_acute_mark')  # Ύ
+_accented(0x038F, font[0x03A9].glyphname, '_acute_mark')  # Ώ
 
 
 # ---------------------------------------------------------------------------
@@ -1218,7 +1256,7 @@ _g.width = font[0x25BD].width
 # U with diaeresis + tone mark: Ǖ Ǘ Ǚ Ǜ / ǖ ǘ ǚ ǜ  (Pinyin)
 # Ü / ü are used as bases so the new mark floats above the existing dots.
 _Udi = font[0x00DC].glyphname  # Ü hand-drawn
-_udi = font[0x00FC].glyphname  # ü derived
+_udi = recipes.name_of(0x00FC)  # ü derived
 _accented(0x01D5, _Udi, '_macron_mark')        # Ǖ
 _accented(0x01D6, _udi, '_macron_mark', gap=8)  # ǖ
 _accented(0x01D7, _Udi, '_acute_mark')         # Ǘ
@@ -1231,8 +1269,8 @@ _accented(0x01DC, _udi, '_grave_mark', gap=8)   # ǜ
 # A/a with diaeresis + macron: Ǟ ǟ  (Livonian, Skolt Sámi)
 # gap=30/20: the base's bb top already includes the diaeresis dots; extra
 # clearance prevents the macron from pressing against the dots.
-_Adi = font[0x00C4].glyphname  # Ä
-_adi = font[0x00E4].glyphname  # ä
+_Adi = recipes.name_of(0x00C4)  # Ä
+_adi = recipes.name_of(0x00E4)  # ä
 _accented(0x01DE, _Adi, '_macron_mark', gap=30)  # Ǟ
 _accented(0x01DF, _adi, '_macron_mark', gap=20)  # ǟ
 
@@ -1262,7 +1300,7 @@ _accented(0x01F5, 'g', '_acute_mark', gap=20, x_adj=80)  # ǵ
 # A-ring + acute: Ǻ ǻ  (Northern Sámi)
 # The acute floats above the existing ring; base bb already includes the ring.
 _Aring_name = font[0x00C5].glyphname  # Å
-_aring_name = font[0x00E5].glyphname  # å
+_aring_name = recipes.name_of(0x00E5)  # å
 _accented(0x01FA, _Aring_name, '_acute_mark')        # Ǻ
 _accented(0x01FB, _aring_name, '_acute_mark', gap=8)  # ǻ
 
@@ -1272,15 +1310,15 @@ _accented(0x01FD, _ae_name, '_acute_mark', gap=8)  # ǽ
 
 # O-stroke + acute: Ǿ ǿ  (Faroese, Danish orthography)
 # Ø/ø are derived earlier in this script; their bounding boxes include the stroke.
-_Ost_name = font[0x00D8].glyphname  # Ø
-_ost_name = font[0x00F8].glyphname  # ø
+_Ost_name = recipes.name_of(0x00D8)  # Ø
+_ost_name = recipes.name_of(0x00F8)  # ø
 _accented(0x01FE, _Ost_name, '_acute_mark')        # Ǿ
 _accented(0x01FF, _ost_name, '_acute_mark', gap=8)  # ǿ
 
 # DZ/dz digraph ligatures: Ǳ ǲ ǳ and DŽ/Dž/dž: Ǆ ǅ ǆ
 # Letters are placed ink-edge to ink-edge with a small gap, like IJ above.
-_Zcaron_name = font[0x017D].glyphname  # Ž
-_zcaron_name = font[0x017E].glyphname  # ž
+_Zcaron_name = recipes.name_of(0x017D)  # Ž
+_zcaron_name = recipes.name_of(0x017E)  # ž
 _dz_gap = 20
 for _cp, _left, _right in [
     (0x01F1, 'D', 'Z'),             # Ǳ capital DZ
@@ -1290,12 +1328,38 @@ for _cp, _left, _right in [
     (0x01C5, 'D', _zcaron_name),    # ǅ titlecase Dž
     (0x01C6, 'd', _zcaron_name),    # ǆ lowercase dž
 ]:
-    _g = font.createMappedChar(_cp)
-    _g.clear()
-    _g.addReference(_left)
-    _dx = int(round(font[_left].boundingBox()[2] + _dz_gap - font[_right].boundingBox()[0]))
-    _g.addReference(_right, psMat.translate(_dx, 0))
-    _g.width = _dx + font[_right].width
+    _recipe(_cp, _make_digraph, _left, _right, ink_gap=_dz_gap)
+
+
+# ---------------------------------------------------------------------------
+# Evaluate the recipes registered above
+# ---------------------------------------------------------------------------
+
+def _reuse_glyph(recipe):
+    """Copy an unchanged recipe's glyph from the previous pt6 SFD, if it is there."""
+    if _previous_font is None or recipe.name not in _previous_font:
+        return False
+    src = _previous_font[recipe.name]
+    g = font.createMappedChar(recipe.codepoint) if recipe.codepoint is not None \
+        else font.createChar(-1, recipe.name)
+    g.clear()
+    g.foreground = src.foreground
+    for reference in src.references:
+        g.addReference(reference[0], reference[1])
+    g.width = src.width
+    return True
+
+
+_subset = os.environ.get(glyph_recipes.SUBSET_ENV)
+_wanted = recipes.select(glyph_recipes.parse_codepoint_ranges(_subset)) if _subset else None
+_previous_signatures = glyph_recipes.load_state()
+_previous_font = (fontforge.open(font_fname)
+                  if _previous_signatures and os.path.exists(font_fname) else None)
+_recipe_signatures, _built, _reused = recipes.evaluate(
+    font, _wanted, _previous_signatures, _reuse_glyph, changed=geometry.invalidate)
+if _previous_font is not None:
+    _previous_font.close()
+print(f'Recipes: built {len(_built)}, reused {len(_reused)} unchanged glyphs')
 
 
 # ---------------------------------------------------------------------------
@@ -1382,7 +1446,8 @@ for _i, _cp in enumerate(_GREEK_LOWER):
     _math_aliases[0x1D6C2 + _i] = _cp
 
 for _src_cp, _dst_cp in sorted(_math_aliases.items()):
-    _add_altuni(font[_dst_cp], _src_cp)
+    if _dst_cp in font:  # a subset build may leave out recipe-made letters
+        _add_altuni(font[_dst_cp], _src_cp)
 
 
 # ---------------------------------------------------------------------------
@@ -1527,4 +1592,8 @@ make_display_operator(font, 'integral', 'integral.disp',  round(1.4 * _upem),
 # Save
 # ---------------------------------------------------------------------------
 
-font.save(font_fname)
+if _subset:
+    font.save(subset_fname)
+else:
+    font.save(font_fname)
+    glyph_recipes.save_state(_recipe_signatures)
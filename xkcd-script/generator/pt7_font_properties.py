@@ -5,11 +5,20 @@ Apply font-wide properties: kerning, spacing, and any other metric tweaks.
 Reads the SFD produced by pt6_derived_chars.py (which has all glyphs + the
 math cmap aliases), applies properties, saves.
 """
+import collections
 import fontforge
 import unicodedata
 
+import anchors
+import glyph_geometry
+import kerning
+import profiling
+
 font_fname = '../generated/xkcd-script-pt7.sfd'
 font = fontforge.open('../generated/xkcd-script-pt6.sfd')
+# Kerning and anchors leave outlines alone, so nothing below needs to
+# invalidate the cache.
+geometry = glyph_geometry.GlyphGeometry(font)
 
 
 # ---------------------------------------------------------------------------
@@ -38,7 +47,45 @@ def _base_char(c):
     return c
 
 
-def _expand_with_variants(font, chars):
+class _GlyphIndex(object):
+    """What kern() looks up, indexed in one pass over font.glyphs().
+
+    variants maps a base character to the (position in font.glyphs(), glyph
+    name, character) of each glyph whose character decomposes to it (É, È, ...
+    under E); ligature_ends and ligature_starts map a glyph name to the
+    (position, name) of the ligatures whose last (first) component it is.
+    Positions keep expansions in font order, as they were when every call
+    walked the glyphs.
+    """
+
+    def __init__(self, font):
+        self.variants = collections.defaultdict(list)
+        self.ligature_ends = collections.defaultdict(list)
+        self.ligature_starts = collections.defaultdict(list)
+        for position, glyph in enumerate(font.glyphs()):
+            name = glyph.glyphname
+            if glyph.unicode >= 0:
+                c = chr(glyph.unicode)
+                base = _base_char(c)
+                if base != c:
+                    self.variants[base].append((position, name, c))
+            if name[0] != '_' and '_' in name:
+                parts = name.split('_')
+                self.ligature_ends[parts[-1]].append((position, name))
+                self.ligature_starts[parts[0]].append((position, name))
+
+
+def _extend_unseen(names, found):
+    """Append the (position, name) pairs in found to names in font order, skipping names already there."""
+    seen = set(names)
+    for _, name in sorted(set(found)):
+        if name not in seen:
+            names.append(name)
+            seen.add(name)
+    return names
+
+
+def _expand_with_variants(index, chars):
     """Expand a list of base chars/glyph-names to include accented variants in the font.
 
     Multi-character glyph names (ligatures) are passed through unchanged — only
@@ -46,17 +93,27 @@ def _expand_with_variants(font, chars):
     """
     single_chars = set(c for c in chars if len(c) == 1)
     result = [fontforge.nameFromUnicode(ord(c)) if len(c) == 1 else c for c in chars]
-    seen = set(result)
-    for glyph in font.glyphs():
-        if glyph.unicode < 0:
-            continue
-        c = chr(glyph.unicode)
-        if _base_char(c) in single_chars and c not in single_chars:
-            name = glyph.glyphname
-            if name not in seen:
-                result.append(name)
-                seen.add(name)
-    return result
+    # A character listed itself is not also added as a variant of its base.
+    found = [(position, name) for base in single_chars
+             for position, name, c in index.variants[base] if c not in single_chars]
+    return _extend_unseen(result, found)
+
+
+def _kern_class_key(font, name, left_side):
+    """The glyph whose kerning class `name` joins.
+
+    An accented letter joins its base letter; a ligature joins the class of
+    the component on the side that faces its neighbour (the last one when it
+    is on the left of the pair).
+    """
+    if name[0] != '_' and '_' in name:
+        parts = name.split('_')
+        edge = parts[-1] if left_side else parts[0]
+        return _kern_class_key(font, edge, left_side) if edge in font else name
+    if font[name].unicode < 0:
+        return name
+    base = fontforge.nameFromUnicode(ord(_base_char(chr(font[name].unicode))))
+    return base if base in font else name
 
 
 # ---------------------------------------------------------------------------
@@ -77,41 +134,38 @@ def autokern(font):
     font.addLookup('kerning', 'gpos_pair', (), [['kern', [['latn', ['dflt']]]]])
     font.addLookupSubtable('kerning', 'kern')
 
+    # The NumPy engine measures each glyph once and keeps the pairs until the
+    # rule table is done; the FontForge one writes into the subtable as it goes.
+    engine = kerning.engine()
+    kerner = kerning.Kerner(font, geometry, cache=kerning.load_cache()) if engine == 'numpy' else None
+    matrix = kerner.matrix if kerner is not None else kerning.KernMatrix()
+
+    index = _GlyphIndex(font)
+
     def kern(sep, left, right, damper=None, **kwargs):
-        """Wraps font.autoKern: expands accented variants and leading/trailing ligatures."""
+        """Wraps font.autoKern (or Kerner.kern): expands accented variants and leading/trailing ligatures."""
         def expand(chars, left_side):
-            expanded = _expand_with_variants(font, chars)
-            seen = set(expanded)
-            for glyph in font.glyphs():
-                name = glyph.glyphname
-                if name[0] == '_' or '_' not in name:
-                    continue
-                parts = name.split('_')
-                # Left side: ligature's right edge (last component) determines spacing.
-                # Right side: ligature's left edge (first component) determines spacing.
-                anchor = parts[-1] if left_side else parts[0]
-                if anchor in seen and name not in seen:
-                    expanded.append(name)
-                    seen.add(name)
-            return expanded
-        lefts = expand(left, left_side=True)
-        rights = expand(right, left_side=False)
-        font.autoKern('kern', sep, lefts, rights, **kwargs)
-        if damper and damper != 1.0:
-            for l in lefts:
-                tuples = font[l].getPosSub('kern')
-                new_table = []
-                for tup in tuples:
-                    if tup[1] == 'Pair' and tup[2] in rights:
-                        font[l].addPosSub('kern', *(tup[2:5] + (int(tup[5] * damper),) + tup[6:]))
+            expanded = _expand_with_variants(index, chars)
+            # Left side: ligature's right edge (last component) determines spacing.
+            # Right side: ligature's left edge (first component) determines spacing.
+            ligatures = index.ligature_ends if left_side else index.ligature_starts
+            return _extend_unseen(expanded, [ligature for name in expanded
+                                             for ligature in ligatures.get(name, ())])
+        with profiling.span('pt7 kern', engine=engine, sep=sep, damper=damper, **kwargs) as span_args:
+            lefts = expand(left, left_side=True)
+            rights = expand(right, left_side=False)
+            span_args.update(lefts=len(lefts), rights=len(rights))
+            if kerner is not None:
+                kerner.kern(sep, lefts, rights, damper=damper, **kwargs)
+                return
+            font.autoKern('kern', sep, lefts, rights, **kwargs)
+            matrix.read_rows(font, 'kern', lefts)
+            if damper and damper != 1.0:
+                for l, r, value in matrix.damp(lefts, rights, damper):
+                    font[l].addPosSub('kern', r, 0, 0, value, 0, 0, 0, 0, 0)
 
     def getkern(left, right):
-        c = font[left]
-        tuples = c.getPosSub('kern')
-        for tup in tuples:
-            if tup[1] == 'Pair' and tup[2] == right:
-                return tup[5]
-        return None
+        return matrix.get(left, right)
 
     a = font['_pad_space'].width
     a = a - 20
@@ -161,6 +215,29 @@ def autokern(font):
     kern(100+a + int(diff_Po_Pe / 0.75), ['P'], ['e'], onlyCloser=True, damper=0.75)
     kern(35+a, ['L'], set(roman) - {'j'}, onlyCloser=True, touch=True)
 
+    if kerner is not None:
+        kerning.save_cache(kerner)
+        print(f'Kerning: measured {kerner.measured} pair distances, reused {kerner.reused}')
+    else:
+        print(f'Kerning: font.autoKern measured every pair ({kerning.ENGINE_ENV}={engine} is not cached)')
+
+    # Re-emit the kerns as classes plus the pairs that differ from their class,
+    # and check that FontForge stored kerning identical to the measured pairs.
+    with profiling.span('pt7 class kerning') as span_args:
+        pairs = matrix.pairs()
+        if kerner is None:
+            font.removeLookupSubtable('kern')
+            font.addLookupSubtable('kerning', 'kern')
+        classes = kerning.class_kerning(pairs, lambda name: _kern_class_key(font, name, True),
+                                        lambda name: _kern_class_key(font, name, False))
+        kerning.write_class_kerning(font, 'kerning', 'kern', classes)
+        kerning.verify_class_kerning(pairs, kerning.read_class_kerning(font, 'kern'))
+        span_args.update(pairs=sum(1 for value in pairs.values() if value),
+                         firsts=len(classes.firsts), seconds=len(classes.seconds),
+                         exceptions=len(classes.exceptions))
+    print(f'Kerning: {len(classes.firsts)} x {len(classes.seconds)} classes, '
+          f'{len(classes.exceptions)} exception pairs')
+
 
 autokern(font)
 font.removeGlyph(font['_pad_space'])
@@ -190,33 +267,40 @@ _COMBINING = [
     (0x030C, '_caron_mark', 280),  # was too high
 ]
 
-for cp, private_name, y_offset in _COMBINING:
-    mark_glyph = font[cp]
-    # Use the private mark glyph's bbox (the encoded glyph is a composite whose
-    # bbox FontForge may not resolve; the private mark is a plain outline).
-    bb = font[private_name].boundingBox()
-    cx = (bb[0] + bb[2]) / 2
-    mark_glyph.addAnchorPoint('above', 'mark', cx, bb[1] + y_offset)
+# Mark-to-mark: a second mark above stacks on the first, the same gap above
+# the first's ink as the first sits above its base letter.
+font.addLookup('above_mkmk', 'gpos_mark2mark', (), [['mkmk', [['latn', ['dflt']]]]])
+font.addLookupSubtable('above_mkmk', 'above_mkmk_sub')
+font.addAnchorClass('above_mkmk_sub', 'above_mkmk')
+
+_BASE_GAP = 20
+
+# Use the private mark glyphs' bboxes (the encoded glyph is a composite whose
+# bbox FontForge may not resolve; the private mark is a plain outline).
+_marks = anchors.Anchors(geometry, [private_name for _, private_name, _ in _COMBINING])
+for (cp, _, y_offset), cx, bb in zip(_COMBINING, _marks.x, _marks.boxes):
+    font[cp].addAnchorPoint('above', 'mark', cx, bb[1] + y_offset)
+    font[cp].addAnchorPoint('above_mkmk', 'mark', cx, bb[1] + y_offset)
+    # The encoded glyph draws the private mark shifted up, so its top is
+    # read from its ink, references resolved.
+    font[cp].addAnchorPoint('above_mkmk', 'basemark', cx,
+                            geometry.ink(cp).bounding_box()[3] + _BASE_GAP)
 
 # j's dot is to the right of the body centre; combining marks should sit above the dot.
-_j_layer = font['j'].foreground
-_j_dot_ymin = max(min(p.y for p in c) for c in _j_layer)
-_j_dot_xs = [p.x for c in _j_layer for p in c if min(p.y for p in c) >= _j_dot_ymin]
-_j_dot_cx = (min(_j_dot_xs) + max(_j_dot_xs)) / 2
+_j_dot_cx = anchors.top_contours_centre_x(geometry.outline('j'))
 _J_BASE_NAMES = frozenset({'j', 'uni0237'})
+# Letters whose marks centre on their ink's centre of mass rather than their
+# box.  pt6 centres its precomposed accents on the box, so none do yet.
+_OPTICAL_BASES = frozenset()
+
+_letters = [glyph.glyphname for glyph in font.glyphs()
+            if glyph.unicode >= 0 and unicodedata.category(chr(glyph.unicode))[0] == 'L']
+_bases = anchors.Anchors(geometry, _letters, optical=_OPTICAL_BASES,
+                         centres={name: _j_dot_cx for name in _J_BASE_NAMES})
 
 # Base anchors at top-centre + gap for every letter in the font.
-_BASE_GAP = 20
-for glyph in font.glyphs():
-    if glyph.unicode < 0:
-        continue
-    if unicodedata.category(chr(glyph.unicode))[0] != 'L':
-        continue
-    bb = glyph.boundingBox()
-    if bb[2] <= bb[0]:  # empty / unresolved composite
-        continue
-    cx = _j_dot_cx if glyph.glyphname in _J_BASE_NAMES else (bb[0] + bb[2]) / 2
-    glyph.addAnchorPoint('above', 'base', cx, bb[3] + _BASE_GAP)
+for name, x, y in _bases.top(_BASE_GAP):
+    font[name].addAnchorPoint('above', 'base', x, y)
 
 
 # ---------------------------------------------------------------------------
@@ -229,19 +313,16 @@ font.addAnchorClass('below_sub', 'below')
 
 # Mark anchor at top-centre of the combining cedilla glyph.
 _c0327 = font[0x0327]
-_c0327_bb = _c0327.boundingBox()
-_c0327.addAnchorPoint('below', 'mark', (_c0327_bb[0] + _c0327_bb[2]) / 2, _c0327_bb[3])
-
-# Base anchors at bottom-centre of ɛ and Ɛ, pulled up by 15 units to match the
-# y_adj=-15 overlap used in the precomposed cedilla glyphs (avoids a rendering gap).
-_BELOW_BASES = {0x025B, 0x0190}  # ɛ  Ɛ
-for glyph in font.glyphs():
-    if glyph.unicode not in _BELOW_BASES:
-        continue
-    bb = glyph.boundingBox()
-    if bb[2] <= bb[0]:
-        continue
-    glyph.addAnchorPoint('below', 'base', (bb[0] + bb[2]) / 2, bb[1] + 15)
+_c0327.addAnchorPoint('below', 'mark', geometry.centre(0x0327)[0], geometry.bbox(0x0327)[3])
+
+# Base anchors at bottom-centre of every Latin letter (ɛ and Ɛ first needed
+# them), pulled up by 15 units to match the y_adj=-15 overlap used in the
+# precomposed hook cedilla glyphs (avoids a rendering gap).
+_latin = [name for name in _letters
+          if unicodedata.name(chr(font[name].unicode), '').startswith('LATIN ')]
+_below_bases = anchors.Anchors(geometry, _latin, optical=_OPTICAL_BASES)
+for name, x, y in _below_bases.bottom(15):
+    font[name].addAnchorPoint('below', 'base', x, y)
 
 
 # ---------------------------------------------------------------------------
@@ -14,6 +14,9 @@ this to pt9_ and reserve pt8_ for the derivatives orchestrator.
   4. (OTF) inline the committed reference OTF's charstrings byte-for-byte
      for any glyph whose outline is unchanged — keeps subpixel hint
      rendering stable across rebuilds even when other glyphs are added.
+  5. (TTF) fail unless every glyph pt6 composed purely from references
+     (accented letters etc.) came out as a TrueType composite glyph rather
+     than a copy of its components' outlines.
 """
 import datetime
 import os
@@ -24,6 +27,8 @@ import fontforge
 from fontTools.ttLib import TTFont as _TTFont
 from fontTools.pens.recordingPen import RecordingPen as _RecordingPen
 
+import profiling
+
 
 GENERATED = '../generated/'
 FONT_DIR  = '../font/'
@@ -111,7 +116,7 @@ def freeze_cff(otf_path, name, ref_otf):
     is already inlined and the saved bytes match exactly)."""
     _ref_top = ref_otf['CFF '].cff.topDictIndex[0]
     _ref_cs  = _ref_top.CharStrings
-    _ref_subrs = _ref_top.Private.Subrs
+    _ref_subrs = getattr(_ref_top.Private, 'Subrs', [])
     _ref_bias  = _subr_bias(len(_ref_subrs))
 
     _new_otf = _TTFont(otf_path, recalcTimestamp=False)
@@ -152,9 +157,37 @@ def freeze_cff(otf_path, name, ref_otf):
         _cs.program = _inline_subrs(_cs.program, _new_subrs, _new_bias)
         _cs.bytecode = None
 
+    # Nothing calls the local subrs any more; left in, they are ~85 KB of
+    # dead weight in the OTF.
+    _new_top.Private.rawDict.pop('Subrs', None)
+    if hasattr(_new_top.Private, 'Subrs'):
+        del _new_top.Private.Subrs
+
     _new_otf.save(otf_path)
 
 
+# ---------------------------------------------------------------------------
+# TrueType composites — keep reference-built glyphs as components
+# ---------------------------------------------------------------------------
+# A glyph made only of references (most of pt6's accented letters) costs a
+# few bytes per component in glyf, against a full copy of the outlines if
+# FontForge decomposes it.  FontForge keeps them as composites unless a glyph
+# mixes references with its own contours or a reference cannot be expressed
+# as a TrueType component; the build fails on any that slip through, so they
+# are fixed at the source rather than silently growing the font.
+
+def reference_only_glyphs(font):
+    """Names of the glyphs whose outline is nothing but references."""
+    return sorted(glyph.glyphname for glyph in font.glyphs()
+                  if glyph.references and len(glyph.foreground) == 0)
+
+
+def decomposed_glyphs(ttf_path, names):
+    """Those of names that are not composite glyphs in ttf_path's glyf table."""
+    glyf = _TTFont(ttf_path)['glyf']
+    return [name for name in names if name in glyf and not glyf[name].isComposite()]
+
+
 # ---------------------------------------------------------------------------
 # Build
 # ---------------------------------------------------------------------------
@@ -177,20 +210,30 @@ woff_path = out_base + '.woff'
 # Snapshot the existing OTF (if any) before overwriting, for CFF freezing.
 ref_otf = _TTFont(otf_path) if os.path.exists(otf_path) else None
 
-font.generate(otf_path, flags=('opentype',))
+with profiling.span('pt8 generate otf'):
+    font.generate(otf_path, flags=('opentype',))
 print(f"  generated {otf_path}")
 
-font.generate(ttf_path)
+with profiling.span('pt8 generate ttf'):
+    font.generate(ttf_path)
 print(f"  generated {ttf_path}")
+_composites = reference_only_glyphs(font)
+_decomposed = decomposed_glyphs(ttf_path, _composites)
+print(f"  {len(_composites) - len(_decomposed)}/{len(_composites)} reference-only glyphs kept as TrueType composites")
+if _decomposed:
+    raise ValueError(f"{len(_decomposed)} reference-only glyphs were decomposed in {ttf_path}: "
+                     f"{' '.join(_decomposed)}")
 
 # FontForge produces WOFF directly so the CFF stays subroutinized.
 # Wrapping the desubroutinized post-freeze OTF instead would inflate
 # the woff by ~40% with no functional gain.
-font.generate(woff_path)
+with profiling.span('pt8 generate woff'):
+    font.generate(woff_path)
 print(f"  generated {woff_path}")
 
 font.close()
 
 if ref_otf is not None:
-    freeze_cff(otf_path, NAME, ref_otf)
+    with profiling.span('pt8 freeze_cff'):
+        freeze_cff(otf_path, NAME, ref_otf)
     print(f"  froze CFF for {otf_path}")
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Read and write the packed stroke archive that pt1 hands to pt2.
+
+The archive is a pair of .npy files: a flat uint8 buffer holding the RGB pixels
+of every stroke back to back, and an (N, 5) index table whose rows are
+(x0, y0, x1, y1, offset) — the stroke's bounding box in scan pixels, in the same
+order as the old stroke_x{x0}_y{y0}_x{x1}_y{y1}.png file names, and where its
+pixels start in the buffer.  Readers memory-map the buffer, so each stroke is a
+read-only view rather than a decoded copy.
+"""
+import os
+
+import numpy as np
+
+
+PIXELS_FNAME = '../generated/strokes.npy'
+INDEX_FNAME = '../generated/strokes.index.npy'
+
+CHANNELS = 3
+
+
+def write_strokes(strokes, pixels_fname=PIXELS_FNAME, index_fname=INDEX_FNAME):
+    """Write a {(x0, y0, x1, y1): (height, width, 3) uint8 image} mapping to the archive."""
+    bboxes = sorted(strokes)
+    index = np.zeros((len(bboxes), 5), dtype=np.int64)
+    offset = 0
+    for row, bbox in zip(index, bboxes):
+        row[:4] = bbox
+        row[4] = offset
+        offset += strokes[bbox].size
+
+    dirname = os.path.dirname(pixels_fname)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+
+    pixels = np.lib.format.open_memmap(pixels_fname, mode='w+', dtype=np.uint8,
+                                       shape=(max(offset, 1),))
+    for (x0, y0, x1, y1, offset), bbox in zip(index, bboxes):
+        img = strokes[bbox]
+        if img.shape != (y1 - y0, x1 - x0, CHANNELS):
+            raise ValueError('Stroke {} has shape {}, which does not match its bbox'
+                             ''.format(bbox, img.shape))
+        pixels[offset:offset + img.size] = img.reshape(-1)
+    pixels.flush()
+    del pixels
+    np.save(index_fname, index)
+
+
+def read_strokes(pixels_fname=PIXELS_FNAME, index_fname=INDEX_FNAME):
+    """Return the archive as an ordered {(x0, y0, x1, y1): read-only image view} dict."""
+    pixels = np.load(pixels_fname, mmap_mode='r')
+    index = np.load(index_fname)
+    strokes = {}
+    for x0, y0, x1, y1, offset in index.tolist():
+        shape = (y1 - y0, x1 - x0, CHANNELS)
+        size = shape[0] * shape[1] * shape[2]
+        strokes[(x0, y0, x1, y1)] = pixels[offset:offset + size].reshape(shape)
+    return strokes
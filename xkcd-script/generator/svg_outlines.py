@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Read potrace SVG outlines into plain NumPy contours.
+
+pt5 used to import every character SVG with FontForge's importOutlines (via a
+temporary symlink), then measure and transform each glyph in FontForge.  Here
+the path data is parsed once in Python instead.  Each contour is a closed
+(points, on_curve) pair in font orientation (y up): `points` is an (N, 2) float
+array, and `on_curve` marks which of them are on-curve points, the rest being
+the two control points of a cubic — the same layout as a fontforge.contour.
+Because the outlines are plain arrays, pt5 can compute their exact bounds,
+compose its scale and translation into one matrix and apply it before FontForge
+ever sees the glyph.
+
+Only what potrace emits is supported: nested <g>/<path> elements with
+translate/scale/matrix transforms, and the M, L, H, V, C and Z path commands
+(absolute and relative).
+"""
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+import outline_geometry
+
+
+_SVG_NS = '{http://www.w3.org/2000/svg}'
+_PATH_TOKEN = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_TRANSFORM = re.compile(r'(translate|scale|matrix)\s*\(([^)]*)\)')
+
+
+def parse_transform(text):
+    """The 3x3 affine matrix of an SVG transform attribute."""
+    matrix = np.eye(3)
+    for name, args in _TRANSFORM.findall(text or ''):
+        values = [float(value) for value in re.split(r'[\s,]+', args.strip())]
+        if name == 'translate':
+            tx, ty = (values + [0])[:2]
+            step = [[1, 0, tx], [0, 1, ty], [0, 0, 1]]
+        elif name == 'scale':
+            sx, sy = (values + values)[:2]
+            step = [[sx, 0, 0], [0, sy, 0], [0, 0, 1]]
+        else:
+            a, b, c, d, e, f = values
+            step = [[a, c, e], [b, d, f], [0, 0, 1]]
+        matrix = matrix @ np.array(step, dtype=float)
+    return matrix
+
+
+def parse_path(d):
+    """Split SVG path data into closed contours, in the path's own coordinates."""
+    tokens = _PATH_TOKEN.findall(d)
+    contours = []
+    points, on_curve = [], []
+    current = start = np.zeros(2)
+    command = None
+    i = 0
+
+    def close():
+        if len(points) > 1 and on_curve[-1] and np.allclose(points[-1], points[0]):
+            # The closing segment ends where the contour started: that point is
+            # already the contour's first point.
+            del points[-1], on_curve[-1]
+        if points:
+            contours.append((np.array(points), np.array(on_curve)))
+        del points[:], on_curve[:]
+
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in 'Zz':
+                close()
+                current = start
+                continue
+        relative = command.islower()
+        origin = current if relative else np.zeros(2)
+        if command in 'Mm':
+            close()
+            current = start = origin + [float(tokens[i]), float(tokens[i + 1])]
+            points.append(current)
+            on_curve.append(True)
+            i += 2
+            # Further coordinate pairs after a moveto are implicit linetos.
+            command = 'l' if relative else 'L'
+        elif command in 'LlHhVv':
+            if command in 'Ll':
+                current = origin + [float(tokens[i]), float(tokens[i + 1])]
+                i += 2
+            elif command in 'Hh':
+                current = np.array([origin[0] + float(tokens[i]), current[1]])
+                i += 1
+            else:
+                current = np.array([current[0], origin[1] + float(tokens[i])])
+                i += 1
+            points.append(current)
+            on_curve.append(True)
+        elif command in 'Cc':
+            coords = np.array([float(token) for token in tokens[i:i + 6]]).reshape(3, 2) + origin
+            points.extend(coords)
+            on_curve.extend([False, False, True])
+            current = coords[2]
+            i += 6
+        else:
+            raise ValueError('Unsupported SVG path command {!r}'.format(command))
+    close()
+    return contours
+
+
+def read_outlines(fname):
+    """All contours of a potrace SVG file, in font orientation (y up)."""
+    contours = []
+
+    def walk(element, matrix):
+        matrix = matrix @ parse_transform(element.get('transform'))
+        if element.tag == _SVG_NS + 'path':
+            for points, on_curve in parse_path(element.get('d', '')):
+                contours.append((points, on_curve, matrix))
+        for child in element:
+            walk(child, matrix)
+
+    # SVG's y axis points down, a font's up.
+    walk(ET.parse(fname).getroot(), np.diag([1.0, -1.0, 1.0]))
+    return [(transform_points(points, matrix), on_curve)
+            for points, on_curve, matrix in contours]
+
+
+def transform_points(points, matrix):
+    return points @ matrix[:2, :2].T + matrix[:2, 2]
+
+
+def transform(contours, matrix):
+    """Apply a psMat-style (xx, xy, yx, yy, dx, dy) matrix to every contour."""
+    xx, xy, yx, yy, dx, dy = matrix
+    affine = np.array([[xx, yx, dx], [xy, yy, dy], [0, 0, 1]], dtype=float)
+    return [(transform_points(points, affine), on_curve) for points, on_curve in contours]
+
+
+def bounding_box(contours):
+    """The exact (xmin, ymin, xmax, ymax) of the outlines, curve extrema included.
+
+    This is what FontForge's boundingBox() reports once addExtrema() has put a
+    point on every extremum, without having to add them.
+    """
+    return outline_geometry.OutlineGeometry(contours).bounding_box()
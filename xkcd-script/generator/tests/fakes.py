@@ -0,0 +1,44 @@
+"""Stand-ins for the fontforge glyphs and points the generator's helper modules read."""
+
+
+class Point(object):
+    def __init__(self, x, y, on_curve=True):
+        self.x, self.y, self.on_curve = x, y, on_curve
+
+
+class Glyph(object):
+    """Polygons as contours and (name, matrix) references, resolved through `font`.
+
+    boundingBox() counts its calls in `calls`; addPosSub calls are recorded
+    in `possubs` and read back by getPosSub as pairs.
+    """
+
+    def __init__(self, name=None, width=500, contours=(), references=(), unicode=-1, font=None):
+        self.glyphname, self.width, self.unicode, self.font = name, width, unicode, font
+        self.foreground = [[Point(x, y) for x, y in contour] for contour in contours]
+        self.references = list(references)
+        self.possubs = []
+        self.calls = 0
+
+    def boundingBox(self):
+        self.calls += 1
+        xs = [p.x for c in self.foreground for p in c]
+        ys = [p.y for c in self.foreground for p in c]
+        for ref, matrix in self.references:
+            x0, y0, x1, y1 = self.font[ref].boundingBox()
+            xs += [x0 + matrix[4], x1 + matrix[4]]
+            ys += [y0 + matrix[5], y1 + matrix[5]]
+        if not xs:
+            return 0, 0, 0, 0
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def addPosSub(self, *args):
+        self.possubs.append(args)
+
+    def getPosSub(self, subtable):
+        return [(args[0], 'Pair') + args[1:] for args in self.possubs if args[0] == subtable]
+
+
+def box(x0, y0, x1, y1):
+    """A clockwise rectangle, as a polygon for Glyph(contours=...)."""
+    return [(x0, y0), (x0, y1), (x1, y1), (x1, y0)]
@@ -0,0 +1,46 @@
+import importlib.util
+import pathlib
+import sys
+
+import pytest
+
+from .fakes import Glyph, box
+
+_HERE = pathlib.Path(__file__).resolve().parent
+for _name in ("outline_geometry", "glyph_geometry", "anchors"):
+    _spec = importlib.util.spec_from_file_location(_name, _HERE.parent / (_name + ".py"))
+    _module = importlib.util.module_from_spec(_spec)
+    sys.modules[_name] = _module
+    _spec.loader.exec_module(_module)
+anchors = sys.modules["anchors"]
+glyph_geometry = sys.modules["glyph_geometry"]
+
+
+def _boxes(*boxes):
+    return Glyph(contours=[box(*b) for b in boxes])
+
+
+def _geometry():
+    return glyph_geometry.GlyphGeometry({
+        'o': _boxes((0, 0, 100, 400)),
+        # A stem with a bar to its right at the bottom: the ink leans left of the box centre.
+        'L': _boxes((0, 0, 40, 600), (40, 0, 200, 40)),
+        'j': _boxes((0, -200, 60, 400), (50, 500, 110, 560)),
+        'space': _boxes(),
+    })
+
+
+def test_top_and_bottom_anchors_skip_empty_glyphs():
+    bases = anchors.Anchors(_geometry(), ['o', 'space', 'L'])
+    assert bases.top(20) == [('o', 50, 420), ('L', 100, 620)]
+    assert bases.bottom(15) == [('o', 50, 15), ('L', 100, 15)]
+
+
+def test_optical_and_pinned_centres():
+    geometry = _geometry()
+    bases = anchors.Anchors(geometry, ['o', 'L', 'j'], optical={'o', 'L'},
+                            centres={'j': anchors.top_contours_centre_x(geometry.outline('j'))})
+    (_, o_x, _), (_, l_x, _), (_, j_x, _) = bases.top(20)
+    assert o_x == pytest.approx(50)
+    assert l_x == pytest.approx((40 * 600 * 20 + 160 * 40 * 120) / (40 * 600 + 160 * 40))
+    assert j_x == 80
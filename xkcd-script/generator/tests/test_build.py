@@ -0,0 +1,102 @@
+import importlib.util
+import json
+import pathlib
+import sys
+
+import pytest
+
+_HERE = pathlib.Path(__file__).resolve().parent
+_SCRIPT = _HERE.parent / "build.py"
+_spec = importlib.util.spec_from_file_location("build", _SCRIPT)
+build = importlib.util.module_from_spec(_spec)
+sys.modules["build"] = build
+_spec.loader.exec_module(build)
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """Two copy stages, a.txt -> b.txt -> c.txt, each logging its runs to log.txt."""
+    monkeypatch.chdir(tmp_path)
+    for name, src, dst in [("one.py", "a.txt", "b.txt"), ("two.py", "b.txt", "c.txt")]:
+        (tmp_path / name).write_text(
+            "import shutil\n"
+            f"shutil.copy({src!r}, {dst!r})\n"
+            f"open('log.txt', 'a').write({name!r} + '\\n')\n"
+        )
+    (tmp_path / "a.txt").write_text("hello")
+    stages = [
+        build.Stage(1, "one.py", inputs=["one.py", "a.txt"], outputs=["b.txt"]),
+        build.Stage(2, "two.py", inputs=["two.py", "b.txt"], outputs=["c.txt"]),
+    ]
+
+    def run(**kwargs):
+        log = tmp_path / "log.txt"
+        log.write_text("")
+        build.build(stages, state_fname=str(tmp_path / "state" / "build.json"), **kwargs)
+        return log.read_text().split()
+
+    return tmp_path, run
+
+
+def test_second_run_skips_everything(pipeline):
+    tmp_path, run = pipeline
+    assert run() == ["one.py", "two.py"]
+    assert run() == []
+    assert (tmp_path / "c.txt").read_text() == "hello"
+
+
+def test_changed_input_reruns_downstream(pipeline):
+    tmp_path, run = pipeline
+    run()
+    (tmp_path / "a.txt").write_text("changed")
+    assert run() == ["one.py", "two.py"]
+    assert (tmp_path / "c.txt").read_text() == "changed"
+
+
+def test_changed_script_reruns_only_that_stage(pipeline):
+    tmp_path, run = pipeline
+    run()
+    with open(tmp_path / "two.py", "a") as fh:
+        fh.write("# edited\n")
+    assert run() == ["two.py"]
+
+
+def test_missing_output_reruns_stage(pipeline):
+    tmp_path, run = pipeline
+    run()
+    (tmp_path / "c.txt").unlink()
+    assert run() == ["two.py"]
+
+
+def test_first_and_force(pipeline):
+    tmp_path, run = pipeline
+    run()
+    assert run(first=2, force=True) == ["two.py"]
+
+
+def test_profile_records_stage_and_span_events(pipeline, monkeypatch):
+    tmp_path, run = pipeline
+    events = tmp_path / "events.jsonl"
+    monkeypatch.setenv("XKCD_PROFILE", str(events))
+    monkeypatch.setenv("PYTHONPATH", str(_SCRIPT.parent))
+    with open(tmp_path / "two.py", "a") as fh:
+        fh.write("import profiling\nwith profiling.span('inside two'):\n    pass\n")
+    run()
+    build.write_trace(str(events), str(tmp_path / "trace.json"))
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    names = [event["name"] for event in trace["traceEvents"]]
+    assert sorted(names) == ["inside two", "one.py", "two.py"]
+    stage = next(event for event in trace["traceEvents"] if event["name"] == "two.py")
+    assert stage["args"]["cpu_ms"] >= 0 and stage["args"]["max_rss_kb"] > 0
+
+
+def test_named_env_vars_count_as_inputs(pipeline, monkeypatch):
+    tmp_path, run = pipeline
+    run()
+    stage = build.Stage(1, "one.py", inputs=["one.py", "a.txt"], outputs=["b.txt"], env=["XKCD_TEST_ENV"])
+    digest = build.inputs_digest(stage)
+    assert digest != build.files_digest(stage.inputs)
+    monkeypatch.setenv("XKCD_TEST_ENV", "1")
+    assert build.inputs_digest(stage) != digest
+    monkeypatch.delenv("XKCD_TEST_ENV")
+    assert build.inputs_digest(stage) == digest
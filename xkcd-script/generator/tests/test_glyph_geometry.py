@@ -0,0 +1,77 @@
+import importlib.util
+import pathlib
+import sys
+
+from .fakes import Glyph, box
+
+_HERE = pathlib.Path(__file__).resolve().parent
+for _name in ("outline_geometry", "glyph_geometry"):
+    _spec = importlib.util.spec_from_file_location(_name, _HERE.parent / (_name + ".py"))
+    _module = importlib.util.module_from_spec(_spec)
+    sys.modules[_name] = _module
+    _spec.loader.exec_module(_module)
+glyph_geometry = sys.modules["glyph_geometry"]
+
+
+class _Font(dict):
+    def add(self, name, unicode=-1, boxes=(), references=()):
+        self[name] = Glyph(name, unicode=unicode, font=self, contours=[box(*b) for b in boxes],
+                           references=[(ref, (1, 0, 0, 1, dx, dy)) for ref, dx, dy in references])
+        if self[name].unicode >= 0:
+            self[self[name].unicode] = self[name]
+        return self[name]
+
+
+def _font():
+    font = _Font()
+    font.add('i', unicode=0x69, boxes=[(0, 0, 60, 400), (0, 500, 60, 560)])
+    font.add('_acute_mark', boxes=[(0, 0, 80, 100)])
+    font.add('iacute_base', references=[('i', 0, 0)])
+    font.add('iacute', unicode=0xED, references=[('iacute_base', 0, 0), ('_acute_mark', -10, 600)])
+    return font
+
+
+def test_bbox_is_computed_once_and_found_by_codepoint():
+    font = _font()
+    geometry = glyph_geometry.GlyphGeometry(font)
+    assert geometry.bbox('i') == (0, 0, 60, 560)
+    assert geometry.bbox(0x69) == (0, 0, 60, 560)
+    assert font['i'].calls == 1
+    assert geometry.centre('i') == (30, 280)
+
+
+def test_contour_ymins_come_from_the_glyph_itself():
+    font = _font()
+    geometry = glyph_geometry.GlyphGeometry(font)
+    assert list(geometry.contour_ymins('i')) == [0, 500]
+    assert geometry.outline('i') is geometry.outline(0x69)
+    assert list(geometry.contour_ymins('iacute')) == []
+
+
+def test_invalidate_reaches_composites_through_other_composites():
+    font = _font()
+    geometry = glyph_geometry.GlyphGeometry(font)
+    assert geometry.bbox('iacute') == (-10, 0, 70, 700)
+    geometry.bbox('_acute_mark')
+    geometry.bbox('i')
+
+    font.add('i', unicode=0x69, boxes=[(0, 0, 60, 420)])
+    assert geometry.bbox('i') == (0, 0, 60, 560)  # stale until told
+    geometry.invalidate('i')
+    assert geometry.bbox('i') == (0, 0, 60, 420)
+    assert geometry.bbox('iacute') == (-10, 0, 70, 700)
+    assert font['iacute'].calls == 2
+    # The mark does not use i, so it stays cached.
+    calls = font['_acute_mark'].calls
+    geometry.bbox('_acute_mark')
+    assert font['_acute_mark'].calls == calls
+
+
+def test_ink_resolves_references_through_composites():
+    font = _font()
+    geometry = glyph_geometry.GlyphGeometry(font)
+    assert geometry.ink('i') is geometry.outline('i')
+    assert geometry.ink('iacute').bounding_box() == (-10, 0, 70, 700)
+    font.add('_acute_mark', boxes=[(0, 0, 80, 50)])
+    geometry.invalidate('_acute_mark')
+    assert geometry.ink('iacute').bounding_box() == (-10, 0, 70, 650)
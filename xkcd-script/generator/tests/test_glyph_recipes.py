@@ -0,0 +1,123 @@
+import importlib.util
+import pathlib
+import sys
+
+import pytest
+
+from .fakes import Glyph
+
+_HERE = pathlib.Path(__file__).resolve().parent
+_SCRIPT = _HERE.parent / "glyph_recipes.py"
+_spec = importlib.util.spec_from_file_location("glyph_recipes", _SCRIPT)
+glyph_recipes = importlib.util.module_from_spec(_spec)
+sys.modules["glyph_recipes"] = glyph_recipes
+_spec.loader.exec_module(glyph_recipes)
+
+
+class _Font(dict):
+    """Glyphs by name; builders record what they make in `log`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.log = []
+
+
+def _name_of(codepoint):
+    return 'uni{:04X}'.format(codepoint)
+
+
+_RAISE = 0
+
+
+def _offset(gap):
+    return gap + _RAISE
+
+
+@glyph_recipes.reads('_mark')
+def _compose(font, cp, base_name, gap=20):
+    font.log.append(_name_of(cp))
+    font[_name_of(cp)] = Glyph(width=font[base_name].width + _offset(gap),
+                               references=[(base_name, (1, 0, 0, 1, 0, 0)),
+                                           ('_mark', (1, 0, 0, 1, 0, gap))])
+
+
+@pytest.fixture
+def font():
+    return _Font(A=Glyph(contours=[[(0, 0), (10, 20)]]), B=Glyph(), _mark=Glyph(width=0))
+
+
+@pytest.fixture
+def book():
+    book = glyph_recipes.RecipeBook(_name_of)
+    book.add(0x00C0, _compose, 'A')
+    book.add(0x01DE, _compose, 'uni00C0', gap=30)  # built on top of another recipe
+    book.add(0x00C1, _compose, base_name='B')
+    return book
+
+
+def test_sources_include_defaults_and_declared_reads(book):
+    recipe = book.recipes['uni00C0']
+    assert recipe.sources == ('_mark', 'A')
+    assert recipe.params == {'base_name': 'A'}
+    with pytest.raises(ValueError):
+        book.add(0x00C0, _compose, 'B')
+
+
+def test_order_puts_dependencies_first_and_subsets_pull_them_in(book):
+    assert book.order() == ['uni00C0', 'uni01DE', 'uni00C1']
+    wanted = book.select(glyph_recipes.parse_codepoint_ranges('U+01D0-U+01FF'))
+    assert book.order(wanted) == ['uni00C0', 'uni01DE']
+
+
+def test_unchanged_recipes_are_reused_and_changes_cascade(book, font):
+    signatures, built, reused = book.evaluate(font)
+    assert built == font.log == ['uni00C0', 'uni01DE', 'uni00C1']
+
+    copied = []
+
+    def reuse(recipe):
+        copied.append(recipe.name)
+        return True
+
+    font.log, seen = [], []
+    again, built, reused = book.evaluate(font, previous=signatures, reuse=reuse, changed=seen.append)
+    assert again == signatures and built == [] and reused == copied == seen
+
+    # Editing A rebuilds À and the Ǟ built on it, but not Á.
+    font['A'].foreground[0][0].x = 5
+    font.log = []
+    changed, built, reused = book.evaluate(font, previous=signatures, reuse=reuse)
+    assert built == ['uni00C0', 'uni01DE'] and reused == ['uni00C1']
+    assert changed['uni00C1'] == signatures['uni00C1']
+
+
+def test_signatures_cover_helpers_constants_and_shared_code(book, font, monkeypatch):
+    recipe = book.recipes['uni00C1']
+
+    def sign(**kwargs):
+        return glyph_recipes.RecipeBook(_name_of, **kwargs).signature(recipe, {}, font, {})
+
+    before = sign()
+    # A constant the helper reads, then the helper itself.
+    monkeypatch.setattr(sys.modules[__name__], '_RAISE', 5)
+    assert sign() != before
+    monkeypatch.undo()
+    assert sign() == before
+    monkeypatch.setattr(sys.modules[__name__], '_offset', lambda gap: gap)
+    assert sign() != before
+    monkeypatch.undo()
+    assert sign(shared_code=[glyph_recipes]) != before
+
+
+def test_glyph_digest_follows_references(font):
+    font['C'] = Glyph(references=[('A', (1, 0, 0, 1, 0, 0))])
+    before = glyph_recipes.glyph_digest(font, 'C')
+    font['A'].width = 600
+    assert glyph_recipes.glyph_digest(font, 'C') != before
+    assert glyph_recipes.glyph_digest(font, 'missing') != before
+
+
+def test_parse_codepoint_ranges():
+    assert glyph_recipes.parse_codepoint_ranges('U+00A0-U+00FF, 0100') == [(0xA0, 0xFF), (0x100, 0x100)]
+    with pytest.raises(ValueError):
+        glyph_recipes.parse_codepoint_ranges('Latin-1')
@@ -0,0 +1,177 @@
+import importlib.util
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+from .fakes import Glyph, box
+
+_HERE = pathlib.Path(__file__).resolve().parent
+for _name in ("outline_geometry", "glyph_geometry", "glyph_recipes", "kerning"):
+    _spec = importlib.util.spec_from_file_location(_name, _HERE.parent / (_name + ".py"))
+    _module = importlib.util.module_from_spec(_spec)
+    sys.modules[_name] = _module
+    _spec.loader.exec_module(_module)
+glyph_geometry = sys.modules["glyph_geometry"]
+kerning = sys.modules["kerning"]
+
+
+@pytest.fixture
+def kerner():
+    font = {
+        # Bars with 20 units of bearing on each side.
+        'I': Glyph('I', 100, [box(20, 0, 80, 600)]),
+        'l': Glyph('l', 100, [box(20, 0, 80, 600)]),
+        # A top bar overhanging its stem on the right: 20 units at the top, 120 below.
+        'T': Glyph('T', 300, [box(20, 500, 280, 600), box(120, 0, 180, 500)]),
+        'space': Glyph('space', 250, []),
+    }
+    return kerning.Kerner(font, glyph_geometry.GlyphGeometry(font))
+
+
+def test_parallel_edges_kern_to_the_separation(kerner):
+    kerns = kerner.measure(60, ['I'], ['l', 'space'])
+    assert kerns[0, 0] == pytest.approx(60 - 40)
+    assert np.isnan(kerns[0, 1])
+
+
+def test_touch_kerns_the_closest_band_optical_sits_between(kerner):
+    touch = kerner.measure(100, ['T'], ['I'], touch=True)[0, 0]
+    optical = kerner.measure(100, ['T'], ['I'])[0, 0]
+    assert touch == pytest.approx(100 - 40)
+    assert 100 - 140 < optical < touch
+
+
+def test_rules_overwrite_and_only_closer_zeroes(kerner):
+    kerner.kern(10, ['I'], ['l'])
+    assert kerner.get('I', 'l') == -30
+    kerner.kern(100, ['I'], ['l'], onlyCloser=True)
+    assert kerner.get('I', 'l') == 0
+    kerner.kern(42, ['I'], ['l'])  # |kern| < minKern
+    assert kerner.get('I', 'l') == 0
+    kerner.kern(0, ['I'], ['l'], damper=0.75)
+    assert kerner.get('I', 'l') == -30
+    assert kerner.get('l', 'I') is None
+
+
+def _fresh(kerner, cache=None):
+    font = kerner.font
+    return kerning.Kerner(font, glyph_geometry.GlyphGeometry(font), cache=cache)
+
+
+def test_cached_distances_are_reused_until_a_glyph_changes(kerner, tmp_path):
+    fname = str(tmp_path / 'kerns.json')
+    kerner.kern(100, ['T', 'I'], ['I', 'l'], onlyCloser=True)
+    kerner.kern(60, ['I'], ['l'], touch=True)
+    assert (kerner.measured, kerner.reused) == (5, 0)
+    kerning.save_cache(kerner, fname)
+
+    again = _fresh(kerner, kerning.load_cache(fname))
+    again.kern(100, ['T', 'I'], ['I', 'l'], onlyCloser=True)
+    again.kern(60, ['I'], ['l'], touch=True)
+    assert (again.measured, again.reused) == (0, 5)
+    assert again.matrix.pairs() == kerner.matrix.pairs()
+
+    # Moving l's stem only re-measures the pairs with l in them.
+    kerner.font['l'] = Glyph('l', 100, [box(30, 0, 80, 600)])
+    edited = _fresh(kerner, kerning.load_cache(fname))
+    edited.kern(100, ['T', 'I'], ['I', 'l'], onlyCloser=True)
+    assert (edited.measured, edited.reused) == (2, 2)
+    assert edited.measure(100, ['I'], ['l'])[0, 0] == pytest.approx(100 - 50)
+    # Only what this run read is kept: the touch distances are dropped.
+    kerning.save_cache(edited, fname)
+    assert list(kerning.load_cache(fname)) == ['optical']
+
+
+def test_cache_is_dropped_when_the_measuring_code_changes(kerner, tmp_path, monkeypatch):
+    fname = str(tmp_path / 'kerns.json')
+    kerner.kern(100, ['I'], ['l'])
+    kerning.save_cache(kerner, fname)
+    assert kerning.load_cache(fname)
+    monkeypatch.setattr(kerning, '_MEASURING_CODE', kerning._MEASURING_CODE + (_fresh,))
+    assert kerning.load_cache(fname) == {}
+
+
+_PAIRS = {
+    ('T', 'o'): -100, ('T', 'oacute'): -100, ('T', 'ocircumflex'): -40,
+    ('T_T', 'o'): -150, ('T_T', 'oacute'): -150, ('T_T', 'ocircumflex'): -60,
+    ('V', 'o'): -50, ('V', 'ocircumflex'): -30, ('L', 'T'): 0,
+}
+_KEYS = {'T_T': 'T', 'oacute': 'o', 'ocircumflex': 'o'}
+
+
+def _key(name):
+    return _KEYS.get(name, name)
+
+
+def test_class_kerning_keeps_every_pair():
+    classes = kerning.class_kerning(_PAIRS, _key, _key)
+    assert classes.firsts == ((), ('T', 'T_T'), ('V',))
+    assert classes.seconds == ((), ('o', 'oacute', 'ocircumflex'))
+    assert classes.offsets == (0, 0, 0, -100, 0, -50)
+    # V has no kern for oacute, which takes an exception of 0 under V's class pair.
+    assert classes.exceptions == {
+        ('T', 'ocircumflex'): -40, ('T_T', 'o'): -150, ('T_T', 'oacute'): -150,
+        ('T_T', 'ocircumflex'): -60, ('V', 'oacute'): 0, ('V', 'ocircumflex'): -30}
+    assert kerning.effective_kerns(classes)[('V', 'oacute')] == 0
+    kerning.verify_class_kerning(_PAIRS, classes)
+
+
+def test_verify_class_kerning_reports_changed_pairs():
+    classes = kerning.class_kerning(_PAIRS, _key, _key)
+    wrong = classes._replace(offsets=(0, 0, 0, -90, 0, -50))
+    with pytest.raises(ValueError, match='changes 2 pairs'):
+        kerning.verify_class_kerning(_PAIRS, wrong)
+
+
+class _Font(dict):
+    def glyphs(self):
+        return iter(self.values())
+
+    def addKerningClass(self, *args):
+        self.kerning_class = args
+
+    def getKerningClass(self, subtable):
+        assert subtable == self.kerning_class[1]
+        return tuple(None if not c else c for c in self.kerning_class[2]), \
+            self.kerning_class[3], self.kerning_class[4]
+
+
+def test_class_kerning_round_trips_through_the_font():
+    font = _Font((name, Glyph(name, 100, [])) for name in ('T', 'T_T', 'V', 'L'))
+    classes = kerning.class_kerning(_PAIRS, _key, _key)
+    kerning.write_class_kerning(font, 'kerning', 'kern', classes)
+    assert font.kerning_class[:2] == ('kerning', 'kern-classes')
+    assert font.kerning_class[-1] == 'kern'
+    assert font['V'].possubs == [('kern', 'oacute', 0, 0, 0, 0, 0, 0, 0, 0),
+                                 ('kern', 'ocircumflex', 0, 0, -30, 0, 0, 0, 0, 0)]
+    stored = kerning.read_class_kerning(font, 'kern')
+    assert stored == classes
+    kerning.verify_class_kerning(_PAIRS, stored)
+
+
+def test_kern_matrix_reads_rows_and_damps_in_place():
+    font = _Font((name, Glyph(name, 100, [])) for name in ('T', 'V', 'L'))
+    font['T'].addPosSub('kern', 'o', 0, 0, -100, 0, 0, 0, 0, 0)
+    font['T'].addPosSub('kern', 'a', 0, 0, -80, 0, 0, 0, 0, 0)
+    font['V'].addPosSub('kern', 'o', 0, 0, -50, 0, 0, 0, 0, 0)
+    matrix = kerning.KernMatrix()
+    matrix.read_rows(font, 'kern', ['T', 'V', 'L'])
+    assert matrix.get('T', 'a') == -80
+    assert matrix.get('L', 'o') is None
+    assert matrix.damp(['T', 'L'], ['o', 'e'], 0.75) == [('T', 'o', -75)]
+    assert matrix.array(['T', 'V', 'L'], ['o', 'a']).tolist() == [[-75, -80], [-50, 0], [0, 0]]
+    matrix.set('V', 'o', 0)
+    matrix.set('L', 'o', 0)
+    assert matrix.pairs() == {('T', 'o'): -75, ('T', 'a'): -80, ('V', 'o'): 0}
+
+
+def test_engine_is_checked(monkeypatch):
+    monkeypatch.delenv(kerning.ENGINE_ENV, raising=False)
+    assert kerning.engine() == 'numpy'
+    monkeypatch.setenv(kerning.ENGINE_ENV, 'fontforge')
+    assert kerning.engine() == 'fontforge'
+    monkeypatch.setenv(kerning.ENGINE_ENV, 'ff')
+    with pytest.raises(ValueError):
+        kerning.engine()
@@ -0,0 +1,144 @@
+import importlib.util
+import pathlib
+import sys
+
+import numpy as np
+
+from .fakes import Point
+
+_HERE = pathlib.Path(__file__).resolve().parent
+_SCRIPT = _HERE.parent / "outline_geometry.py"
+_spec = importlib.util.spec_from_file_location("outline_geometry", _SCRIPT)
+outline_geometry = importlib.util.module_from_spec(_spec)
+sys.modules["outline_geometry"] = outline_geometry
+_spec.loader.exec_module(outline_geometry)
+
+
+def _square(x0, y0, size):
+    points = np.array([[x0, y0], [x0, y0 + size], [x0 + size, y0 + size], [x0 + size, y0]])
+    return points, np.ones(4, dtype=bool)
+
+
+def _circle(cx, cy, r):
+    """Four-arc cubic approximation of a circle, starting at the bottom."""
+    k = 0.5523 * r
+    points = np.array([
+        [cx, cy - r], [cx + k, cy - r], [cx + r, cy - k],
+        [cx + r, cy], [cx + r, cy + k], [cx + k, cy + r],
+        [cx, cy + r], [cx - k, cy + r], [cx - r, cy + k],
+        [cx - r, cy], [cx - r, cy - k], [cx - k, cy - r],
+    ], dtype=float)
+    on_curve = np.array([True, False, False] * 4)
+    return points, on_curve
+
+
+def _curve_points(points, on_curve, n=20001):
+    """Densely sample a closed cubic contour, for reference answers."""
+    on = np.flatnonzero(on_curve)
+    t = np.linspace(0, 1, n)[:, None]
+    samples = []
+    for start, stop in zip(on, np.append(on[1:], on[0] + len(points))):
+        p = points[np.arange(start, stop + 1) % len(points)]
+        if len(p) == 2:
+            samples.append((1 - t) * p[0] + t * p[1])
+        else:
+            samples.append((1 - t) ** 3 * p[0] + 3 * (1 - t) ** 2 * t * p[1]
+                           + 3 * (1 - t) * t ** 2 * p[2] + t ** 3 * p[3])
+    return np.concatenate(samples)
+
+
+def test_bounds_at_y_of_polygon():
+    geometry = outline_geometry.OutlineGeometry([_square(0, 0, 100), _square(200, 50, 10)])
+    assert geometry.x_bounds_at_y(-10, 10) == (0, 100)
+    assert geometry.x_bounds_at_y(55, 58) == (0, 210)
+    assert geometry.x_bounds_at_y(150, 160) is None
+    assert geometry.y_bounds_at_x(205, 300) == (50, 60)
+
+
+def test_bounds_at_y_cut_through_a_curve_are_exact():
+    points, on_curve = _circle(0, 0, 100)
+    geometry = outline_geometry.OutlineGeometry([(points, on_curve)])
+    reference = _curve_points(points, on_curve)
+    for lo, hi in [(90, 95), (-97, -60), (10, 20), (99, 200)]:
+        band = reference[(reference[:, 1] >= lo) & (reference[:, 1] <= hi)]
+        xmin, xmax = geometry.x_bounds_at_y(lo, hi)
+        np.testing.assert_allclose([xmin, xmax], [band[:, 0].min(), band[:, 0].max()], atol=0.01)
+
+
+def test_bounding_box_includes_curve_extrema():
+    points, on_curve = _circle(50, 50, 100)
+    geometry = outline_geometry.OutlineGeometry([(points, on_curve)])
+    np.testing.assert_allclose(geometry.bounding_box(), (-50, -50, 150, 150))
+
+
+def test_centroid_subtracts_counters():
+    outer = _square(0, 0, 100)
+    counter = (outer[0][::-1] * 0.3 + 60, outer[1])
+    geometry = outline_geometry.OutlineGeometry([outer, counter])
+    np.testing.assert_allclose(geometry.centroid(),
+                               [(100 * 100 * 50 - 30 * 30 * 75) / (100 * 100 - 30 * 30)] * 2)
+    circle = outline_geometry.OutlineGeometry([_circle(50, 20, 100)])
+    np.testing.assert_allclose(circle.centroid(), (50, 20), atol=1e-6)
+    assert outline_geometry.OutlineGeometry([]).centroid() is None
+
+
+def test_contour_ymins_and_scanline_crossings():
+    circle = _circle(0, 300, 20)
+    geometry = outline_geometry.OutlineGeometry([_square(0, 0, 100), circle])
+    assert geometry.contour_ymins().tolist() == [0, 280]
+    # The control polygon of a square is the square itself.
+    np.testing.assert_allclose(geometry.scanline_crossings([50]), [[0, 100]])
+    assert geometry.scanline_crossings([1000]).shape == (1, 0)
+
+
+def test_from_layer_reads_point_objects():
+    points, on_curve = _square(0, 0, 10)
+    layer = [[Point(x, y, on) for (x, y), on in zip(points, on_curve)]]
+    geometry = outline_geometry.OutlineGeometry.from_layer(layer)
+    assert geometry.bounding_box() == (0, 0, 10, 10)
+
+
+def _loop_scan_widths(contours, ys):
+    """pt5's original per-scanline loop over control-polygon edges."""
+    widths = []
+    for y in ys:
+        xs = []
+        for points, _ in contours:
+            for i in range(len(points)):
+                (x1, y1), (x2, y2) = points[i], points[(i + 1) % len(points)]
+                if (y1 - y) * (y2 - y) < 0:
+                    xs.append(x1 + (y - y1) / (y2 - y1) * (x2 - x1))
+        xs.sort()
+        gaps = [xs[j + 1] - xs[j] for j in range(len(xs) - 1)]
+        widths.append(min(gaps) if gaps else np.nan)
+    return np.array(widths)
+
+
+def test_scan_widths_match_scanline_loop():
+    contours = [_square(0, 0, 100), _square(10, 10, 30), _circle(200, 50, 40)]
+    geometry = outline_geometry.OutlineGeometry(contours)
+    ys = np.linspace(-20, 120, 57)
+    np.testing.assert_allclose(geometry.scan_widths(ys), _loop_scan_widths(geometry.contours, ys))
+
+
+def test_scan_widths_skip_empty_scanlines():
+    geometry = outline_geometry.OutlineGeometry([_square(0, 0, 100), _square(110, 0, 20)])
+    # y=10 crosses both squares (closest gap 10), y=50 only the tall one (100).
+    widths = geometry.scan_widths([10, 50, 500])
+    np.testing.assert_allclose(widths[:2], [10, 100])
+    assert np.isnan(widths[2])
+    counts, edges = geometry.stroke_width_histogram([10, 50, 500], bins=[0, 5, 50, 150])
+    assert counts.tolist() == [0, 1, 1]
+
+
+def test_band_x_bounds_match_band_queries():
+    contours = [_square(0, 0, 100), _circle(200, 50, 40)]
+    geometry = outline_geometry.OutlineGeometry(contours)
+    edges = np.arange(-20, 130, 10)
+    xmin, xmax = geometry.band_x_bounds(edges)
+    for k in range(len(edges) - 1):
+        bounds = geometry.x_bounds_at_y(edges[k], edges[k + 1])
+        if bounds is None:
+            assert np.isnan(xmin[k]) and np.isnan(xmax[k])
+        else:
+            np.testing.assert_allclose((xmin[k], xmax[k]), bounds, atol=0.5)
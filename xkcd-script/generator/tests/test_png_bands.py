@@ -0,0 +1,46 @@
+import importlib.util
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+_HERE = pathlib.Path(__file__).resolve().parent
+_SCRIPT = _HERE.parent / "png_bands.py"
+_spec = importlib.util.spec_from_file_location("png_bands", _SCRIPT)
+png_bands = importlib.util.module_from_spec(_spec)
+sys.modules["png_bands"] = png_bands
+_spec.loader.exec_module(png_bands)
+
+
+def _scan(shape):
+    """Smooth gradients with noise on top, so the encoder picks a mix of filters."""
+    rng = np.random.default_rng(0)
+    rows, cols = np.indices(shape[:2])
+    img = (rows * 3 + cols * 5) % 256
+    if len(shape) == 3:
+        img = np.stack([img + 40 * channel for channel in range(shape[2])], axis=-1)
+    img = img + rng.integers(0, 4, shape) * (rng.random(shape) < 0.2)
+    return (img % 256).astype(np.uint8)
+
+
+@pytest.mark.parametrize("shape", [(37, 23, 3), (37, 23), (20, 9, 4)])
+@pytest.mark.parametrize("band_height", [1, 8, 37, 100])
+def test_bands_match_whole_decode(tmp_path, shape, band_height):
+    fname = str(tmp_path / "scan.png")
+    Image.fromarray(_scan(shape)).save(fname)
+    whole = np.asarray(Image.open(fname))
+
+    assert png_bands.shape(fname) == whole.shape
+    bands = list(png_bands.read_bands(fname, band_height))
+    assert [start for start, _ in bands] == list(range(0, shape[0], band_height))
+    np.testing.assert_array_equal(np.concatenate([band for _, band in bands]), whole)
+
+
+def test_palette_images_are_not_read_in_bands(tmp_path):
+    fname = str(tmp_path / "scan.png")
+    Image.fromarray(_scan((8, 8, 3))).convert("P").save(fname)
+    assert png_bands.shape(fname) is None
+    with pytest.raises(ValueError):
+        next(png_bands.read_bands(fname, 4))
@@ -0,0 +1,36 @@
+import importlib.util
+import pathlib
+import sys
+
+_HERE = pathlib.Path(__file__).resolve().parent
+_SCRIPT = _HERE.parent / "profiling.py"
+_spec = importlib.util.spec_from_file_location("profiling", _SCRIPT)
+profiling = importlib.util.module_from_spec(_spec)
+sys.modules["profiling"] = profiling
+_spec.loader.exec_module(profiling)
+
+
+def test_span_is_a_no_op_without_env(tmp_path, monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    with profiling.span("step", glyph="a") as args:
+        args["pairs"] = 3
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_span_records_complete_event(tmp_path, monkeypatch):
+    events = tmp_path / "events.jsonl"
+    monkeypatch.setenv(profiling.PROFILE_ENV, str(events))
+    with profiling.span("outer"):
+        with profiling.span("inner", glyph="a") as args:
+            args["pairs"] = 3
+    inner, outer = profiling.read_events(str(events))
+    assert (inner["name"], outer["name"]) == ("inner", "outer")
+    assert inner["ph"] == "X"
+    assert inner["args"]["glyph"] == "a" and inner["args"]["pairs"] == 3
+    assert inner["args"]["max_rss_kb"] > 0
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+
+def test_read_events_of_missing_file_is_empty(tmp_path):
+    assert profiling.read_events(str(tmp_path / "missing.jsonl")) == []
@@ -0,0 +1,60 @@
+import importlib.util
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+_HERE = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+_SCRIPT = _HERE.parent / "pt2_character_classification.py"
+_spec = importlib.util.spec_from_file_location("pt2_character_classification", _SCRIPT)
+pt2 = importlib.util.module_from_spec(_spec)
+sys.modules["pt2_character_classification"] = pt2
+_spec.loader.exec_module(pt2)
+
+
+def test_segment_lines_finds_well_separated_lines():
+    rng = np.random.default_rng(0)
+    ys = np.concatenate([rng.normal(centre, 20, 30) for centre in (500, 1100, 1700)])
+    rng.shuffle(ys)
+    centres = pt2.segment_lines(ys, 3)
+    assert np.allclose(centres, [500, 1100, 1700], atol=15)
+
+
+def test_segment_lines_minimises_squared_distance():
+    # Lone outlier: splitting it off beats splitting the two tight groups.
+    centres = pt2.segment_lines([0, 1, 2, 10, 11, 12, 100], 3)
+    assert list(centres) == [1, 11, 100]
+
+
+def test_segment_lines_needs_a_stroke_per_line():
+    with pytest.raises(ValueError):
+        pt2.segment_lines([1, 2], 3)
+
+
+def _stroke(x0, y0, x1, y1, ink):
+    img = np.full((y1 - y0, x1 - x0, 3), 255, dtype=np.uint8)
+    img[0, 0] = ink
+    return (x0, y0, x1, y1), img
+
+
+def test_characters_composite_multi_stroke_glyphs(monkeypatch):
+    monkeypatch.setattr(pt2, "paragraphs", [["a", "=", "b"]])
+    monkeypatch.setattr(pt2, "glyphs_needing_two_strokes", ["="])
+    monkeypatch.setattr(pt2, "_LIGATURE_SOURCES", [(0, 0, 2, "ab")])
+    strokes = dict([_stroke(0, 10, 4, 20, 10), _stroke(10, 12, 14, 14, 20),
+                    _stroke(10, 16, 14, 18, 30), _stroke(20, 8, 22, 20, 40)])
+
+    records = list(pt2.characters(strokes))
+    assert [(r.char_no, r.char, r.bbox) for r in records] == [
+        (0, "a", (0, 10, 4, 20)), (1, "=", (10, 12, 14, 18)),
+        (2, "b", (20, 8, 22, 20)), (3, "ab", (0, 8, 22, 20))]
+    # Single strokes are passed through without a copy.
+    assert records[0].img is strokes[(0, 10, 4, 20)]
+    equals = records[1].img
+    assert equals.shape == (6, 4, 3)
+    assert (equals[0, 0] == 20).all() and (equals[4, 0] == 30).all()
+    assert (equals == 255).sum() == equals.size - 6
+    ligature = records[3].img
+    assert (ligature[2, 0] == 10).all() and (ligature[0, 20] == 40).all()
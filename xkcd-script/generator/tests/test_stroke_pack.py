@@ -0,0 +1,47 @@
+import importlib.util
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+_HERE = pathlib.Path(__file__).resolve().parent
+_SCRIPT = _HERE.parent / "stroke_pack.py"
+_spec = importlib.util.spec_from_file_location("stroke_pack", _SCRIPT)
+stroke_pack = importlib.util.module_from_spec(_spec)
+sys.modules["stroke_pack"] = stroke_pack
+_spec.loader.exec_module(stroke_pack)
+
+
+def _fnames(tmp_path):
+    return dict(pixels_fname=str(tmp_path / "strokes.npy"),
+                index_fname=str(tmp_path / "strokes.index.npy"))
+
+
+def test_round_trip_preserves_pixels_and_bboxes(tmp_path):
+    rng = np.random.default_rng(0)
+    strokes = {
+        (10, 20, 13, 22): rng.integers(0, 256, (2, 3, 3), dtype=np.uint8),
+        (0, 0, 1, 1): rng.integers(0, 256, (1, 1, 3), dtype=np.uint8),
+        (5, 40, 9, 45): rng.integers(0, 256, (5, 4, 3), dtype=np.uint8),
+    }
+    stroke_pack.write_strokes(strokes, **_fnames(tmp_path))
+    result = stroke_pack.read_strokes(**_fnames(tmp_path))
+
+    assert list(result) == sorted(strokes)
+    for bbox, img in strokes.items():
+        np.testing.assert_array_equal(result[bbox], img)
+
+
+def test_read_strokes_are_read_only_views(tmp_path):
+    strokes = {(0, 0, 2, 2): np.full((2, 2, 3), 255, dtype=np.uint8)}
+    stroke_pack.write_strokes(strokes, **_fnames(tmp_path))
+    img = stroke_pack.read_strokes(**_fnames(tmp_path))[(0, 0, 2, 2)]
+    with pytest.raises(ValueError):
+        img[0, 0, 0] = 0
+
+
+def test_write_strokes_rejects_mismatched_bbox(tmp_path):
+    strokes = {(0, 0, 3, 2): np.zeros((2, 2, 3), dtype=np.uint8)}
+    with pytest.raises(ValueError):
+        stroke_pack.write_strokes(strokes, **_fnames(tmp_path))
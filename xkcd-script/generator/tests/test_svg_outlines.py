@@ -0,0 +1,73 @@
+import importlib.util
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+_HERE = pathlib.Path(__file__).resolve().parent
+for _name in ("outline_geometry", "svg_outlines"):
+    _spec = importlib.util.spec_from_file_location(_name, _HERE.parent / (_name + ".py"))
+    _module = importlib.util.module_from_spec(_spec)
+    sys.modules[_name] = _module
+    _spec.loader.exec_module(_module)
+svg_outlines = sys.modules["svg_outlines"]
+
+
+# The shape of `potrace -s` output: a flipped, scaled group of relative paths.
+POTRACE_SVG = """<?xml version="1.0" standalone="no"?>
+<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 20010904//EN"
+ "http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd">
+<svg version="1.0" xmlns="http://www.w3.org/2000/svg"
+ width="40.000000pt" height="30.000000pt" viewBox="0 0 40.000000 30.000000"
+ preserveAspectRatio="xMidYMid meet">
+<g transform="translate(0.000000,30.000000) scale(0.100000,-0.100000)"
+fill="#000000" stroke="none">
+<path d="M100 50 l200 0 0 200 -200 0 0 -200z m50 50 c0 50 100 50 100 0 c0 -50
+-100 -50 -100 0z"/>
+</g>
+</svg>
+"""
+
+
+def test_read_outlines_of_potrace_svg(tmp_path):
+    fname = tmp_path / "char.svg"
+    fname.write_text(POTRACE_SVG)
+    square, oval = svg_outlines.read_outlines(str(fname))
+
+    # Path units are 0.1pt, and the group's flip cancels SVG's, so y stays up.
+    points, on_curve = square
+    assert on_curve.all()
+    np.testing.assert_allclose(points, [[10, -25], [30, -25], [30, -5], [10, -5]])
+
+    points, on_curve = oval
+    # The closing curve ends on the start point, which is not repeated.
+    assert on_curve.tolist() == [True, False, False, True, False, False]
+    np.testing.assert_allclose(points[0], [15, -20])
+    np.testing.assert_allclose(points[3], [25, -20])
+
+
+def test_bounding_box_includes_curve_extrema(tmp_path):
+    fname = tmp_path / "char.svg"
+    fname.write_text(POTRACE_SVG)
+    square, oval = svg_outlines.read_outlines(str(fname))
+    # The oval bulges 3.75 above and below its end points.
+    np.testing.assert_allclose(svg_outlines.bounding_box([oval]), (15, -23.75, 25, -16.25))
+    np.testing.assert_allclose(svg_outlines.bounding_box([square, oval]), (10, -25, 30, -5))
+
+
+def test_transform_applies_psmat_tuple():
+    contour = (np.array([[1.0, 2.0], [3.0, 5.0]]), np.array([True, True]))
+    (points, _), = svg_outlines.transform([contour], (2, 0, 0, 3, 10, 20))
+    np.testing.assert_allclose(points, [[12, 26], [16, 35]])
+
+
+def test_parse_path_absolute_and_implicit_commands():
+    (points, on_curve), = svg_outlines.parse_path("M0,0 10,0 V10 H0 Z")
+    np.testing.assert_allclose(points, [[0, 0], [10, 0], [10, 10], [0, 10]])
+    assert on_curve.all()
+
+
+def test_parse_path_rejects_arcs():
+    with pytest.raises(ValueError):
+        svg_outlines.parse_path("M0 0 A 5 5 0 0 1 10 0 Z")
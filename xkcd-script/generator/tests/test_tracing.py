@@ -0,0 +1,69 @@
+import importlib.util
+import os
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+_HERE = pathlib.Path(__file__).resolve().parent
+for _name in ("cores", "tracing"):
+    _spec = importlib.util.spec_from_file_location(_name, _HERE.parent / (_name + ".py"))
+    _module = importlib.util.module_from_spec(_spec)
+    sys.modules[_name] = _module
+    _spec.loader.exec_module(_module)
+tracing = sys.modules["tracing"]
+
+
+def test_pnm_bytes_rgb_is_ppm():
+    img = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+    data = tracing.pnm_bytes(img)
+    assert data == b"P6\n3 2\n255\n" + img.tobytes()
+
+
+def test_pnm_bytes_grey_is_pgm():
+    img = np.array([[0, 255]], dtype=np.uint8)
+    assert tracing.pnm_bytes(img) == b"P5\n2 1\n255\n\x00\xff"
+
+
+def test_pnm_bytes_rejects_rgba():
+    with pytest.raises(ValueError):
+        tracing.pnm_bytes(np.zeros((1, 1, 4), dtype=np.uint8))
+
+
+def test_pbm_bytes_pads_rows_to_whole_bytes():
+    ink = np.zeros((2, 10), dtype=bool)
+    ink[0, 0] = ink[1, 9] = True
+    data = tracing.pbm_bytes(ink)
+    assert data == b"P4\n10 2\n" + bytes([0b10000000, 0, 0, 0b01000000])
+
+
+def test_trace_cache_round_trip(tmp_path):
+    cache = tracing.TraceCache("pt3", cache_dir=str(tmp_path), version=b"potrace 1.16")
+    assert cache.lookup(b"P4\n1 1\n\x80") is None
+    cache.store(b"P4\n1 1\n\x80", b"<svg/>")
+    assert cache.lookup(b"P4\n1 1\n\x80") == b"<svg/>"
+    assert cache.lookup(b"P4\n1 1\n\x00") is None
+
+
+def test_trace_cache_key_covers_tag_and_version(tmp_path):
+    cache = tracing.TraceCache("pt3", cache_dir=str(tmp_path), version=b"potrace 1.16")
+    cache.store(b"bitmap", b"<svg/>")
+    other_tag = tracing.TraceCache("pt4", cache_dir=str(tmp_path), version=b"potrace 1.16")
+    other_version = tracing.TraceCache("pt3", cache_dir=str(tmp_path), version=b"potrace 1.17")
+    assert other_tag.lookup(b"bitmap") is None
+    assert other_version.lookup(b"bitmap") is None
+
+
+def test_trace_cache_prune_evicts_least_recently_used(tmp_path):
+    cache = tracing.TraceCache("pt3", cache_dir=str(tmp_path), max_bytes=20,
+                               version=b"potrace 1.16")
+    for i, bitmap in enumerate([b"a", b"b", b"c"]):
+        cache.store(bitmap, b"x" * 10)
+        path = cache._path(bitmap)
+        os.utime(path, (1000 + i, 1000 + i))
+    cache.lookup(b"a")  # most recent use now
+    cache.prune()
+    assert cache.lookup(b"a") is not None
+    assert cache.lookup(b"b") is None
+    assert cache.lookup(b"c") is not None
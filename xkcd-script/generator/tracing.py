@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Trace in-memory bitmaps to SVG with potrace.
+
+Bitmaps are encoded as PNM in memory and piped through `potrace -s` on
+stdin/stdout, so nothing is written to disk on the way.  trace_all() runs
+one potrace process per available core; the worker threads only wait on
+their child processes, so a thread pool is enough to keep every core busy.
+
+TraceCache keeps traced SVGs on disk, keyed on a hash of the exact bitmap
+handed to potrace, the potrace version and a caller-supplied tag describing
+any post-processing.  Crop, upsampling, threshold and exclude/pad changes all
+show up in the bitmap bytes, so only glyphs whose input actually changed are
+retraced.
+"""
+import concurrent.futures
+import functools
+import hashlib
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+
+import cores
+
+
+def pnm_bytes(img):
+    """Encode a uint8 greyscale (H, W) or RGB (H, W, 3) image as binary PGM / PPM."""
+    img = np.ascontiguousarray(img, dtype=np.uint8)
+    if img.ndim == 2:
+        magic = b'P5'
+    elif img.ndim == 3 and img.shape[2] == 3:
+        magic = b'P6'
+    else:
+        raise ValueError('Cannot encode an image of shape {} as PNM'.format(img.shape))
+    header = b'%s\n%d %d\n255\n' % (magic, img.shape[1], img.shape[0])
+    return header + img.tobytes()
+
+
+def pbm_bytes(ink):
+    """Encode a boolean (H, W) array, True where there is ink, as binary PBM."""
+    ink = np.asarray(ink, dtype=bool)
+    header = b'P4\n%d %d\n' % (ink.shape[1], ink.shape[0])
+    return header + np.packbits(ink, axis=1).tobytes()
+
+
+def potrace_svg(bitmap):
+    """Trace PNM/PBM bytes with `potrace -s`, returning the SVG document as bytes."""
+    result = subprocess.run(['potrace', '-s', '-o', '-', '-'], input=bitmap,
+                            stdout=subprocess.PIPE, check=True)
+    return result.stdout
+
+
+@functools.lru_cache(maxsize=None)
+def potrace_version():
+    """The first line of `potrace --version`, e.g. b'potrace 1.16. Copyright ...'."""
+    result = subprocess.run(['potrace', '--version'], stdout=subprocess.PIPE, check=True)
+    return result.stdout.splitlines()[0]
+
+
+CACHE_DIR = '../generated/trace_cache'
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class TraceCache(object):
+    """A size-bounded, least-recently-used on-disk store of traced SVGs.
+
+    Entries are files named by the SHA-256 of (potrace version, tag, bitmap).
+    A hit bumps the entry's mtime; prune() drops the stalest entries until the
+    cache fits in max_bytes.  Entries are written to a temporary file and
+    renamed into place, so concurrent writers (threads or processes) never
+    expose a partial SVG.
+    """
+
+    def __init__(self, tag, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, version=None):
+        self.tag = tag.encode('utf-8') if isinstance(tag, str) else tag
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._version = version
+
+    def _path(self, bitmap):
+        version = self._version if self._version is not None else potrace_version()
+        digest = hashlib.sha256()
+        for part in (version, self.tag):
+            digest.update(b'%d:%s' % (len(part), part))
+        digest.update(bitmap)
+        return os.path.join(self.cache_dir, digest.hexdigest() + '.svg')
+
+    def lookup(self, bitmap):
+        """Return the cached SVG for this bitmap, or None on a miss."""
+        path = self._path(bitmap)
+        try:
+            with open(path, 'rb') as fh:
+                svg = fh.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return svg
+
+    def store(self, bitmap, svg):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(svg)
+        os.replace(tmp_path, self._path(bitmap))
+
+    def prune(self):
+        """Evict least recently used entries until the cache fits in max_bytes."""
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith('.svg')]
+        except FileNotFoundError:
+            return
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def trace_all(bitmaps, workers=None, cache=None):
+    """Trace an iterable of PNM/PBM bytes concurrently, yielding SVGs in input order.
+
+    With a TraceCache, bitmaps traced before are served from disk and only the
+    misses reach potrace; the cache is pruned once every result is out.
+    """
+    def trace(bitmap):
+        svg = cache.lookup(bitmap) if cache is not None else None
+        if svg is None:
+            svg = potrace_svg(bitmap)
+            if cache is not None:
+                cache.store(bitmap, svg)
+        return svg
+
+    with concurrent.futures.ThreadPoolExecutor(workers or cores.available_cores()) as pool:
+        yield from pool.map(trace, bitmaps)
+    if cache is not None:
+        cache.prune()